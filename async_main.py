@@ -0,0 +1,405 @@
+from telebot.async_telebot import AsyncTeleBot
+from dotenv import load_dotenv
+import asyncio
+import logging
+import os
+import tempfile
+from src.async_database import add_word_to_db, get_words_page, delete_user_word, get_word, get_random_word, close_pool
+from src.async_utilities import get_definition, close_session
+from src.async_audio_handler import send_pronunciation
+from src.async_send_queue import AsyncOutbound
+from src.utilities import (get_translation, get_translations, split_message, parse_word_list, write_words_csv,
+                           IMPORT_MAX_FILE_SIZE)
+from src.definitions import split_caption
+from src.keyboards import (home_menu_markup, random_word_markup, saved_word_markup, add_word_markup,
+                           dictionary_markup, words_page_markup, letters_markup, review_card_markup,
+                           review_grade_markup, suggestions_markup, WORDS_PER_PAGE)
+from src.callback_data import Action, CallbackDataError, decode as decode_callback_data
+from src.database import get_review_card, add_words_bulk, iter_user_words
+from src.review import review_scheduler, GRADES
+from src.stats import lookup_counter, stats_message
+from src.translation import TRANSLATIONS_INLINE
+from src.prefetch import prefetcher
+from src.metrics import track, handler_latency, handler_errors, timed_async_handler
+from src.spelling import spelling_index, SPELLING_MAX_SUGGESTIONS
+from src.autocomplete import cached_inline_results, inline_results, INLINE_QUERIES, INLINE_DEBOUNCE, INLINE_CACHE_TIME
+from commands.start import get_welcome_message
+from commands.help import get_help_message
+
+# asyncio front end: the same commands and callback protocol as main.py, served by
+# AsyncTeleBot with aiohttp and asyncpg so thousands of lookups can be in flight at once.
+# Run with BOT_RUNTIME=async python main.py, which migrates, starts the scheduler and metrics
+# and drains on exit; this module has no entry point of its own.
+
+# Load environment variables from .env file
+load_dotenv()
+
+# Telegram bot token
+TOKEN = os.getenv("TOKEN")
+
+# Initialize the Telegram bot
+bot = AsyncTeleBot(TOKEN)
+# Outgoing calls are paced per chat and against the global limit shared with the threaded send queue
+outbound = AsyncOutbound(bot)
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+
+# Handler for the "/start" command
+@bot.message_handler(commands=['start'])
+@timed_async_handler("send_welcome")
+async def send_welcome(message):
+    await outbound.reply_to(message, get_welcome_message())
+    await send_home_menu(message.chat.id)
+
+# Handler for the "/help" command
+@bot.message_handler(commands=['help'])
+@timed_async_handler("send_help")
+async def send_help(message):
+    await outbound.reply_to(message, get_help_message())
+
+async def send_home_menu(chat_id):
+    await outbound.send_message(chat_id, "Select an option:", reply_markup=home_menu_markup())
+
+
+@bot.message_handler(commands=['home'])
+@timed_async_handler("show_home")
+async def show_home(message):
+    await send_home_menu(message.chat.id)
+
+
+@bot.message_handler(commands=['add'])
+@timed_async_handler("add_word_command")
+async def add_word_command(message):
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await outbound.reply_to(message, "Usage: /add <word>")
+        return
+    word = parts[1].strip()
+    word_id, added = await add_word_to_db(word, message.from_user.id)
+    if not added:
+        await outbound.reply_to(message, f"'{word}' is already in your dictionary.")
+        return
+    review_scheduler.word_added(message.from_user.id, word_id)
+    prefetcher.prefetch([word])
+    await outbound.reply_to(message, f"'{word}' added to your dictionary.")
+
+
+# /import and /export reuse the threaded runtime's COPY and server-side cursor code on the default executor
+@bot.message_handler(commands=['import'])
+@timed_async_handler("import_words_command")
+async def import_words_command(message):
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        await outbound.reply_to(message, "Usage: /import <word>, <word>, ... (or one word per line). "
+                                    "You can also send a .txt or .csv file.")
+        return
+    await import_words(message, parse_word_list(parts[1]))
+
+
+# Handler for uploaded word lists
+@bot.message_handler(content_types=['document'])
+@timed_async_handler("import_words_document")
+async def import_words_document(message):
+    document = message.document
+    file_name = (document.file_name or "").lower()
+    is_csv = file_name.endswith(".csv")
+    if not (is_csv or file_name.endswith(".txt") or (document.mime_type or "").startswith("text/")):
+        await outbound.reply_to(message, "Please send a .txt or .csv file with one word per line.")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        await outbound.reply_to(message, f"The file is too large. The limit is {IMPORT_MAX_FILE_SIZE // 1024} KB.")
+        return
+
+    file_info = await bot.get_file(document.file_id)
+    content = (await bot.download_file(file_info.file_path)).decode("utf-8", errors="replace")
+    await import_words(message, parse_word_list(content, is_csv=is_csv))
+
+async def import_words(message, words):
+    if not words:
+        await outbound.reply_to(message, "No words found to import.")
+        return
+    added = await asyncio.to_thread(add_words_bulk, words, message.from_user.id)
+    review_scheduler.invalidate(message.from_user.id)
+    await outbound.reply_to(message, f"Imported {added} new words ({len(words) - added} already in your dictionary).",
+                       reply_markup=dictionary_markup())
+
+
+@bot.message_handler(commands=['export'])
+@timed_async_handler("export_words_command")
+async def export_words_command(message):
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as export_file:
+        count = await asyncio.to_thread(write_words_csv, iter_user_words(message.from_user.id), export_file)
+        if not count:
+            await outbound.reply_to(message, "Your dictionary is empty.")
+            return
+        export_file.seek(0)
+        await outbound.send_document(message.chat.id, export_file, visible_file_name="dictionary.csv",
+                                caption=f"Your dictionary: {count} words.")
+
+
+async def send_random(chat_id, user_id):
+    random_word = await get_random_word(user_id)
+    if not random_word:
+        return False
+    definition, audio_link = await get_definition(random_word)
+    await send_message_in_parts(chat_id, definition, random_word, audio_link, random_word_markup())
+    await asyncio.to_thread(prefetcher.prefetch_random, user_id)
+    return True
+
+@bot.message_handler(commands=['random'])
+@timed_async_handler("send_random_word")
+async def send_random_word(message):
+    if not await send_random(message.chat.id, message.from_user.id):
+        await outbound.send_message(message.chat.id, "Your dictionary is empty.")
+
+# The review scheduler and the stats are synchronous; their short indexed queries run on the default executor
+@bot.message_handler(commands=['stats'])
+@timed_async_handler("show_stats")
+async def show_stats(message):
+    text = await asyncio.to_thread(stats_message, message.from_user.id)
+    await outbound.reply_to(message, text, reply_markup=dictionary_markup())
+
+@bot.message_handler(commands=['review'])
+@timed_async_handler("start_review")
+async def start_review(message):
+    await send_next_review_card(message.chat.id, message.from_user.id)
+
+async def send_next_review_card(chat_id, user_id):
+    card = await asyncio.to_thread(review_scheduler.next_card, user_id)
+    if card is None:
+        await outbound.send_message(chat_id, "Nothing to review right now. Come back later!",
+                                    reply_markup=home_menu_markup())
+        return
+    word_id, word = card
+    await outbound.send_message(chat_id, f"Do you remember '{word}'?", reply_markup=review_card_markup(word_id))
+
+@bot.message_handler(commands=['showwords'])
+@timed_async_handler("show_all_words")
+async def show_all_words(message, user_id=None, bound="", direction="after"):
+    if user_id is None:
+        user_id = message.from_user.id
+    page, total_words, has_prev, has_next = await get_words_page(user_id, WORDS_PER_PAGE, bound, direction)
+
+    logging.debug("show_all_words called with user_id=%s, bound=%s, direction=%s", user_id, bound, direction)
+
+    if page:
+        words = [word for _, word, _ in page]
+        translations = get_translations(words) if TRANSLATIONS_INLINE else None
+        markup = words_page_markup(page, has_prev, has_next, translations)
+        await outbound.send_message(message.chat.id, f"Your words ({total_words} total):", reply_markup=markup)
+        # The prefetch pool is thread-based and fills the caches both runtimes share
+        prefetcher.prefetch(words)
+    elif total_words:
+        await outbound.send_message(message.chat.id, "No words from that letter on.", reply_markup=letters_markup())
+    else:
+        logging.debug("No words found for user %s", user_id)
+        await outbound.send_message(message.chat.id, "Your dictionary is empty.")
+
+# Callback handlers; see the table in main.py
+async def on_define(call, user_id, word_id):
+    word = await get_word(word_id)
+    if word is None:
+        await outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+        return
+    definition, audio_link = await get_definition(word)
+    await send_message_in_parts(call.message.chat.id, definition, word, audio_link, saved_word_markup(word_id))
+    await outbound.answer_callback_query(call.id)
+
+async def on_delete(call, user_id, word_id):
+    if await delete_user_word(user_id, word_id):
+        await outbound.answer_callback_query(call.id, "Word deleted from your dictionary.")
+    else:
+        await outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+
+async def on_add(call, user_id, word):
+    word_id, added = await add_word_to_db(word, user_id)
+    if not added:
+        await outbound.answer_callback_query(call.id, "This word is already in your dictionary.")
+        return
+    review_scheduler.word_added(user_id, word_id)
+    prefetcher.prefetch([word])
+    await outbound.answer_callback_query(call.id, "Word added to your dictionary.")
+    await outbound.send_message(call.message.chat.id, "Word added to your dictionary.",
+                                reply_markup=dictionary_markup())
+
+async def on_show_words(call, user_id):
+    await show_all_words(call.message, user_id=user_id)
+    await outbound.answer_callback_query(call.id)
+
+async def on_page_next(call, user_id, bound):
+    await show_all_words(call.message, user_id, bound, "after")
+    await outbound.answer_callback_query(call.id)
+
+async def on_page_prev(call, user_id, bound):
+    await show_all_words(call.message, user_id, bound, "before")
+    await outbound.answer_callback_query(call.id)
+
+async def on_letters(call, user_id):
+    await outbound.send_message(call.message.chat.id, "Jump to letter:", reply_markup=letters_markup())
+    await outbound.answer_callback_query(call.id)
+
+async def on_jump(call, user_id, letter):
+    await show_all_words(call.message, user_id, letter, "from")
+    await outbound.answer_callback_query(call.id)
+
+async def on_random(call, user_id):
+    if await send_random(call.message.chat.id, user_id):
+        await outbound.answer_callback_query(call.id)
+    else:
+        await outbound.answer_callback_query(call.id, "Your dictionary is empty.")
+
+async def on_review(call, user_id):
+    await send_next_review_card(call.message.chat.id, user_id)
+    await outbound.answer_callback_query(call.id)
+
+async def on_reveal(call, user_id, word_id):
+    card = await asyncio.to_thread(get_review_card, user_id, word_id)
+    if card:
+        definition, audio_link = await get_definition(card[0])
+        markup = review_grade_markup(word_id, GRADES)
+        await send_message_in_parts(call.message.chat.id, definition, card[0], audio_link, markup)
+        await outbound.answer_callback_query(call.id)
+    else:
+        await outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+
+async def on_grade(call, user_id, quality, word_id):
+    due_at = await asyncio.to_thread(review_scheduler.grade, user_id, word_id, quality)
+    if due_at:
+        await outbound.answer_callback_query(call.id, f"Next review: {due_at:%Y-%m-%d %H:%M} UTC")
+    else:
+        await outbound.answer_callback_query(call.id)
+    await send_next_review_card(call.message.chat.id, user_id)
+
+async def on_home(call, user_id):
+    await send_home_menu(call.message.chat.id)
+    await outbound.answer_callback_query(call.id)
+
+async def on_lookup(call, user_id, word):
+    lookup_counter.record(user_id)
+    await look_up_word(call.message.chat.id, word)
+    await outbound.answer_callback_query(call.id)
+
+async def on_prompt_add(call, user_id):
+    await outbound.send_message(call.message.chat.id, "Use /add <word> to add a new word to your dictionary.")
+    await outbound.answer_callback_query(call.id)
+
+CALLBACK_HANDLERS = {
+    Action.DEFINE: on_define,
+    Action.DELETE: on_delete,
+    Action.ADD: on_add,
+    Action.SHOW_WORDS: on_show_words,
+    Action.PAGE_NEXT: on_page_next,
+    Action.PAGE_PREV: on_page_prev,
+    Action.LETTERS: on_letters,
+    Action.JUMP: on_jump,
+    Action.RANDOM: on_random,
+    Action.REVIEW: on_review,
+    Action.REVEAL: on_reveal,
+    Action.GRADE: on_grade,
+    Action.HOME: on_home,
+    Action.LOOKUP: on_lookup,
+    Action.PROMPT_ADD: on_prompt_add,
+}
+
+@bot.callback_query_handler(func=lambda call: True)
+async def callback_inline(call):
+    if not call.message:
+        return
+    logging.debug("callback_inline called with data: %s", call.data)
+    try:
+        action, args = decode_callback_data(call.data)
+    except CallbackDataError as e:
+        logging.debug("Rejected callback data: %s", e)
+        await outbound.answer_callback_query(call.id, "This button has expired. Use /home to start over.")
+        return
+    with track(handler_latency, handler_errors, handler="callback_inline", action=action.name.lower()):
+        await CALLBACK_HANDLERS[action](call, call.from_user.id, *args)
+
+# Inline mode; queries are debounced per user by letting only the latest one past the sleep
+_latest_inline_query = {}
+
+@bot.inline_handler(func=lambda query: INLINE_QUERIES)
+@timed_async_handler("inline_query")
+async def inline_query(query):
+    user_id = query.from_user.id
+    results = cached_inline_results(query.query)
+    if results is None:
+        _latest_inline_query[user_id] = query.id
+        await asyncio.sleep(INLINE_DEBOUNCE)
+        if _latest_inline_query.get(user_id) != query.id:
+            return
+        del _latest_inline_query[user_id]
+        # Candidate cards come from the psycopg2-backed stored definitions, off the event loop
+        results = await asyncio.to_thread(inline_results, query.query)
+    else:
+        _latest_inline_query.pop(user_id, None)
+    await outbound.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_TIME)
+
+# Handler for processing user input
+@bot.message_handler(func=lambda message: True)
+@timed_async_handler("process_user_input")
+async def process_user_input(message):
+    chat_id = message.chat.id
+    text = message.text.lower()
+
+    logging.debug("process_user_input called with text: %s", text)
+
+    if text.startswith('/translate'):
+        parts = text.split(maxsplit=1)
+        if len(parts) < 2:
+            await outbound.send_message(chat_id, "Usage: /translate <word>")
+            return
+        word = parts[1].strip()
+        translation = get_translation(word)
+        if translation:
+            await outbound.send_message(chat_id, f"The translation of '{word}' in Russian is '{translation}'.")
+        else:
+            await outbound.send_message(chat_id, f"Translation not found for the word '{word}'.")
+
+    else:
+        suggestions = spelling_index.suggest(text)
+        if suggestions:
+            await outbound.send_message(chat_id, f"'{text}' was not found. Did you mean:",
+                                   reply_markup=suggestions_markup(text, suggestions))
+            return
+        lookup_counter.record(message.from_user.id)
+        await look_up_word(chat_id, text)
+
+async def look_up_word(chat_id, word):
+    definition, audio_link = await get_definition(word)
+    # Merriam-Webster's own suggestions first; the local index only covers words it had none for
+    suggestions = definition.suggestions or ([] if definition or definition.error else spelling_index.lookup(word))
+    if not definition and suggestions:
+        await outbound.send_message(chat_id, f"'{word}' was not found. Did you mean:",
+                               reply_markup=suggestions_markup(word, suggestions[:SPELLING_MAX_SUGGESTIONS]))
+        return
+    await send_message_in_parts(chat_id, definition, word)
+    markup = add_word_markup(word)
+    await outbound.send_message(chat_id, "Would you like to add this word to your dictionary?", reply_markup=markup)
+
+# Function to send a message in parts to handle long messages
+@timed_async_handler("send_message_in_parts")
+async def send_message_in_parts(chat_id, definition, word, audio_link=None, markup=None, max_length=3800):
+    parts = split_message(definition, max_length)
+    if audio_link:
+        parts, caption = split_caption(parts, word)
+        for part in parts:
+            await outbound.send_message(chat_id, part, parse_mode='HTML')
+        if not await send_pronunciation(outbound.chat(chat_id), chat_id, word, audio_link, caption=caption,
+                                        parse_mode='HTML', reply_markup=markup):
+            await outbound.send_message(chat_id, caption, parse_mode='HTML', reply_markup=markup)
+        return
+    for part in parts[:-1]:
+        await outbound.send_message(chat_id, part, parse_mode='HTML')
+    await outbound.send_message(chat_id, parts[-1], parse_mode='HTML', reply_markup=markup)
+
+async def main():
+    logging.info("Starting the bot in asyncio mode...")
+    try:
+        await bot.polling()
+    finally:
+        await asyncio.to_thread(lookup_counter.flush)
+        await close_session()
+        await close_pool()
+        await bot.close_session()
@@ -0,0 +1,274 @@
+"""In-process stand-ins for the Telegram Bot API, Merriam-Webster and Redis.
+
+The servers run on loopback ports in daemon threads, answer every request
+after a configurable latency and count what they served. The Telegram
+server can inject 429 "Too Many Requests" replies to exercise the send
+queue's flood handling; the Redis one speaks just enough of the protocol
+for src/blob_store.py's "redis" backend.
+"""
+import io
+import itertools
+import json
+import random
+import re
+import socketserver
+import threading
+import time
+import wave
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+
+class FakeServer:
+    """A ThreadingHTTPServer on a free loopback port with latency, jitter and request counters."""
+
+    def __init__(self, handler_class, latency=0.0, jitter=0.0, seed=0, server_class=ThreadingHTTPServer):
+        self.latency = latency
+        self.jitter = jitter
+        self.random = random.Random(seed)
+        self.counts = {}
+        self._lock = threading.Lock()
+        self.httpd = server_class(("127.0.0.1", 0), handler_class)
+        self.httpd.daemon_threads = True
+        self.httpd.fake = self
+        self.port = self.httpd.server_address[1]
+        self.url = f"http://127.0.0.1:{self.port}"
+
+    def start(self):
+        threading.Thread(target=self.httpd.serve_forever, name=type(self).__name__, daemon=True).start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+    def count(self, name):
+        with self._lock:
+            self.counts[name] = self.counts.get(name, 0) + 1
+
+    def delay(self):
+        with self._lock:
+            delay = self.latency + self.random.uniform(0, self.jitter) if self.jitter else self.latency
+        if delay > 0:
+            time.sleep(delay)
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    @property
+    def fake(self):
+        return self.server.fake
+
+    def reply(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes):
+            body = json.dumps(body).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+class _TelegramHandler(_Handler):
+    _MULTIPART_FIELD = re.compile(rb'name="(\w+)"\r\n\r\n([^\r]*)\r\n')
+
+    def _params(self):
+        params = {key: values[0] for key, values in parse_qs(urlparse(self.path).query).items()}
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        content_type = self.headers.get("Content-Type", "")
+        if content_type.startswith("application/x-www-form-urlencoded"):
+            params.update({key: values[0] for key, values in parse_qs(body.decode("utf-8")).items()})
+        elif content_type.startswith("multipart/form-data"):
+            # Uploads: only the small text fields are needed
+            params.update({key.decode(): value.decode("utf-8", "replace")
+                           for key, value in self._MULTIPART_FIELD.findall(body)})
+        elif content_type.startswith("application/json") and body:
+            params.update(json.loads(body))
+        return params
+
+    def do_POST(self):
+        fake = self.fake
+        method = self.path.split("?", 1)[0].rsplit("/", 1)[-1]
+        params = self._params()
+        fake.delay()
+        if fake.flood_rate and fake.random.random() < fake.flood_rate:
+            fake.count("429")
+            self.reply(429, {"ok": False, "error_code": 429, "description": "Too Many Requests: retry after 1",
+                             "parameters": {"retry_after": fake.retry_after}})
+            return
+        fake.count(method)
+        self.reply(200, {"ok": True, "result": fake.result_for(method, params)})
+
+    do_GET = do_POST
+
+
+class FakeTelegram(FakeServer):
+    """Bot API stand-in; point telebot.apihelper.API_URL at ``api_url``.
+
+    ``flood_rate`` is the fraction of calls answered with a 429 that asks
+    the client to wait ``retry_after`` seconds.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, flood_rate=0.0, retry_after=1, seed=0):
+        super().__init__(_TelegramHandler, latency, jitter, seed)
+        self.flood_rate = flood_rate
+        self.retry_after = retry_after
+        self.api_url = self.url + "/bot{0}/{1}"
+        self._message_ids = itertools.count(1)
+
+    def result_for(self, method, params):
+        if method in ("answerCallbackQuery", "setWebhook", "deleteWebhook"):
+            return True
+        if method == "getMe":
+            return {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+        chat_id = int(params.get("chat_id") or 0)
+        message = {"message_id": next(self._message_ids), "date": int(time.time()),
+                   "chat": {"id": chat_id, "type": "private"}}
+        if method == "sendAudio":
+            audio = params.get("audio") or f"audio-{message['message_id']}"
+            message["audio"] = {"file_id": audio, "file_unique_id": audio, "duration": 1}
+        elif method == "sendDocument":
+            message["document"] = {"file_id": f"document-{message['message_id']}",
+                                   "file_unique_id": f"document-{message['message_id']}"}
+        else:
+            message["text"] = params.get("text", "")
+        return message
+
+
+def _silent_wav(seconds=0.2, rate=8000):
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(b"\0\0" * int(seconds * rate))
+    return buffer.getvalue()
+
+
+class _MerriamWebsterHandler(_Handler):
+    def do_GET(self):
+        fake = self.fake
+        path = urlparse(self.path).path
+        fake.delay()
+        if path.startswith("/json/"):
+            fake.count("definition")
+            self.reply(200, fake.response_for(unquote(path[len("/json/"):])))
+        elif path.startswith("/media/"):
+            fake.count("audio")
+            self.reply(200, fake.wav, "audio/wav")
+        else:
+            self.reply(404, {"error": "not found"})
+
+
+class FakeMerriamWebster(FakeServer):
+    """Learner's Dictionary stand-in serving synthetic entries for ``vocabulary``.
+
+    Unknown words get suggestion strings, as the real API returns.
+    """
+
+    def __init__(self, vocabulary, latency=0.0, jitter=0.0, seed=0):
+        super().__init__(_MerriamWebsterHandler, latency, jitter, seed)
+        self.vocabulary = set(vocabulary)
+        self.api_url = self.url + "/json"
+        self.media_url = self.url + "/media"
+        self.wav = _silent_wav()
+
+    def response_for(self, word):
+        word = word.lower()
+        if word not in self.vocabulary:
+            return sorted(self.vocabulary, key=lambda known: (known[0] != word[:1], known))[:5]
+        return [{
+            "meta": {"id": f"{word}:1", "stems": [word, f"{word}s"]},
+            "hwi": {"hw": word, "prs": [{"mw": word, "sound": {"audio": f"{word}0001"}}]},
+            "fl": "noun",
+            "def": [{"sseq": [[["sense", {"dt": [
+                ["text", f"{{bc}}a word used in the {{it}}{word}{{/it}} benchmark"],
+                ["vis", [{"t": f"She said {{it}}{word}{{/it}} twice."}, {"t": f"A {{phrase}}{word}{{/phrase}} again."}]],
+            ]}]]]}],
+            "shortdef": [f"a word used in the {word} benchmark", f"another sense of {word}"],
+        }]
+
+
+class _RedisHandler(socketserver.StreamRequestHandler):
+    def _read_command(self):
+        line = self.rfile.readline()
+        if not line.startswith(b"*"):
+            return None
+        args = []
+        for _ in range(int(line[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def handle(self):
+        fake = self.server.fake
+        while True:
+            try:
+                args = self._read_command()
+            except (OSError, ValueError):
+                return
+            if not args:
+                return
+            command = args[0].decode().upper()
+            fake.delay()
+            fake.count(command)
+            self.wfile.write(fake.execute(command, args[1:]))
+
+
+class _RedisServer(socketserver.ThreadingTCPServer):
+    allow_reuse_address = True
+
+
+class FakeRedis(FakeServer):
+    """Redis stand-in keeping values in memory: GET, SET (with EX/PX), DEL, EXISTS and PING.
+
+    Point REDIS_URL at ``url``.
+    """
+
+    def __init__(self, latency=0.0, jitter=0.0, seed=0):
+        super().__init__(_RedisHandler, latency, jitter, seed, server_class=_RedisServer)
+        self.url = f"redis://127.0.0.1:{self.port}/0"
+        self.data = {}  # key -> (value, expires_at or None)
+
+    def _live(self, key):
+        value, expires_at = self.data.get(key, (None, None))
+        if expires_at is not None and expires_at <= time.monotonic():
+            del self.data[key]
+            return None
+        return value
+
+    def execute(self, command, args):
+        with self._lock:
+            if command == "PING":
+                return b"+PONG\r\n"
+            if command in ("SELECT", "AUTH"):
+                return b"+OK\r\n"
+            if command == "GET":
+                value = self._live(args[0])
+                return b"$-1\r\n" if value is None else b"$%d\r\n%s\r\n" % (len(value), value)
+            if command == "SET":
+                expires_at = None
+                options = [arg.decode().upper() for arg in args[2::2]]
+                for option, amount in zip(options, args[3::2]):
+                    try:
+                        amount = int(amount)
+                    except ValueError:
+                        return b"-ERR value is not an integer or out of range\r\n"
+                    # As in Redis, an expiry must be positive
+                    if amount <= 0:
+                        return b"-ERR invalid expire time in 'set' command\r\n"
+                    expires_at = time.monotonic() + amount / (1000 if option == "PX" else 1)
+                self.data[args[0]] = (args[1], expires_at)
+                return b"+OK\r\n"
+            if command in ("DEL", "EXISTS"):
+                found = sum(self._live(key) is not None for key in args)
+                if command == "DEL":
+                    for key in args:
+                        self.data.pop(key, None)
+                return b":%d\r\n" % found
+        return b"-ERR unknown command '%s'\r\n" % command.encode()
@@ -0,0 +1,67 @@
+"""A throwaway PostgreSQL cluster for benchmark runs.
+
+Needs the server binaries (initdb, pg_ctl) on PATH or under PG_BIN. The
+cluster lives in a temporary directory, listens on a free loopback port with
+trust authentication and is deleted on stop().
+"""
+import glob
+import os
+import shutil
+import socket
+import subprocess
+import tempfile
+
+
+def _find_binary(name):
+    candidates = [os.path.join(os.getenv("PG_BIN", ""), name)] if os.getenv("PG_BIN") else []
+    candidates.append(shutil.which(name))
+    candidates.extend(sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"), reverse=True))
+    for candidate in candidates:
+        if candidate and os.access(candidate, os.X_OK):
+            return candidate
+    raise RuntimeError(f"'{name}' not found; install the PostgreSQL server or set PG_BIN")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class TemporaryPostgres:
+    def __init__(self, port=None):
+        self.port = port or _free_port()
+        self.directory = None
+        self._pg_ctl = None
+
+    def start(self):
+        initdb = _find_binary("initdb")
+        self._pg_ctl = _find_binary("pg_ctl")
+        self.directory = tempfile.mkdtemp(prefix="tgdefbot-bench-pg-")
+        data = os.path.join(self.directory, "data")
+        subprocess.run([initdb, "-D", data, "-U", "postgres", "-A", "trust", "--no-sync"],
+                       check=True, capture_output=True)
+        options = f"-p {self.port} -k {self.directory} -c listen_addresses=127.0.0.1 -c fsync=off"
+        subprocess.run([self._pg_ctl, "-D", data, "-o", options, "-l", os.path.join(self.directory, "log"),
+                        "-w", "start"], check=True, capture_output=True)
+        return self
+
+    def stop(self):
+        if not self.directory:
+            return
+        subprocess.run([self._pg_ctl, "-D", os.path.join(self.directory, "data"), "-m", "immediate", "stop"],
+                       capture_output=True)
+        shutil.rmtree(self.directory, ignore_errors=True)
+        self.directory = None
+
+    @property
+    def env(self):
+        """DB_* settings for src/database.py."""
+        return {"DB_NAME": "postgres", "DB_USER": "postgres", "DB_PASSWORD": "",
+                "DB_HOST": "127.0.0.1", "DB_PORT": str(self.port)}
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,234 @@
+"""Replay an update mix against main.py's handlers and report latency and call counts.
+
+Telegram and Merriam-Webster are replaced by the in-process fakes in
+bench/fake_servers.py and the database by a throwaway cluster
+(bench/postgres.py), unless --use-env-db points the run at the DB_*
+settings already in the environment. Examples::
+
+    python -m bench.run --updates 2000 --rate 200
+    python -m bench.run --record mix.jsonl --updates 5000
+    python -m bench.run --replay mix.jsonl --telegram-latency 0.05 --flood-rate 0.02 --json result.json
+    python -m bench.run --blob-backend redis
+
+With ``--blob-backend redis`` the shared blob store talks to the in-process
+Redis stand-in, also from bench/fake_servers.py.
+
+Latency is measured from the moment an update was due, so a handler pool
+that falls behind the target rate shows up in the percentiles instead of
+silently slowing the replay down.
+"""
+import argparse
+import json
+import logging
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from bench import updates as update_mix
+from bench.fake_servers import FakeMerriamWebster, FakeRedis, FakeTelegram
+from bench.postgres import TemporaryPostgres
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def _total(histogram):
+    return sum(histogram.counts().values())
+
+
+def _configure_environment(args, telegram, merriam_webster, redis, audio_dir):
+    # Everything main.py and src/ read at import time has to be set before the import
+    os.environ.update({
+        "TOKEN": "1:bench",
+        "MERRIAM_WEBSTER_API_KEY": "bench",
+        "MERRIAM_WEBSTER_API_URL": merriam_webster.api_url,
+        "MERRIAM_WEBSTER_MEDIA_URL": merriam_webster.media_url,
+        "METRICS_PORT": "0",
+        "REVIEW_REMINDERS": "false",
+        "SPELLING_SUGGESTIONS": "true" if args.spelling else "false",
+        "PREFETCH": "true" if args.prefetch else "false",
+        "AUDIO_DIR": audio_dir,
+        "AUDIO_FORMAT": args.audio_format,
+        "BLOB_BACKEND": args.blob_backend,
+        "BLOB_DIR": os.path.join(audio_dir, "blobs"),
+    })
+    if redis:
+        os.environ["REDIS_URL"] = redis.url
+    if not args.flood_limits:
+        # Telegram's real limits would make the send queue, not the handlers, the bottleneck
+        os.environ.setdefault("SEND_GLOBAL_RATE", "100000")
+        os.environ.setdefault("SEND_CHAT_RATE", "100000")
+        os.environ.setdefault("SEND_CHAT_BURST", "100000")
+
+
+def _seed(users, words_per_user, first_user_id):
+    """Give every benchmark user their words; returns {word: word_id}."""
+    from src.database import add_words_bulk, get_connection
+    for user_id in range(first_user_id, first_user_id + users):
+        add_words_bulk(update_mix.user_words(user_id, words_per_user), user_id)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT word, word_id FROM Words")
+        return dict(cursor.fetchall())
+
+
+def replay(bot, updates, rate, concurrency):
+    """Feed updates to bot at rate per second; returns ([(kind, latency, service time)], wall time)."""
+    from telebot import types
+
+    parsed = [(kind, types.Update.de_json(update)) for kind, update in updates]
+    results = []
+
+    def handle(kind, update, due):
+        start = time.perf_counter()
+        bot.process_new_updates([update])
+        end = time.perf_counter()
+        results.append((kind, end - due, end - start))
+
+    interval = 1.0 / rate if rate else 0.0
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="bench") as pool:
+        for i, (kind, update) in enumerate(parsed):
+            due = started + i * interval
+            delay = due - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(handle, kind, update, due)
+    return results, time.perf_counter() - started
+
+
+def summarize(results, wall_time, counts_before, counts_after, outbound, fakes):
+    kinds = {}
+    for kind, latency, service in results:
+        kinds.setdefault(kind, []).append((latency, service))
+    handlers = {}
+    for kind, samples in sorted(kinds.items()):
+        latencies = [latency for latency, _ in samples]
+        handlers[kind] = {
+            "count": len(samples),
+            "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+            "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+            "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+            "service_p50_ms": round(percentile([service for _, service in samples], 0.50) * 1000, 2),
+        }
+    count = len(results) or 1
+    return {
+        "updates": len(results),
+        "wall_time_s": round(wall_time, 3),
+        "throughput_per_s": round(len(results) / wall_time, 1) if wall_time else 0.0,
+        "handlers": handlers,
+        "per_update": {name: round((counts_after[name] - counts_before[name]) / count, 3) for name in counts_after},
+        "send_queue": dict(outbound.stats),
+        "fake_servers": {name: dict(fake.counts) for name, fake in fakes.items()},
+    }
+
+
+def print_report(report):
+    print(f"{report['updates']} updates in {report['wall_time_s']}s "
+          f"({report['throughput_per_s']} updates/s)")
+    print(f"{'kind':<10} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'svc p50':>9}")
+    for kind, stats in report["handlers"].items():
+        print(f"{kind:<10} {stats['count']:>6} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+              f"{stats['p99_ms']:>9} {stats['service_p50_ms']:>9}")
+    print("Calls per update: " + ", ".join(f"{name} {value}" for name, value in report["per_update"].items()))
+    print(f"Send queue: {report['send_queue']}")
+    for name, counts in report["fake_servers"].items():
+        print(f"Fake {name}: {counts}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the bot's handlers against local stand-ins.")
+    parser.add_argument("--updates", type=int, default=1000, help="number of updates to generate")
+    parser.add_argument("--rate", type=float, default=100, help="updates per second; 0 replays as fast as possible")
+    parser.add_argument("--concurrency", type=int, default=10, help="handler threads, as TeleBot(num_threads=)")
+    parser.add_argument("--users", type=int, default=50)
+    parser.add_argument("--words-per-user", type=int, default=30)
+    parser.add_argument("--first-user-id", type=int, default=1000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--replay", help="replay a recorded mix (JSONL) instead of generating one")
+    parser.add_argument("--record", help="write the generated mix to this JSONL file")
+    parser.add_argument("--telegram-latency", type=float, default=0.02)
+    parser.add_argument("--mw-latency", type=float, default=0.1)
+    parser.add_argument("--jitter", type=float, default=0.0, help="extra uniform latency added by both fakes")
+    parser.add_argument("--flood-rate", type=float, default=0.0, help="fraction of Bot API calls answered with 429")
+    parser.add_argument("--flood-limits", action="store_true", help="keep the send queue's real rate limits")
+    parser.add_argument("--audio-format", default="wav", help="AUDIO_FORMAT; wav skips transcoding")
+    parser.add_argument("--blob-backend", default="", choices=["", "local", "postgres", "redis"],
+                        help="BLOB_BACKEND; redis runs against the fake server")
+    parser.add_argument("--no-spelling", dest="spelling", action="store_false")
+    parser.add_argument("--no-prefetch", dest="prefetch", action="store_false")
+    parser.add_argument("--use-env-db", action="store_true", help="use the DB_* environment instead of a temp cluster")
+    parser.add_argument("--json", help="also write the report to this file")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.WARNING)
+    postgres = None
+    if not args.use_env_db:
+        postgres = TemporaryPostgres().start()
+        os.environ.update(postgres.env)
+    telegram = FakeTelegram(args.telegram_latency, args.jitter, args.flood_rate, seed=args.seed).start()
+    merriam_webster = FakeMerriamWebster(update_mix.VOCABULARY, args.mw_latency, args.jitter, seed=args.seed).start()
+    redis = FakeRedis(seed=args.seed).start() if args.blob_backend == "redis" else None
+    audio_dir = tempfile.mkdtemp(prefix="tgdefbot-bench-audio-")
+    _configure_environment(args, telegram, merriam_webster, redis, audio_dir)
+    try:
+        from telebot import apihelper
+        apihelper.API_URL = telegram.api_url
+
+        import main as bot_main
+        from src import metrics
+        from src.database import close_pool
+        from src.migrations import run_migrations
+        from src.spelling import load_spelling_index
+
+        run_migrations()
+        word_ids = _seed(args.users, args.words_per_user, args.first_user_id)
+        # Recorded mixes carry word ids, which match as long as the database is seeded the same way
+        if args.replay:
+            updates = update_mix.load(args.replay)
+        else:
+            updates = update_mix.generate(args.updates, word_ids, args.users, args.words_per_user,
+                                           seed=args.seed, first_user_id=args.first_user_id)
+            if args.record:
+                update_mix.save(updates, args.record)
+        spelling_loader = load_spelling_index()
+        if spelling_loader:
+            spelling_loader.join()
+        # Handlers run on the replay's own pool, as TeleBot's worker threads would run them
+        bot_main.bot.threaded = False
+
+        histograms = {"db": metrics.db_latency, "http": metrics.http_latency, "telegram": metrics.telegram_latency,
+                      "blob": metrics.blob_latency}
+        counts_before = {name: _total(histogram) for name, histogram in histograms.items()}
+        results, wall_time = replay(bot_main.bot, updates, args.rate, args.concurrency)
+        bot_main.outbound.stop(drain=True, timeout=60)
+        counts_after = {name: _total(histogram) for name, histogram in histograms.items()}
+
+        fakes = {"telegram": telegram, "merriam-webster": merriam_webster}
+        if redis:
+            fakes["redis"] = redis
+        report = summarize(results, wall_time, counts_before, counts_after, bot_main.outbound, fakes)
+        print_report(report)
+        if args.json:
+            with open(args.json, "w", encoding="utf-8") as file:
+                json.dump(report, file, indent=2)
+        close_pool()
+    finally:
+        telegram.stop()
+        merriam_webster.stop()
+        if redis:
+            redis.stop()
+        if postgres:
+            postgres.stop()
+        shutil.rmtree(audio_dir, ignore_errors=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
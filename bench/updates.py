@@ -0,0 +1,117 @@
+"""Deterministic Telegram update mixes for the benchmark.
+
+A mix is a list of ``(kind, update dict)`` pairs in Bot API JSON, generated
+from a seed or loaded from a JSONL recording (one ``{"kind", "update"}``
+object per line), so two runs replay exactly the same traffic.
+"""
+import itertools
+import json
+import random
+import time
+
+from src.callback_data import Action, encode
+
+# Relative weight of each kind of update in a generated mix
+DEFAULT_MIX = {
+    "lookup": 30,     # free text: spelling check and definition lookup
+    "define": 25,     # dictionary button: definition of a saved word
+    "page": 15,       # dictionary paging
+    "random": 15,     # "Random Word"
+    "add": 10,        # "Add to Dictionary"
+    "showwords": 5,   # /showwords
+}
+
+VOCABULARY = [
+    "abandon", "ability", "absence", "academy", "account", "achieve", "acquire", "address", "advance", "adverse",
+    "balance", "bargain", "barrier", "benefit", "brittle", "cabinet", "capture", "caution", "century", "circuit",
+    "climate", "clutter", "combine", "comfort", "compact", "compile", "concept", "conduct", "consent", "context",
+    "courage", "crucial", "culture", "current", "decline", "default", "deficit", "deliver", "density", "deposit",
+    "diagram", "dignity", "digital", "discard", "display", "distant", "dynamic", "eclipse", "economy", "elastic",
+    "element", "embrace", "emotion", "emulate", "enhance", "episode", "erosion", "essence", "examine", "exclude",
+    "fashion", "feature", "fiction", "finance", "fortune", "forward", "freedom", "gallery", "general", "genuine",
+    "glimpse", "gravity", "harvest", "horizon", "hostile", "imagine", "impulse", "improve", "initial", "inquiry",
+    "insight", "journey", "justice", "kingdom", "landing", "lecture", "liberty", "machine", "measure", "mineral",
+    "monitor", "mystery", "narrate", "natural", "neglect", "nervous", "network", "obscure", "observe", "obvious",
+]
+
+# Lookups that miss, so the spelling and suggestion path is exercised too
+MISSPELLINGS = ["abandn", "balnce", "clmate", "eclips", "gravty", "harvst", "jurney", "netwrok", "obsrve", "vaccum"]
+
+
+class _Ids:
+    def __init__(self):
+        self.update = itertools.count(1)
+        self.message = itertools.count(1)
+        self.callback = itertools.count(1)
+
+
+def _user(user_id):
+    return {"id": user_id, "is_bot": False, "first_name": f"bench{user_id}"}
+
+
+def _message(ids, user_id, text, command=False):
+    message = {"message_id": next(ids.message), "date": int(time.time()), "from": _user(user_id),
+               "chat": {"id": user_id, "type": "private"}, "text": text}
+    if command:
+        message["entities"] = [{"type": "bot_command", "offset": 0, "length": len(text.split()[0])}]
+    return {"update_id": next(ids.update), "message": message}
+
+
+def _callback(ids, user_id, data):
+    message = {"message_id": next(ids.message), "date": int(time.time()), "from": {"id": 1, "is_bot": True,
+               "first_name": "bench"}, "chat": {"id": user_id, "type": "private"}, "text": "menu"}
+    callback = {"id": str(next(ids.callback)), "from": _user(user_id), "chat_instance": str(user_id),
+                "message": message, "data": data}
+    return {"update_id": next(ids.update), "callback_query": callback}
+
+
+def user_words(user_id, count):
+    """The words a benchmark user has saved: a deterministic slice of VOCABULARY."""
+    start = (user_id * 7) % len(VOCABULARY)
+    return [VOCABULARY[(start + i) % len(VOCABULARY)] for i in range(count)]
+
+
+def generate(count, word_ids, users=50, words_per_user=30, mix=None, seed=0, first_user_id=1000):
+    """Return a list of count (kind, update) pairs drawn from mix with a seeded generator.
+
+    Dictionary buttons carry word ids, so word_ids ({word: word_id}) has to
+    come from the database the mix will be replayed against.
+    """
+    rng = random.Random(seed)
+    mix = mix or DEFAULT_MIX
+    kinds = list(mix)
+    weights = [mix[kind] for kind in kinds]
+    ids = _Ids()
+    updates = []
+    for _ in range(count):
+        kind = rng.choices(kinds, weights)[0]
+        user_id = first_user_id + rng.randrange(users)
+        saved = user_words(user_id, words_per_user)
+        if kind == "lookup":
+            word = rng.choice(MISSPELLINGS) if rng.random() < 0.1 else rng.choice(VOCABULARY)
+            update = _message(ids, user_id, word)
+        elif kind == "showwords":
+            update = _message(ids, user_id, "/showwords", command=True)
+        elif kind == "define":
+            update = _callback(ids, user_id, encode(Action.DEFINE, word_ids[rng.choice(saved)]))
+        elif kind == "page":
+            update = _callback(ids, user_id, encode(Action.PAGE_NEXT, rng.choice(sorted(saved)[:-1])))
+        elif kind == "random":
+            update = _callback(ids, user_id, encode(Action.RANDOM))
+        elif kind == "add":
+            update = _callback(ids, user_id, encode(Action.ADD, rng.choice(VOCABULARY)))
+        else:
+            raise ValueError(f"Unknown update kind '{kind}'")
+        updates.append((kind, update))
+    return updates
+
+
+def save(updates, path):
+    with open(path, "w", encoding="utf-8") as file:
+        for kind, update in updates:
+            file.write(json.dumps({"kind": kind, "update": update}) + "\n")
+
+
+def load(path):
+    with open(path, encoding="utf-8") as file:
+        return [(record["kind"], record["update"]) for record in map(json.loads, file) if record]
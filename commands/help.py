@@ -0,0 +1,17 @@
+# commands/help.py
+
+def get_help_message():
+    return """
+    Here are the available commands:
+    - /start: Start the bot
+    - /add [word]: Add a word to your dictionary
+    - /translate [word]: Get the translation of a word to Russian
+    - /remove [word]: Remove a word from your dictionary
+    - /import [words]: Add a list of words (or send a .txt/.csv file)
+    - /export: Download your dictionary as a CSV file
+    - /random: Get a random word from your dictionary
+    - /review: Review the words that are due today
+    - /stats: See how many words you've added and looked up lately
+    - /home: Show the main menu
+    - /help: Show this help message
+    """
@@ -1,15 +1,38 @@
 import telebot
-from telebot import types
 from dotenv import load_dotenv
 import logging
 import os
-from src.database import add_word_to_db, get_words_from_db, get_word_count, delete_word_from_db, get_random_word
-from src.utilities import get_definition, get_translation, format_text
-from src.audio_handler import get_audio_file
+import tempfile
+from src.database import (add_word_to_db, add_words_bulk, iter_user_words, get_words_page, delete_user_word, get_word,
+                          get_random_word, get_review_card, get_pool_stats, close_pool)
+from src.utilities import (get_definition, get_translation, get_translations, split_message, definition_flight,
+                           definition_cache, parse_word_list, write_words_csv, IMPORT_MAX_FILE_SIZE)
+from src.definitions import split_caption
+from src.audio_handler import (send_pronunciation, prepare_pronunciation, audio_flight, audio_store,
+                               reconcile_audio_store)
+from src.keyboards import (home_menu_markup, random_word_markup, saved_word_markup, add_word_markup,
+                           dictionary_markup, words_page_markup, letters_markup, review_card_markup,
+                           review_grade_markup, suggestions_markup, WORDS_PER_PAGE)
+from src.callback_data import Action, CallbackDataError, decode as decode_callback_data
+from src.review import review_scheduler, GRADES
+from src.stats import lookup_counter, stats_message
+from src.scheduler import start_scheduler
+from src.translation import TRANSLATIONS_INLINE
+from src.spelling import spelling_index, load_spelling_index, SPELLING_MAX_SUGGESTIONS
+from src.send_queue import OutboundDispatcher
+from src.prefetch import prefetcher
+from src.metrics import (track, handler_latency, handler_errors, timed_handler, registry, cache_collector,
+                         stats_collector, start_metrics_server)
+from src.audio_handler import audio_file_id_cache, audio_path_cache
+from src.translation import translator
+from src.offline_dictionary import offline_dictionary
+from src.http_client import http_client
+from src.blob_store import blob_store
+from src.autocomplete import (Debouncer, cached_inline_results, inline_results, inline_cache, load_completion_index,
+                              INLINE_QUERIES, INLINE_CACHE_TIME)
 from commands.start import get_welcome_message
-
-# Init Database
-import src.db_init
+from commands.help import get_help_message
+from src.migrations import run_migrations
 
 # Load environment variables from .env file
 load_dotenv()
@@ -20,237 +43,450 @@ TOKEN = os.getenv("TOKEN")
 # Merriam-Webster API key
 MERRIAM_WEBSTER_API_KEY = os.getenv("MERRIAM_WEBSTER_API_KEY")
 
+# How updates arrive: "polling" (long-poll loop) or "webhook" (see src/webhook.py)
+BOT_MODE = os.getenv("BOT_MODE", "polling")
+
+# Runtime: "threaded" (telebot.TeleBot with a worker pool) or "async" (AsyncTeleBot, see async_main.py)
+BOT_RUNTIME = os.getenv("BOT_RUNTIME", "threaded")
+
 # Initialize the Telegram bot
 bot = telebot.TeleBot(TOKEN, num_threads=10)
 
+# Outgoing messages go through a rate-limited queue so handlers return without waiting on Telegram
+outbound = OutboundDispatcher(bot)
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
 # Handler for the "/start" command
 @bot.message_handler(commands=['start'])
+@timed_handler("send_welcome")
 def send_welcome(message):
-    bot.reply_to(message, get_welcome_message())
-    send_home_menu(message.chat.id, message.from_user.id)
+    outbound.reply_to(message, get_welcome_message())
+    send_home_menu(message.chat.id)
 
 # Handler for the "/help" command
 @bot.message_handler(commands=['help'])
+@timed_handler("send_help")
 def send_help(message):
-    help_message = """
-    Here are the available commands:
-    - /start: Start the bot
-    - /add [word]: Add a word to your dictionary
-    - /translate [word]: Get the translation of a word to Russian
-    - /remove [word]: Remove a word from your dictionary
-    - /random: Get a random word from your dictionary
-    - /home: Show the main menu
-    - /help: Show this help message
-    """
-    bot.reply_to(message, help_message)
-
-def send_home_menu(chat_id, user_id):
-    markup = types.InlineKeyboardMarkup()
-    markup.add(types.InlineKeyboardButton("Add Word", callback_data=f"promptadd_{user_id}"))
-    markup.add(types.InlineKeyboardButton("Dictionary", callback_data=f"showwords_{user_id}"))
-    markup.add(types.InlineKeyboardButton("Random Word", callback_data=f"random_{user_id}"))
-    bot.send_message(chat_id, "Select an option:", reply_markup=markup)
+    outbound.reply_to(message, get_help_message())
+
+def send_home_menu(chat_id):
+    outbound.send_message(chat_id, "Select an option:", reply_markup=home_menu_markup())
 
 
 @bot.message_handler(commands=['home'])
+@timed_handler("show_home")
 def show_home(message):
-    send_home_menu(message.chat.id, message.from_user.id)
+    send_home_menu(message.chat.id)
 
 
 @bot.message_handler(commands=['add'])
+@timed_handler("add_word_command")
 def add_word_command(message):
     parts = message.text.split(maxsplit=1)
     if len(parts) < 2:
-        bot.reply_to(message, "Usage: /add <word>")
+        outbound.reply_to(message, "Usage: /add <word>")
         return
     word = parts[1].strip()
-    add_word_to_db(word, message.from_user.id)
-    bot.reply_to(message, f"'{word}' added to your dictionary.")
+    word_id, added = add_word_to_db(word, message.from_user.id)
+    if not added:
+        outbound.reply_to(message, f"'{word}' is already in your dictionary.")
+        return
+    review_scheduler.word_added(message.from_user.id, word_id)
+    prefetcher.prefetch([word])
+    outbound.reply_to(message, f"'{word}' added to your dictionary.")
+
+
+@bot.message_handler(commands=['import'])
+@timed_handler("import_words_command")
+def import_words_command(message):
+    parts = message.text.split(maxsplit=1)
+    if len(parts) < 2:
+        outbound.reply_to(message, "Usage: /import <word>, <word>, ... (or one word per line). "
+                                   "You can also send a .txt or .csv file.")
+        return
+    import_words(message, parse_word_list(parts[1]))
+
+
+# Handler for uploaded word lists
+@bot.message_handler(content_types=['document'])
+@timed_handler("import_words_document")
+def import_words_document(message):
+    document = message.document
+    file_name = (document.file_name or "").lower()
+    is_csv = file_name.endswith(".csv")
+    if not (is_csv or file_name.endswith(".txt") or (document.mime_type or "").startswith("text/")):
+        outbound.reply_to(message, "Please send a .txt or .csv file with one word per line.")
+        return
+    if document.file_size and document.file_size > IMPORT_MAX_FILE_SIZE:
+        outbound.reply_to(message, f"The file is too large. The limit is {IMPORT_MAX_FILE_SIZE // 1024} KB.")
+        return
+
+    file_info = bot.get_file(document.file_id)
+    content = bot.download_file(file_info.file_path).decode("utf-8", errors="replace")
+    import_words(message, parse_word_list(content, is_csv=is_csv))
+
+def import_words(message, words):
+    if not words:
+        outbound.reply_to(message, "No words found to import.")
+        return
+    added = add_words_bulk(words, message.from_user.id)
+    review_scheduler.invalidate(message.from_user.id)
+    outbound.reply_to(message, f"Imported {added} new words ({len(words) - added} already in your dictionary).",
+                      reply_markup=dictionary_markup())
+
+
+@bot.message_handler(commands=['export'])
+@timed_handler("export_words_command")
+def export_words_command(message):
+    # Rows stream from a server-side cursor into a spooled file, so large dictionaries never sit in memory
+    with tempfile.SpooledTemporaryFile(max_size=1024 * 1024) as export_file:
+        count = write_words_csv(iter_user_words(message.from_user.id), export_file)
+        if not count:
+            outbound.reply_to(message, "Your dictionary is empty.")
+            return
+        export_file.seek(0)
+        # Wait for the upload: the file is gone once this block exits
+        outbound.submit(message.chat.id, bot.send_document, message.chat.id, export_file,
+                        visible_file_name="dictionary.csv", caption=f"Your dictionary: {count} words.").result()
 
 
 @bot.message_handler(commands=['random'])
+@timed_handler("send_random_word")
 def send_random_word(message):
     random_word = get_random_word(message.from_user.id)
     if random_word:
         definition, audio_link = get_definition(random_word)
-        audio_path = get_audio_file(random_word, audio_link) if audio_link else None
-        markup = types.InlineKeyboardMarkup()
-        markup.add(types.InlineKeyboardButton("Another", callback_data=f"random_{message.from_user.id}"))
-        markup.add(types.InlineKeyboardButton("Home", callback_data=f"home_{message.from_user.id}"))
-        markup.add(types.InlineKeyboardButton("Dictionary", callback_data=f"showwords_{message.from_user.id}"))
-        send_message_in_parts(message.chat.id, definition, random_word, audio_path, markup)
+        markup = random_word_markup()
+        send_message_in_parts(message.chat.id, definition, random_word, audio_link, markup)
+        prefetcher.prefetch_random(message.from_user.id)
     else:
-        bot.send_message(message.chat.id, "Your dictionary is empty.")
+        outbound.send_message(message.chat.id, "Your dictionary is empty.")
+
+@bot.message_handler(commands=['stats'])
+@timed_handler("show_stats")
+def show_stats(message):
+    outbound.reply_to(message, stats_message(message.from_user.id), reply_markup=dictionary_markup())
+
+@bot.message_handler(commands=['review'])
+@timed_handler("start_review")
+def start_review(message):
+    send_next_review_card(message.chat.id, message.from_user.id)
+
+def send_next_review_card(chat_id, user_id):
+    card = review_scheduler.next_card(user_id)
+    if card is None:
+        outbound.send_message(chat_id, "Nothing to review right now. Come back later!", reply_markup=home_menu_markup())
+        return
+    word_id, word = card
+    outbound.send_message(chat_id, f"Do you remember '{word}'?", reply_markup=review_card_markup(word_id))
 
 @bot.message_handler(commands=['showwords'])
-def show_all_words(message, page=1, user_id=None):
+@timed_handler("show_all_words")
+def show_all_words(message, user_id=None, bound="", direction="after"):
     if user_id is None:
         user_id = message.from_user.id
-    limit = 5
-    offset = (page - 1) * limit
-    words = get_words_from_db(user_id, limit, offset, sort=True)
-    total_words = get_word_count(user_id)
-    
-    logging.info(f"show_all_words called with page={page}, user_id={user_id}, limit={limit}, offset={offset}")
-    
-    if words:
-        markup = types.InlineKeyboardMarkup()
-        logging.info(f"Fetched words for page {page}: {words}")
-
-        # Show words for the current page
-        for word in words:
-            btn = types.InlineKeyboardButton(word, callback_data=f"define_{word}_{user_id}")
-            markup.add(btn)
-
-        # Pagination buttons
-        if page > 1:
-            prev_callback_data = f"page_{page-1}_{user_id}"
-            markup.add(types.InlineKeyboardButton("<< Prev", callback_data=prev_callback_data))
-            logging.info(f"Added Prev button with callback_data: {prev_callback_data}")
-        
-        if total_words > page * limit:
-            next_callback_data = f"page_{page+1}_{user_id}"
-            markup.add(types.InlineKeyboardButton("Next >>", callback_data=next_callback_data))
-            logging.info(f"Added Next button with callback_data: {next_callback_data}")
-
-        # Home button to return to the main menu
-        markup.add(types.InlineKeyboardButton("Home", callback_data=f"home_{user_id}"))
-
-        bot.send_message(message.chat.id, "Your words:", reply_markup=markup)
+    page, total_words, has_prev, has_next = get_words_page(user_id, WORDS_PER_PAGE, bound, direction)
+
+    logging.debug("show_all_words called with user_id=%s, bound=%s, direction=%s", user_id, bound, direction)
+
+    if page:
+        words = [word for _, word, _ in page]
+        translations = get_translations(words) if TRANSLATIONS_INLINE else None
+        markup = words_page_markup(page, has_prev, has_next, translations)
+        outbound.send_message(message.chat.id, f"Your words ({total_words} total):", reply_markup=markup)
+        # The page's words are the likely next clicks
+        prefetcher.prefetch(words)
+    elif total_words:
+        outbound.send_message(message.chat.id, "No words from that letter on.", reply_markup=letters_markup())
+    else:
+        logging.debug("No words found for user %s", user_id)
+        outbound.send_message(message.chat.id, "Your dictionary is empty.")
+
+# Callback handlers, one per button action; each gets the callback, the pressing user and the decoded arguments
+def on_define(call, user_id, word_id):
+    word = get_word(word_id)
+    if word is None:
+        outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+        return
+    definition, audio_link = get_definition(word)
+    logging.debug("Definition for %s: %s", word, definition)
+    send_message_in_parts(call.message.chat.id, definition, word, audio_link, saved_word_markup(word_id))
+    outbound.answer_callback_query(call.id)
+
+def on_delete(call, user_id, word_id):
+    if delete_user_word(user_id, word_id):
+        outbound.answer_callback_query(call.id, "Word deleted from your dictionary.")
+        logging.debug("Deleted word id %s for user %s", word_id, user_id)
     else:
-        logging.info(f"No words found for user {user_id} on page {page}")
-        bot.send_message(message.chat.id, "Your dictionary is empty.")
+        outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+
+def on_add(call, user_id, word):
+    word_id, added = add_word_to_db(word, user_id)
+    if not added:
+        outbound.answer_callback_query(call.id, "This word is already in your dictionary.")
+        return
+    # Only a new link gets a fresh review card; re-adding must not reset the word's schedule
+    review_scheduler.word_added(user_id, word_id)
+    prefetcher.prefetch([word])
+    outbound.answer_callback_query(call.id, "Word added to your dictionary.")
+    logging.debug("Added word: %s", word)
+    # Adding "Dictionary" button after word addition
+    outbound.send_message(call.message.chat.id, "Word added to your dictionary.", reply_markup=dictionary_markup())
+
+def on_show_words(call, user_id):
+    show_all_words(call.message, user_id=user_id)
+    outbound.answer_callback_query(call.id)
+
+def on_page_next(call, user_id, bound):
+    show_all_words(call.message, user_id, bound, "after")
+    outbound.answer_callback_query(call.id)
+
+def on_page_prev(call, user_id, bound):
+    show_all_words(call.message, user_id, bound, "before")
+    outbound.answer_callback_query(call.id)
+
+def on_letters(call, user_id):
+    outbound.send_message(call.message.chat.id, "Jump to letter:", reply_markup=letters_markup())
+    outbound.answer_callback_query(call.id)
+
+def on_jump(call, user_id, letter):
+    show_all_words(call.message, user_id, letter, "from")
+    outbound.answer_callback_query(call.id)
+
+def on_random(call, user_id):
+    random_word = get_random_word(user_id)
+    if random_word:
+        definition, audio_link = get_definition(random_word)
+        send_message_in_parts(call.message.chat.id, definition, random_word, audio_link, random_word_markup())
+        outbound.answer_callback_query(call.id)
+        prefetcher.prefetch_random(user_id)
+    else:
+        outbound.answer_callback_query(call.id, "Your dictionary is empty.")
+
+def on_review(call, user_id):
+    send_next_review_card(call.message.chat.id, user_id)
+    outbound.answer_callback_query(call.id)
+
+def on_reveal(call, user_id, word_id):
+    card = get_review_card(user_id, word_id)
+    if card:
+        word = card[0]
+        definition, audio_link = get_definition(word)
+        markup = review_grade_markup(word_id, GRADES)
+        send_message_in_parts(call.message.chat.id, definition, word, audio_link, markup)
+        outbound.answer_callback_query(call.id)
+    else:
+        outbound.answer_callback_query(call.id, "This word is no longer in your dictionary.")
+
+def on_grade(call, user_id, quality, word_id):
+    due_at = review_scheduler.grade(user_id, word_id, quality)
+    if due_at:
+        outbound.answer_callback_query(call.id, f"Next review: {due_at:%Y-%m-%d %H:%M} UTC")
+    else:
+        outbound.answer_callback_query(call.id)
+    send_next_review_card(call.message.chat.id, user_id)
+
+def on_home(call, user_id):
+    send_home_menu(call.message.chat.id)
+    outbound.answer_callback_query(call.id)
+
+def on_lookup(call, user_id, word):
+    lookup_counter.record(user_id)
+    look_up_word(call.message.chat.id, word)
+    outbound.answer_callback_query(call.id)
+
+def on_prompt_add(call, user_id):
+    outbound.send_message(call.message.chat.id, "Use /add <word> to add a new word to your dictionary.")
+    outbound.answer_callback_query(call.id)
+
+CALLBACK_HANDLERS = {
+    Action.DEFINE: on_define,
+    Action.DELETE: on_delete,
+    Action.ADD: on_add,
+    Action.SHOW_WORDS: on_show_words,
+    Action.PAGE_NEXT: on_page_next,
+    Action.PAGE_PREV: on_page_prev,
+    Action.LETTERS: on_letters,
+    Action.JUMP: on_jump,
+    Action.RANDOM: on_random,
+    Action.REVIEW: on_review,
+    Action.REVEAL: on_reveal,
+    Action.GRADE: on_grade,
+    Action.HOME: on_home,
+    Action.LOOKUP: on_lookup,
+    Action.PROMPT_ADD: on_prompt_add,
+}
 
 @bot.callback_query_handler(func=lambda call: True)
 def callback_inline(call):
-    if call.message:
-        logging.info(f"callback_inline called with data: {call.data}")
-        data_parts = call.data.split("_")
-        action = data_parts[0]
-        user_id = int(data_parts[-1])  # Get the last part as user_id
-        
-        logging.info(f"Action: {action}, User ID: {user_id}")
-        
-        if action == "define":
-            word_to_define = "_".join(data_parts[1:-1])  # Join all parts except the action and user_id
-            definition, audio_link = get_definition(word_to_define)
-            logging.info(f"Definition for {word_to_define}: {definition}")
-
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("Dictionary", callback_data=f"showwords_{user_id}"))
-            markup.add(types.InlineKeyboardButton("Delete from Dictionary", callback_data=f"delete_{word_to_define}_{user_id}"))
-            
-            # Get audio file if audio link is present
-            audio_path = None
-            if audio_link:
-                audio_path = get_audio_file(word_to_define, audio_link)
-            
-            send_message_in_parts(call.message.chat.id, definition, word_to_define, audio_path, markup)
-            bot.answer_callback_query(call.id)  # Add this line to handle the callback
-
-        elif action == "delete":
-            word_to_delete = "_".join(data_parts[1:-1])  # Join all parts except the action and user_id
-            delete_word_from_db(word_to_delete, user_id)
-            bot.answer_callback_query(call.id, "Word deleted from your dictionary.")
-            logging.info(f"Deleted word: {word_to_delete}")
-
-        elif action == "add":
-            word_to_add = "_".join(data_parts[1:-1])  # Join all parts except the action and user_id
-            add_word_to_db(word_to_add, user_id)
-            bot.answer_callback_query(call.id, "Word added to your dictionary.")
-            logging.info(f"Added word: {word_to_add}")
-            
-            # Adding "Dictionary" button after word addition
-            markup = types.InlineKeyboardMarkup()
-            markup.add(types.InlineKeyboardButton("Dictionary", callback_data=f"showwords_{user_id}"))
-            bot.send_message(call.message.chat.id, "Word added to your dictionary.", reply_markup=markup)
-
-        elif action == "showwords":
-            logging.info(f"Showing words for user: {user_id}")
-            show_all_words(call.message, page=1, user_id=user_id)
-            bot.answer_callback_query(call.id)
-
-        elif action == "page":
-            page = int(data_parts[1])
-            logging.info(f"Handling page callback: {page}")
-            show_all_words(call.message, page, user_id=user_id)
-            bot.answer_callback_query(call.id)
-
-        elif action == "random":
-            random_word = get_random_word(user_id)
-            if random_word:
-                definition, audio_link = get_definition(random_word)
-                audio_path = get_audio_file(random_word, audio_link) if audio_link else None
-                markup = types.InlineKeyboardMarkup()
-                markup.add(types.InlineKeyboardButton("Another", callback_data=f"random_{user_id}"))
-                markup.add(types.InlineKeyboardButton("Home", callback_data=f"home_{user_id}"))
-                markup.add(types.InlineKeyboardButton("Dictionary", callback_data=f"showwords_{user_id}"))
-                send_message_in_parts(call.message.chat.id, definition, random_word, audio_path, markup)
-                bot.answer_callback_query(call.id)
-            else:
-                bot.answer_callback_query(call.id, "Your dictionary is empty.")
-
-        elif action == "home":
-            send_home_menu(call.message.chat.id, user_id)
-            bot.answer_callback_query(call.id)
-
-        elif action == "promptadd":
-            bot.send_message(call.message.chat.id, "Use /add <word> to add a new word to your dictionary.")
-            bot.answer_callback_query(call.id)
+    if not call.message:
+        return
+    logging.debug("callback_inline called with data: %s", call.data)
+    try:
+        action, args = decode_callback_data(call.data)
+    except CallbackDataError as e:
+        logging.debug("Rejected callback data: %s", e)
+        outbound.answer_callback_query(call.id, "This button has expired. Use /home to start over.")
+        return
+    # The user is whoever pressed the button, never something carried in the data
+    with track(handler_latency, handler_errors, handler="callback_inline", action=action.name.lower()):
+        CALLBACK_HANDLERS[action](call, call.from_user.id, *args)
+
+# Inline mode: "@bot word" in any chat
+inline_debouncer = Debouncer()
+
+def answer_inline(query, results=None):
+    if results is None:
+        with track(handler_latency, handler_errors, handler="answer_inline"):
+            results = inline_results(query.query)
+    outbound.answer_inline_query(query.id, results, cache_time=INLINE_CACHE_TIME)
+
+@bot.inline_handler(func=lambda query: INLINE_QUERIES)
+@timed_handler("inline_query")
+def inline_query(query):
+    # Cached answers go out at once; anything else waits until the user stops typing
+    results = cached_inline_results(query.query)
+    if results is not None:
+        inline_debouncer.cancel(query.from_user.id)
+        answer_inline(query, results)
+    else:
+        inline_debouncer.call(query.from_user.id, answer_inline, query)
 
 # Handler for processing user input
 @bot.message_handler(func=lambda message: True)
+@timed_handler("process_user_input")
 def process_user_input(message):
     chat_id = message.chat.id
     text = message.text.lower()
 
-    logging.info(f"process_user_input called with text: {text}")
+    logging.debug("process_user_input called with text: %s", text)
 
     if text.startswith('/translate'):
-        word = text.split(' ', 1)[1]
+        parts = text.split(maxsplit=1)
+        if len(parts) < 2:
+            outbound.send_message(chat_id, "Usage: /translate <word>")
+            return
+        word = parts[1].strip()
         translation = get_translation(word)
         if translation:
-            send_message_in_parts(chat_id, f"The translation of '{word}' in Russian is '{translation}'.", word)
+            outbound.send_message(chat_id, f"The translation of '{word}' in Russian is '{translation}'.")
         else:
-            send_message_in_parts(chat_id, f"Translation not found for the word '{word}'.", word)
-    
-    
+            outbound.send_message(chat_id, f"Translation not found for the word '{word}'.")
+
     else:
-        definition, audio_link = get_definition(text)
-        send_message_in_parts(chat_id, definition, text)
-        markup = types.InlineKeyboardMarkup()
-        add_btn = types.InlineKeyboardButton("Add to Dictionary", callback_data=f"add_{text}_{message.from_user.id}")
-        dict_btn = types.InlineKeyboardButton("My Dictionary", callback_data=f"showwords_{message.from_user.id}")
-        home_btn = types.InlineKeyboardButton("Home", callback_data=f"home_{message.from_user.id}")
-        markup.row(add_btn)
-        markup.row(dict_btn, home_btn)
-        bot.send_message(chat_id, "Would you like to add this word to your dictionary?", reply_markup=markup)
+        # With a full headword list loaded, likely misspellings are answered without an API call
+        suggestions = spelling_index.suggest(text)
+        if suggestions:
+            outbound.send_message(chat_id, f"'{text}' was not found. Did you mean:",
+                                  reply_markup=suggestions_markup(text, suggestions))
+            return
+        lookup_counter.record(message.from_user.id)
+        look_up_word(chat_id, text)
+
+def look_up_word(chat_id, word):
+    definition, audio_link = get_definition(word)
+    # Merriam-Webster's own suggestions first; the local index only covers words it had none for
+    suggestions = definition.suggestions or ([] if definition or definition.error else spelling_index.lookup(word))
+    if not definition and suggestions:
+        outbound.send_message(chat_id, f"'{word}' was not found. Did you mean:",
+                              reply_markup=suggestions_markup(word, suggestions[:SPELLING_MAX_SUGGESTIONS]))
+        return
+    send_message_in_parts(chat_id, definition, word)
+    markup = add_word_markup(word)
+    outbound.send_message(chat_id, "Would you like to add this word to your dictionary?", reply_markup=markup)
 
 # Function to send a message in parts to handle long messages
-def send_message_in_parts(chat_id, text, word, audio_path=None, markup=None, max_length=3800):
-    text += f"\n\nYou can listen to the pronunciation of the word here: https://youglish.com/pronounce/{word}/english"
-    text = format_text(text)
-
-    parts = [text[i:i + max_length] for i in range(0, len(text), max_length)]
+@timed_handler("send_message_in_parts")
+def send_message_in_parts(chat_id, definition, word, audio_link=None, markup=None, max_length=3800):
+    parts = split_message(definition, max_length)
+    # The audio is fetched here so the send queue only has to upload it
+    if audio_link and prepare_pronunciation(word, audio_link):
+        parts, caption = split_caption(parts, word)
+        for part in parts:
+            outbound.send_message(chat_id, part, parse_mode='HTML')
+        outbound.submit(chat_id, send_audio_or_text, chat_id, word, audio_link, caption, markup)
+        return
     for part in parts[:-1]:
-        bot.send_message(chat_id, part, parse_mode='Markdown')
-    if audio_path:
-        # If the last part exceeds the limit, we split it further
-        last_part = parts[-1]
-        if len(last_part) > max_length:
-            remaining_parts = [last_part[i:i + max_length] for i in range(0, len(last_part), max_length)]
-            for remaining_part in remaining_parts[:-1]:
-                bot.send_message(chat_id, remaining_part, parse_mode='Markdown')
-            bot.send_audio(chat_id, open(audio_path, 'rb'), caption=remaining_parts[-1][:1024], parse_mode='Markdown', reply_markup=markup)
-        else:
-            bot.send_audio(chat_id, open(audio_path, 'rb'), caption=last_part[:1024], parse_mode='Markdown', reply_markup=markup)
-    else:
-        bot.send_message(chat_id, parts[-1], parse_mode='Markdown', reply_markup=markup)
+        outbound.send_message(chat_id, part, parse_mode='HTML')
+    outbound.send_message(chat_id, parts[-1], parse_mode='HTML', reply_markup=markup)
+
+def send_audio_or_text(chat_id, word, audio_link, caption, markup):
+    # A rejected file_id or a missing file makes this job send more than once; each call takes a token
+    throttle = outbound.throttle(chat_id)
+    if not send_pronunciation(bot, chat_id, word, audio_link, throttle=throttle, caption=caption, parse_mode='HTML',
+                              reply_markup=markup):
+        throttle()
+        bot.send_message(chat_id, caption, parse_mode='HTML', reply_markup=markup)
+
+def register_metrics():
+    registry.add_collector("bot_cache_hit_ratio", "Hit ratio of in-process caches.", "cache", cache_collector({
+        "definition": definition_cache, "audio_file_id": audio_file_id_cache, "audio_path": audio_path_cache,
+        "translation": translator.cache, "inline": inline_cache,
+    }))
+    registry.add_collector("bot_db_pool", "Database connection pool counters.", "stat", stats_collector(get_pool_stats))
+    registry.add_collector("bot_singleflight_coalesced", "Lookups that shared another caller's fetch.", "flight",
+                           lambda: {f.name: f.stats()["coalesced"] for f in (definition_flight, audio_flight)})
+    registry.add_collector("bot_send_queue", "Outbound send queue counters.", "stat", stats_collector(outbound.stats))
+    registry.add_collector("bot_prefetch", "Prefetch pool counters.", "stat", stats_collector(prefetcher.stats))
+    registry.add_collector("bot_offline_dictionary", "Offline dictionary lookups.", "stat",
+                           stats_collector(offline_dictionary.stats))
+    registry.add_collector("bot_http_circuit_open", "1 while an upstream host's circuit breaker is open.", "host",
+                           http_client.stats)
+    registry.add_collector("bot_blob_store", "Shared blob store counters.", "stat", stats_collector(blob_store.stats))
+
+# Function to finish queued sends and store buffered lookup counts before exiting
+def drain():
+    outbound.stop()
+    lookup_counter.flush()
 
 # Start the bot
 if __name__ == "__main__":
-    logging.info("Starting the bot...")
-    bot.polling()
+    register_metrics()
+    start_metrics_server()
+    run_migrations()
+    reconcile_audio_store()
+    loaders = [load_spelling_index(), load_completion_index()]
+    if BOT_RUNTIME == "async":
+        import asyncio
+        import async_main
+        start_scheduler(outbound)
+        try:
+            asyncio.run(async_main.main())
+        finally:
+            # The scheduler's reminders and digests go out through the threaded send queue
+            drain()
+            close_pool()
+    elif BOT_MODE == "webhook":
+        from src.webhook import serve, WEBHOOK_WORKERS
+        # Threads don't survive fork: the workers must inherit finished indexes, and the
+        # scheduler (with its send queue) runs in this process only, started after the fork
+        for loader in loaders:
+            if loader:
+                loader.join()
+        # Each worker evicts its own share of AUDIO_DIR, so together they keep to one budget
+        logging.info("Starting the bot in webhook mode...")
+        scheduler_stops = []
+        try:
+            serve(bot, on_start=lambda index: audio_store.partition(index, WEBHOOK_WORKERS), on_drain=drain,
+                  on_forked=lambda: scheduler_stops.append(start_scheduler(outbound)))
+        finally:
+            # The workers have drained; this process still holds the scheduler's reminders and digests
+            for stop in scheduler_stops:
+                stop.set()
+            drain()
+            logging.info(f"Outbound queue stats: {outbound.stats}")
+            close_pool()
+    else:
+        start_scheduler(outbound)
+        logging.info("Starting the bot...")
+        try:
+            bot.remove_webhook()
+            bot.polling()
+        finally:
+            logging.info(f"Database pool stats: {get_pool_stats()}")
+            logging.info(f"Single-flight stats: {definition_flight.stats()}, {audio_flight.stats()}")
+            drain()
+            logging.info(f"Outbound queue stats: {outbound.stats}, prefetch stats: {prefetcher.stats}")
+            close_pool()
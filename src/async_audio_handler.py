@@ -0,0 +1,82 @@
+import os
+import asyncio
+import logging
+import aiohttp
+from telebot.asyncio_helper import ApiTelegramException
+
+from src.async_database import update_audio_link, get_audio_path, get_audio_file_id, update_audio_file_id
+from src.async_utilities import get_session
+from src.metrics import track, http_latency, http_errors
+from src.singleflight import AsyncSingleFlight
+from src.blob_store import blob_store
+from src.audio_handler import (audio_store, audio_file_id_cache, audio_path_cache, restore_shared_audio,
+                               share_audio, sent_file_id, file_id_sender)
+
+audio_flight = AsyncSingleFlight("audio")
+
+async def download_audio_file(url, word):
+    fd, tmp_path = audio_store.new_temp_file()
+    try:
+        with track(http_latency, http_errors, service="audio"), os.fdopen(fd, 'wb') as f:
+            async with get_session().get(url) as r:
+                r.raise_for_status()
+                async for chunk in r.content.iter_chunked(8192):
+                    f.write(chunk)
+        # Transcoding and fsync block, so they run off the event loop
+        return await asyncio.to_thread(audio_store.commit, word, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+async def _get_audio_file(word, url):
+    audio_path = audio_path_cache.get(word) or await get_audio_path(word)
+    if not audio_store.touch(audio_path):
+        # The blob store client blocks, so it runs off the event loop
+        audio_path = await asyncio.to_thread(restore_shared_audio, word) if blob_store.enabled else None
+        if audio_path is None:
+            try:
+                logging.debug("Downloading audio file for word: %s", word)
+                audio_path = await download_audio_file(url, word)
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                logging.error(f"Failed to download audio file for word: {word}. Error: {e}")
+                audio_path_cache.delete(word)
+                return None
+            if blob_store.enabled:
+                await asyncio.to_thread(share_audio, word, audio_path)
+        await update_audio_link(word, audio_path)
+    audio_path_cache.set(word, audio_path)
+    return audio_path
+
+async def get_audio_file(word, url):
+    return await audio_flight.do(word, _get_audio_file, word, url)
+
+async def send_pronunciation(bot, chat_id, word, url, **kwargs):
+    """asyncio counterpart of src.audio_handler.send_pronunciation."""
+    file_id = audio_file_id_cache.get(word)
+    if file_id is None:
+        file_id = await get_audio_file_id(word) or ""
+        audio_file_id_cache.set(word, file_id)
+    if file_id:
+        send, bare_file_id = file_id_sender(bot, file_id)
+        try:
+            await send(chat_id, bare_file_id, **kwargs)
+            audio_file_id_cache.set(word, file_id)
+            return True
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            logging.warning(f"Telegram rejected cached file_id for word: {word}. Error: {e}")
+            audio_file_id_cache.set(word, "")
+            await update_audio_file_id(word, None)
+
+    audio_path = await get_audio_file(word, url)
+    if not audio_path:
+        return False
+    with open(audio_path, 'rb') as audio:
+        message = await bot.send_audio(chat_id, audio, **kwargs)
+    file_id = sent_file_id(message)
+    if file_id is not None:
+        audio_file_id_cache.set(word, file_id)
+        await update_audio_file_id(word, file_id)
+    return True
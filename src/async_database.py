@@ -0,0 +1,249 @@
+import asyncio
+import json
+import os
+import asyncpg
+from dotenv import load_dotenv
+import logging
+
+from src.metrics import timed_async_query
+from src.random_deck import random_decks, RANDOM_NO_REPEAT
+from src.database import DB_POOL_MIN_SIZE, DB_POOL_TIMEOUT, _PAGE_DIRECTIONS, _page_result, word_names
+
+load_dotenv()
+
+# The asyncio runtime holds many more in-flight lookups than threads, so it gets its own pool size
+ASYNC_DB_POOL_MAX_SIZE = int(os.getenv("ASYNC_DB_POOL_MAX_SIZE", "20"))
+
+# asyncpg counterparts of the functions in src/database.py, used by async_main.py
+
+_pool = None
+_pool_lock = None
+
+async def get_pool():
+    """Return the asyncpg pool, creating it on first use."""
+    global _pool, _pool_lock
+    if _pool is None:
+        # Created lazily so the lock binds to the running event loop
+        if _pool_lock is None:
+            _pool_lock = asyncio.Lock()
+        async with _pool_lock:
+            if _pool is None:
+                _pool = await asyncpg.create_pool(
+                    database=os.getenv("DB_NAME"),
+                    user=os.getenv("DB_USER"),
+                    password=os.getenv("DB_PASSWORD"),
+                    host=os.getenv("DB_HOST"),
+                    port=os.getenv("DB_PORT"),
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=ASYNC_DB_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                )
+                logging.info("Connected to database successfully")
+    return _pool
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+
+@timed_async_query
+async def add_word_to_db(word, user_id):
+    logging.debug("add_word_to_db called with word=%s, user_id=%s", word, user_id)
+    pool = await get_pool()
+    word_id, added = await pool.fetchrow(
+        """
+        WITH new_user AS (
+            INSERT INTO Users (user_id) VALUES ($2) ON CONFLICT DO NOTHING
+        ), word_row AS (
+            INSERT INTO Words (word) VALUES ($1)
+            ON CONFLICT ((lower(word))) DO UPDATE SET word = Words.word
+            RETURNING word_id
+        ), linked AS (
+            INSERT INTO UserWords (user_id, word_id, sort_key)
+            SELECT $2, word_id, lower($1) FROM word_row
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, word_id
+        ), review AS (
+            INSERT INTO ReviewState (user_id, word_id)
+            SELECT user_id, word_id FROM linked
+        ), rollup AS (
+            INSERT INTO UserDailyStats (user_id, day, words_added)
+            SELECT user_id, (now() AT TIME ZONE 'UTC')::date, 1 FROM linked
+            ON CONFLICT (user_id, day) DO UPDATE SET words_added = UserDailyStats.words_added + 1
+        )
+        SELECT word_id, EXISTS (SELECT 1 FROM linked) FROM word_row
+        """,
+        word, user_id
+    )
+    if added:
+        random_decks.word_added(user_id, word_id)
+    return word_id, added
+
+@timed_async_query
+async def delete_user_word(user_id, word_id):
+    logging.debug("delete_user_word called with user_id=%s, word_id=%s", user_id, word_id)
+    pool = await get_pool()
+    count = await pool.fetchval(
+        """
+        WITH deleted AS (
+            DELETE FROM UserWords WHERE user_id = $1 AND word_id = $2
+            RETURNING user_id
+        ), rollup AS (
+            INSERT INTO UserDailyStats (user_id, day, words_removed)
+            SELECT user_id, (now() AT TIME ZONE 'UTC')::date, 1 FROM deleted
+            ON CONFLICT (user_id, day) DO UPDATE SET words_removed = UserDailyStats.words_removed + 1
+        )
+        SELECT count(*) FROM deleted
+        """,
+        user_id, word_id
+    )
+    deleted = count > 0
+    if deleted:
+        random_decks.word_removed(user_id, word_id)
+    return deleted
+
+async def get_word(word_id):
+    """asyncpg counterpart of src.database.get_word, sharing its cache."""
+    word = word_names.get(word_id)
+    if word is None:
+        word = await _fetch_word(word_id)
+        if word is not None:
+            word_names.set(word_id, word)
+    return word
+
+@timed_async_query
+async def _fetch_word(word_id):
+    pool = await get_pool()
+    return await pool.fetchval("SELECT word FROM Words WHERE word_id = $1", word_id)
+
+@timed_async_query
+async def get_words_from_db(user_id, limit, offset, sort=False):
+    logging.debug("get_words_from_db called with user_id=%s, limit=%s, offset=%s, sort=%s",
+                  user_id, limit, offset, sort)
+    query = """
+    SELECT w.word FROM Words w
+    INNER JOIN UserWords uw ON w.word_id = uw.word_id
+    WHERE uw.user_id = $1
+    """
+    if sort:
+        query += " ORDER BY w.word"
+    query += " LIMIT $2 OFFSET $3"
+    pool = await get_pool()
+    rows = await pool.fetch(query, user_id, limit, offset)
+    return [row[0] for row in rows]
+
+@timed_async_query
+async def get_words_page(user_id, limit, bound="", direction="after"):
+    """Keyset-paginated Dictionary page; see src.database.get_words_page."""
+    logging.debug("get_words_page called with user_id=%s, limit=%s, bound=%s, direction=%s",
+                  user_id, limit, bound, direction)
+    op, order, other_op = _PAGE_DIRECTIONS[direction]
+    pool = await get_pool()
+    rows = await pool.fetch(
+        f"""
+        SELECT p.word_id, p.word, p.sort_key,
+               (SELECT COUNT(*) FROM UserWords WHERE user_id = $1),
+               EXISTS (SELECT 1 FROM UserWords WHERE user_id = $1 AND sort_key {other_op} $2)
+        FROM (SELECT 1) AS one
+        LEFT JOIN LATERAL (
+            SELECT w.word_id, w.word, uw.sort_key FROM UserWords uw
+            INNER JOIN Words w ON w.word_id = uw.word_id
+            WHERE uw.user_id = $1 AND uw.sort_key {op} $2
+            ORDER BY uw.sort_key {order}
+            LIMIT $3
+        ) AS p ON TRUE
+        ORDER BY p.sort_key {order}
+        """,
+        user_id, bound, limit + 1
+    )
+    return _page_result(rows, limit, direction)
+
+@timed_async_query
+async def get_word_count(user_id):
+    logging.debug("get_word_count called with user_id=%s", user_id)
+    pool = await get_pool()
+    return await pool.fetchval("SELECT COUNT(*) FROM UserWords uw WHERE uw.user_id = $1", user_id)
+
+@timed_async_query
+async def update_audio_link(word, audio_path):
+    logging.debug("update_audio_link called with word=%s, audio_path=%s", word, audio_path)
+    pool = await get_pool()
+    await pool.execute("UPDATE Words SET audio_path = $1 WHERE lower(word) = lower($2)", audio_path, word)
+
+@timed_async_query
+async def get_audio_path(word):
+    logging.debug("get_audio_path called with word=%s", word)
+    pool = await get_pool()
+    return await pool.fetchval("SELECT audio_path FROM Words WHERE lower(word) = lower($1)", word)
+
+@timed_async_query
+async def get_audio_file_id(word):
+    logging.debug("get_audio_file_id called with word=%s", word)
+    pool = await get_pool()
+    return await pool.fetchval("SELECT audio_file_id FROM Words WHERE lower(word) = lower($1)", word)
+
+@timed_async_query
+async def update_audio_file_id(word, file_id):
+    logging.debug("update_audio_file_id called with word=%s, file_id=%s", word, file_id)
+    pool = await get_pool()
+    await pool.execute("UPDATE Words SET audio_file_id = $1 WHERE lower(word) = lower($2)", file_id, word)
+
+@timed_async_query
+async def get_random_word(user_id, no_repeat=RANDOM_NO_REPEAT):
+    """Fetch a random word for a given user from their shuffled deck."""
+    logging.debug("get_random_word called with user_id=%s", user_id)
+    pool = await get_pool()
+    deck = random_decks.get(user_id)
+    if deck is None:
+        rows = await pool.fetch("SELECT word_id FROM UserWords WHERE user_id = $1", user_id)
+        deck = random_decks.load(user_id, [row[0] for row in rows])
+    while True:
+        word_id = deck.draw(no_repeat)
+        if word_id is None:
+            return None
+        word = await pool.fetchval(
+            """
+            SELECT w.word FROM UserWords uw
+            INNER JOIN Words w ON w.word_id = uw.word_id
+            WHERE uw.user_id = $1 AND uw.word_id = $2
+            """,
+            user_id, word_id
+        )
+        if word is not None:
+            return word
+        deck.remove(word_id)
+
+@timed_async_query
+async def get_cached_definition(word, max_age):
+    """Return (raw_json, is_stale) stored for word, or None."""
+    logging.debug("get_cached_definition called with word=%s", word)
+    pool = await get_pool()
+    row = await pool.fetchrow(
+        """
+        SELECT raw_json, definition_updated_at < NOW() - $1 * INTERVAL '1 second'
+        FROM Words
+        WHERE lower(word) = lower($2) AND raw_json IS NOT NULL
+        """,
+        max_age, word
+    )
+    if row:
+        # asyncpg hands jsonb back as text
+        return json.loads(row[0]), bool(row[1])
+    return None
+
+@timed_async_query
+async def save_definition(word, definition, audio_link, part_of_speech, pronunciation, raw_json):
+    logging.debug("save_definition called with word=%s", word)
+    pool = await get_pool()
+    await pool.execute(
+        """
+        INSERT INTO Words (word, definition, audio_link, part_of_speech, pronunciation, raw_json, definition_updated_at)
+        VALUES ($1, $2, $3, $4, $5, $6::jsonb, NOW())
+        ON CONFLICT ((lower(word))) DO UPDATE
+        SET definition = EXCLUDED.definition, audio_link = EXCLUDED.audio_link,
+            part_of_speech = EXCLUDED.part_of_speech, pronunciation = EXCLUDED.pronunciation,
+            raw_json = EXCLUDED.raw_json, definition_updated_at = EXCLUDED.definition_updated_at
+        """,
+        word, definition, audio_link, part_of_speech, pronunciation, json.dumps(raw_json)
+    )
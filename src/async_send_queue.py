@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+from functools import partial
+
+from telebot.asyncio_helper import ApiTelegramException
+
+from src.metrics import track, telegram_latency, telegram_errors
+from src.send_queue import (TokenBucket, global_bucket, _retry_after, SEND_CHAT_RATE, SEND_CHAT_BURST,
+                            SEND_MAX_RETRIES)
+
+
+class AsyncOutbound:
+    """asyncio counterpart of src.send_queue.OutboundDispatcher.
+
+    Calls are awaited in place rather than queued: calls to one chat run one
+    at a time, in order, under the chat's token bucket, and every call takes a
+    token from the global bucket the threaded dispatcher (and any forked
+    process) uses too. A 429 response waits retry_after seconds and retries.
+    """
+
+    def __init__(self, bot, global_bucket=global_bucket, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self._global = global_bucket
+        self._chat_buckets = {}
+        self._chat_locks = {}
+        self.stats = {"sent": 0, "failed": 0, "rate_limited": 0}
+
+    async def call(self, chat_id, fn, *args, **kwargs):
+        """Await fn(*args, **kwargs) as a call to chat_id; chat_id None paces it globally only."""
+        if chat_id is None:
+            return await self._call(chat_id, fn, args, kwargs)
+        # chat_id -> [lock, callers holding or awaiting it]
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                return await self._call(chat_id, fn, args, kwargs)
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._chat_locks[chat_id]
+
+    async def _call(self, chat_id, fn, args, kwargs):
+        attempts = 0
+        while True:
+            await self._take(chat_id)
+            attempts += 1
+            try:
+                with track(telegram_latency, telegram_errors, method=getattr(fn, "__name__", "call")):
+                    result = await fn(*args, **kwargs)
+            except ApiTelegramException as e:
+                retry_after = _retry_after(e)
+                if retry_after is None or attempts > SEND_MAX_RETRIES:
+                    self.stats["failed"] += 1
+                    raise
+                self.stats["rate_limited"] += 1
+                logging.warning("Telegram flood limit hit for %s, retrying in %ss", chat_id, retry_after)
+                await asyncio.sleep(retry_after)
+                continue
+            except Exception:
+                self.stats["failed"] += 1
+                raise
+            self.stats["sent"] += 1
+            return result
+
+    async def _take(self, chat_id):
+        bucket = None
+        if chat_id is not None:
+            bucket = self._chat_buckets.get(chat_id)
+            if bucket is None:
+                if len(self._chat_buckets) > 100000:
+                    self._chat_buckets.clear()
+                bucket = self._chat_buckets[chat_id] = TokenBucket(self.chat_rate, self.chat_burst)
+        while True:
+            now = time.monotonic()
+            delay = bucket.delay(now) if bucket is not None else 0.0
+            if delay <= 0:
+                delay = self._global.take(now)
+            if delay <= 0:
+                if bucket is not None:
+                    bucket.consume()
+                return
+            await asyncio.sleep(delay)
+
+    def chat(self, chat_id):
+        """Return the bot's methods, each paced and retried as a call to chat_id."""
+        return _ChatBot(self, chat_id)
+
+    # Shorthands for the Bot API calls the handlers make
+
+    async def send_message(self, chat_id, text, **kwargs):
+        return await self.call(chat_id, self.bot.send_message, chat_id, text, **kwargs)
+
+    async def send_document(self, chat_id, document, **kwargs):
+        return await self.call(chat_id, self.bot.send_document, chat_id, document, **kwargs)
+
+    async def reply_to(self, message, text, **kwargs):
+        return await self.call(message.chat.id, self.bot.reply_to, message, text, **kwargs)
+
+    async def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        return await self.call(None, self.bot.answer_callback_query, callback_query_id, text, **kwargs)
+
+    async def answer_inline_query(self, inline_query_id, results, **kwargs):
+        return await self.call(None, self.bot.answer_inline_query, inline_query_id, results, **kwargs)
+
+
+class _ChatBot:
+    def __init__(self, outbound, chat_id):
+        self._outbound = outbound
+        self._chat_id = chat_id
+
+    def __getattr__(self, name):
+        return partial(self._outbound.call, self._chat_id, getattr(self._outbound.bot, name))
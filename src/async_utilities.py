@@ -0,0 +1,135 @@
+import asyncio
+import logging
+import aiohttp
+from asyncpg import PostgresError
+
+from src.metrics import track, http_latency, http_errors
+from src.http_client import http_client, HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT, HTTP_MAX_PER_HOST, RETRY_STATUSES
+from src.singleflight import AsyncSingleFlight
+from src.async_database import get_cached_definition, save_definition
+from src.spelling import spelling_index
+from src.definitions import parse_definition, render_text
+from src.utilities import (MERRIAM_WEBSTER_API_KEY, MERRIAM_WEBSTER_API_URL, DEFINITION_DB_TTL, definition_cache,
+                           get_offline_definition, guess_offline_definition, get_shared_definition, share_definition,
+                           log_request)
+from src.blob_store import blob_store
+
+# Same timeouts and per-host limit as the threaded runtime's src/http_client.py
+HTTP_TIMEOUT = aiohttp.ClientTimeout(sock_connect=HTTP_CONNECT_TIMEOUT, sock_read=HTTP_READ_TIMEOUT)
+
+_session = None
+_refreshing = {}
+definition_flight = AsyncSingleFlight("definition")
+
+def get_session():
+    """Return the shared aiohttp session, creating it on first use inside the event loop."""
+    global _session
+    if _session is None or _session.closed:
+        _session = aiohttp.ClientSession(timeout=HTTP_TIMEOUT,
+                                         connector=aiohttp.TCPConnector(limit_per_host=HTTP_MAX_PER_HOST))
+    return _session
+
+async def close_session():
+    global _session
+    if _session is not None:
+        await _session.close()
+        _session = None
+
+async def fetch_definition_data(word):
+    """Fetch the raw Merriam-Webster JSON for word; raises aiohttp.ClientError on failure."""
+    url = f"{MERRIAM_WEBSTER_API_URL}/{word}"
+    # The breaker is shared with the threaded client, so both runtimes see the same circuit
+    breaker = http_client.breaker(url)
+    try:
+        with track(http_latency, http_errors, service="merriam-webster"):
+            if not breaker.allow():
+                raise aiohttp.ClientError(f"Circuit for {breaker.name} is open")
+            try:
+                async with get_session().get(url, params={"key": MERRIAM_WEBSTER_API_KEY}) as response:
+                    response.raise_for_status()
+                    data = await response.json(content_type=None)
+            except aiohttp.ClientResponseError as e:
+                if e.status in RETRY_STATUSES:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                raise
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                breaker.record_failure()
+                raise
+            finally:
+                breaker.release_probe()
+            breaker.record_success()
+        log_request("definition", word)
+    except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+        log_request("definition", word, success=False, error_message=str(e))
+        raise aiohttp.ClientError(str(e)) from e
+    return data
+
+async def _load_definition(word):
+    try:
+        data = await fetch_definition_data(word)
+    except aiohttp.ClientError:
+        return guess_offline_definition(word)
+
+    definition = parse_definition(word, data)
+    definition_cache.set(word, definition)
+    if definition:
+        spelling_index.add(word)
+        if blob_store.caches_definitions:
+            await asyncio.to_thread(share_definition, word, data)
+        try:
+            await save_definition(word, render_text(definition), definition.audio_link,
+                                  definition.part_of_speech, definition.pronunciation, data)
+        except PostgresError as e:
+            logging.error(f"Failed to store definition for word '{word}'. Error: {e}")
+    return definition, definition.audio_link
+
+def _refresh_in_background(word):
+    if word in _refreshing or get_offline_definition(word) is not None:
+        return
+    if not http_client.breaker(MERRIAM_WEBSTER_API_URL).available:
+        return
+    logging.debug("Refreshing stale definition for word '%s'", word)
+    task = asyncio.create_task(_load_definition(word))
+    _refreshing[word] = task
+    task.add_done_callback(lambda _: _refreshing.pop(word, None))
+
+async def get_definition(word):
+    # Same lookup order as src.utilities.get_definition: LRU, offline dictionary, blob store, Words table,
+    # Merriam-Webster
+    entry = definition_cache.get_entry(word)
+    if entry is not None:
+        definition, is_stale = entry
+        if is_stale:
+            _refresh_in_background(word)
+        return definition, definition.audio_link
+
+    # A memory-mapped lookup is cheap enough to run on the event loop
+    definition = get_offline_definition(word)
+    if definition is not None:
+        return definition, definition.audio_link
+
+    return await definition_flight.do(word, _lookup_definition, word)
+
+async def _lookup_definition(word):
+    # The blob store client blocks, so it runs off the event loop
+    if blob_store.caches_definitions:
+        definition = await asyncio.to_thread(get_shared_definition, word)
+        if definition is not None:
+            return definition, definition.audio_link
+
+    try:
+        stored = await get_cached_definition(word, DEFINITION_DB_TTL)
+    except PostgresError as e:
+        logging.error(f"Failed to read cached definition for word '{word}'. Error: {e}")
+        stored = None
+    if stored is not None:
+        raw_json, is_stale = stored
+        definition = parse_definition(word, raw_json)
+        definition_cache.set(word, definition)
+        if is_stale:
+            _refresh_in_background(word)
+        return definition, definition.audio_link
+
+    return await _load_definition(word)
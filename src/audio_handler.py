@@ -1,30 +1,198 @@
 import os
 import requests
 import logging
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+from telebot.apihelper import ApiTelegramException
 
-from src.database import update_audio_link, get_audio_path
+from src.audio_store import AudioStore
+from src.blob_store import blob_store
+from src.cache import LRUCache
+from src.http_client import http_client
+from src.database import (update_audio_link, get_audio_path, get_audio_file_id, update_audio_file_id,
+                          get_audio_paths, clear_audio_paths)
+from src.singleflight import SingleFlight
+
+load_dotenv()
 
 # Directory to store downloaded audio files
-AUDIO_DIR = "audio_files"
-os.makedirs(AUDIO_DIR, exist_ok=True)
+AUDIO_DIR = os.getenv("AUDIO_DIR", "audio_files")
+# Format downloads are transcoded to ("mp3", "ogg" or "wav" to keep them as is) and its bitrate
+AUDIO_FORMAT = os.getenv("AUDIO_FORMAT", "mp3")
+AUDIO_BITRATE = os.getenv("AUDIO_BITRATE", "48k")
+# Disk budget for AUDIO_DIR; least recently used files are evicted beyond it.
+# In webhook mode each of the WEBHOOK_WORKERS processes evicts its own share of it.
+AUDIO_CACHE_MAX_BYTES = int(os.getenv("AUDIO_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+# Seconds pronunciations are kept in the shared blob store; 0 leaves expiry to the backend
+AUDIO_SHARED_TTL = int(os.getenv("AUDIO_SHARED_TTL", str(90 * 24 * 3600)))
+
+def _on_audio_evicted(word, path):
+    audio_path_cache.delete(word)
+    try:
+        clear_audio_paths([path])
+    except DatabaseError as e:
+        logging.error(f"Failed to clear audio path for word: {word}. Error: {e}")
+
+audio_store = AudioStore(AUDIO_DIR, AUDIO_CACHE_MAX_BYTES, AUDIO_FORMAT, AUDIO_BITRATE, on_evict=_on_audio_evicted)
+
+# Concurrent requests for the same word share one download
+audio_flight = SingleFlight("audio")
+
+# Telegram file_ids of uploaded pronunciations, keyed by word; "" marks a word never uploaded
+audio_file_id_cache = LRUCache(maxsize=4096)
+# Local files of pronunciations, keyed by word, so warm clicks skip the Words lookup
+audio_path_cache = LRUCache(maxsize=4096)
 
 def download_audio_file(url, word):
-    local_filename = os.path.join(AUDIO_DIR, f"{word}.wav")
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
-        with open(local_filename, 'wb') as f:
+    # Download to a temporary file; the store transcodes it and renames it into place
+    fd, tmp_path = audio_store.new_temp_file()
+    try:
+        with os.fdopen(fd, 'wb') as f, http_client.stream(url, service="audio") as r:
             for chunk in r.iter_content(chunk_size=8192):
                 f.write(chunk)
-    return local_filename
+        return audio_store.commit(word, tmp_path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+def _shared_audio_key(word):
+    # The format is part of the key so replicas configured differently never swap files
+    return f"audio:{audio_store.audio_format}:{word}"
+
+def restore_shared_audio(word):
+    """Copy a pronunciation another replica downloaded into the local store; returns its path or None."""
+    if not blob_store.enabled:
+        return None
+    data = blob_store.get(_shared_audio_key(word))
+    if data is None:
+        return None
+    try:
+        return audio_store.adopt(word, data)
+    except OSError as e:
+        logging.error(f"Failed to store shared audio file for word: {word}. Error: {e}")
+        return None
+
+def share_audio(word, audio_path):
+    """Put a downloaded pronunciation in the shared blob store, for the other replicas."""
+    # A download whose transcoding failed stays local
+    if not blob_store.enabled or not audio_path.endswith(f".{audio_store.audio_format}"):
+        return
+    try:
+        with open(audio_path, "rb") as f:
+            data = f.read()
+    except OSError as e:
+        logging.error(f"Failed to read audio file for word: {word}. Error: {e}")
+        return
+    blob_store.put(_shared_audio_key(word), data, ttl=AUDIO_SHARED_TTL or None)
+
+def _shared_copy_exists(path):
+    return blob_store.get(_shared_audio_key(audio_store.word_for(path))) is not None
+
+def reconcile_audio_store():
+    """Drop files the Words table doesn't know about and paths whose files are gone.
+
+    A path is only cleared when its file is missing from this replica's
+    AUDIO_DIR and from the shared blob store; other replicas (or this one,
+    through restore_shared_audio) may still serve it otherwise.
+    """
+    try:
+        missing = audio_store.reconcile(get_audio_paths())
+        if blob_store.enabled:
+            missing = [path for path in missing if not _shared_copy_exists(path)]
+        if missing:
+            clear_audio_paths(missing)
+        logging.info(f"Audio store reconciled: {audio_store.stats()}, {len(missing)} missing files")
+    except DatabaseError as e:
+        logging.error(f"Failed to reconcile audio store. Error: {e}")
+
+def _get_audio_file(word, url):
+    audio_path = audio_path_cache.get(word) or get_audio_path(word)
+    if not audio_store.touch(audio_path):
+        # Words.audio_path may be another replica's file, which it can share through the blob store
+        audio_path = restore_shared_audio(word)
+        if audio_path is None:
+            try:
+                logging.debug("Downloading audio file for word: %s", word)
+                audio_path = download_audio_file(url, word)
+            except requests.exceptions.RequestException as e:
+                logging.error(f"Failed to download audio file for word: {word}. Error: {e}")
+                audio_path_cache.delete(word)
+                return None
+            share_audio(word, audio_path)
+        update_audio_link(word, audio_path)
+    audio_path_cache.set(word, audio_path)
+    return audio_path
 
 def get_audio_file(word, url):
-    audio_path = get_audio_path(word)
-    if not audio_path or not os.path.exists(audio_path):
+    return audio_flight.do(word, _get_audio_file, word, url)
+
+# sendAudio only keeps MP3/M4A as audio: OGG/Opus comes back as a voice message and WAV as a
+# document, and a file_id can only be resent with the method of its own kind
+_FILE_KINDS = ("audio", "voice", "document")
+
+def sent_file_id(message):
+    """Return the file_id of a sent pronunciation, prefixed with its kind unless it is audio."""
+    for kind in _FILE_KINDS:
+        media = getattr(message, kind, None) if message is not None else None
+        if media is not None:
+            return media.file_id if kind == "audio" else f"{kind}:{media.file_id}"
+    return None
+
+def file_id_sender(bot, file_id):
+    """Return (bot method, bare file_id) to resend a value from sent_file_id."""
+    kind, _, bare = file_id.rpartition(":")
+    return getattr(bot, f"send_{kind or 'audio'}"), bare
+
+def get_cached_file_id(word):
+    file_id = audio_file_id_cache.get(word)
+    if file_id is None:
+        file_id = get_audio_file_id(word) or ""
+        audio_file_id_cache.set(word, file_id)
+    return file_id or None
+
+def remember_file_id(word, message):
+    file_id = sent_file_id(message)
+    if file_id is None:
+        return
+    audio_file_id_cache.set(word, file_id)
+    update_audio_file_id(word, file_id)
+
+def forget_file_id(word):
+    audio_file_id_cache.set(word, "")
+    update_audio_file_id(word, None)
+
+def prepare_pronunciation(word, url):
+    """Make sure a pronunciation can be sent: a known file_id or a local file. Returns False if neither."""
+    return bool(get_cached_file_id(word) or get_audio_file(word, url))
+
+# Function to send the pronunciation, reusing Telegram's copy of the file when possible
+def send_pronunciation(bot, chat_id, word, url, throttle=None, **kwargs):
+    """Send the pronunciation of word as audio; returns False if no audio is available.
+
+    The Telegram file_id of an earlier upload is reused first. The local file
+    (downloaded again if it is missing) is uploaded only when there is no
+    file_id or Telegram rejects it. ``throttle`` is called before each Bot API call.
+    """
+    throttle = throttle or (lambda: None)
+    file_id = get_cached_file_id(word)
+    if file_id:
+        send, bare_file_id = file_id_sender(bot, file_id)
+        throttle()
         try:
-            logging.info(f"Downloading audio file for word: {word}")
-            audio_path = download_audio_file(url, word)
-            update_audio_link(word, audio_path)
-        except requests.exceptions.RequestException as e:
-            logging.error(f"Failed to download audio file for word: {word}. Error: {e}")
-            audio_path = None
-    return audio_path
+            send(chat_id, bare_file_id, **kwargs)
+            return True
+        except ApiTelegramException as e:
+            if e.error_code != 400:
+                raise
+            logging.warning(f"Telegram rejected cached file_id for word: {word}. Error: {e}")
+            forget_file_id(word)
+
+    audio_path = get_audio_file(word, url)
+    if not audio_path:
+        return False
+    throttle()
+    with open(audio_path, 'rb') as audio:
+        message = bot.send_audio(chat_id, audio, **kwargs)
+    remember_file_id(word, message)
+    return True
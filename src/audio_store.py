@@ -0,0 +1,208 @@
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+import threading
+import zlib
+from collections import OrderedDict
+from urllib.parse import quote, unquote
+
+# ffmpeg codec arguments for each supported output format
+_CODECS = {
+    "mp3": ["-c:a", "libmp3lame"],
+    "ogg": ["-c:a", "libopus"],
+}
+
+
+class AudioStore:
+    """Byte-budgeted LRU store of pronunciation files on local disk.
+
+    Downloads are transcoded (when ffmpeg is available), fsynced and renamed
+    into place atomically. The least recently used files are evicted once
+    the directory exceeds ``max_bytes``; ``on_evict(word, path)`` is called
+    for each of them so the caller can clear its references.
+
+    Processes sharing one directory each call ``partition()`` so that every
+    file is tracked, and evicted, by exactly one of them.
+    """
+
+    def __init__(self, directory, max_bytes, audio_format="mp3", bitrate="48k", on_evict=None):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.bitrate = bitrate
+        self.on_evict = on_evict
+        self.ffmpeg = shutil.which("ffmpeg")
+        if audio_format != "wav" and (audio_format not in _CODECS or not self.ffmpeg):
+            logging.warning(f"Cannot transcode audio to '{audio_format}', storing WAV files as downloaded")
+            audio_format = "wav"
+        self.audio_format = audio_format
+        self._files = OrderedDict()  # path -> size, least recently used first
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+        # Set by partition(): files this process didn't write are served but not tracked
+        self._partitioned = False
+        self.evictions = 0
+        os.makedirs(directory, exist_ok=True)
+
+    def path_for(self, word, extension=None):
+        # Words are user input, so quote them rather than trusting them as file names
+        return os.path.join(self.directory, f"{quote(word, safe='')}.{extension or self.audio_format}")
+
+    def word_for(self, path):
+        return unquote(os.path.splitext(os.path.basename(path))[0])
+
+    def new_temp_file(self):
+        """Return (fd, path) of a temporary file in the store directory for a download."""
+        return tempfile.mkstemp(dir=self.directory, suffix=".part")
+
+    def _transcode(self, source):
+        fd, target = tempfile.mkstemp(dir=self.directory, suffix=f".{self.audio_format}.part")
+        os.close(fd)
+        command = [self.ffmpeg, "-loglevel", "error", "-y", "-i", source, "-vn",
+                   *_CODECS[self.audio_format], "-b:a", self.bitrate, "-f", self.audio_format, target]
+        try:
+            subprocess.run(command, check=True, capture_output=True, timeout=60)
+        except (subprocess.SubprocessError, OSError) as e:
+            os.remove(target)
+            logging.error(f"Failed to transcode {source}, keeping WAV. Error: {e}")
+            return source, "wav"
+        os.remove(source)
+        return target, self.audio_format
+
+    def commit(self, word, tmp_path):
+        """Move a finished download into the store and return its final path."""
+        extension = "wav"
+        if self.audio_format != "wav":
+            tmp_path, extension = self._transcode(tmp_path)
+        with open(tmp_path, "rb") as f:
+            os.fsync(f.fileno())
+        return self._install(word, tmp_path, extension)
+
+    def adopt(self, word, data):
+        """Store an already transcoded file (e.g. from a shared blob store) and return its path."""
+        fd, tmp_path = self.new_temp_file()
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            return self._install(word, tmp_path, self.audio_format)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _install(self, word, tmp_path, extension):
+        path = self.path_for(word, extension)
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+        self._add(path, os.path.getsize(path))
+        self._evict()
+        return path
+
+    def _fsync_directory(self):
+        fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    def _add(self, path, size):
+        with self._lock:
+            self._total_bytes -= self._files.pop(path, 0)
+            self._files[path] = size
+            self._total_bytes += size
+
+    def touch(self, path):
+        """Mark path as recently used; returns False if the file is gone."""
+        if not path or not os.path.exists(path):
+            with self._lock:
+                self._total_bytes -= self._files.pop(path, 0)
+            return False
+        # mtime carries the recency across restarts, see reconcile()
+        os.utime(path)
+        with self._lock:
+            if path in self._files:
+                self._files.move_to_end(path)
+                return True
+        if self._partitioned:
+            return True
+        self._add(path, os.path.getsize(path))
+        self._evict()
+        return True
+
+    def _evict(self):
+        evicted = []
+        with self._lock:
+            while self._total_bytes > self.max_bytes and len(self._files) > 1:
+                path, size = self._files.popitem(last=False)
+                self._total_bytes -= size
+                evicted.append(path)
+        for path in evicted:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+            logging.info(f"Evicted audio file {path}")
+            if self.on_evict:
+                self.on_evict(self.word_for(path), path)
+
+    def partition(self, index, count):
+        """Keep this process to its share of a directory used by ``count`` processes.
+
+        Of the files reconcile() found, only those hashing to ``index`` stay in
+        the index, with 1/count of the budget; from then on the process tracks
+        the files it writes and merely serves the ones the others track.
+        """
+        with self._lock:
+            self._partitioned = True
+            self.max_bytes //= count
+            for path in list(self._files):
+                # crc32 rather than hash(): stable across processes and restarts
+                if zlib.crc32(path.encode()) % count != index:
+                    self._total_bytes -= self._files.pop(path)
+        self._evict()
+
+    def owns_path(self, path):
+        """Return True if path names a file in this store's directory."""
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.directory)
+
+    def reconcile(self, referenced_paths):
+        """Sync the store with the paths recorded in the database.
+
+        Deletes leftover temporary files and files nobody references, rebuilds
+        the LRU from modification times, evicts down to the budget, and
+        returns the referenced paths in this directory whose files no longer
+        exist. Paths in other directories belong to other replicas and are
+        neither deleted nor returned.
+        """
+        referenced = {os.path.normpath(path) for path in referenced_paths if path}
+        found = []
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not os.path.isfile(path):
+                continue
+            if name.endswith(".part") or os.path.normpath(path) not in referenced:
+                os.remove(path)
+                continue
+            stat = os.stat(path)
+            found.append((stat.st_mtime, path, stat.st_size))
+
+        with self._lock:
+            self._files.clear()
+            self._total_bytes = 0
+            for _, path, size in sorted(found):
+                self._files[path] = size
+                self._total_bytes += size
+        self._evict()
+
+        existing = {os.path.normpath(path) for _, path, _ in found}
+        return [path for path in referenced_paths
+                if path and self.owns_path(path) and os.path.normpath(path) not in existing]
+
+    def stats(self):
+        with self._lock:
+            return {"files": len(self._files), "bytes": self._total_bytes, "max_bytes": self.max_bytes,
+                    "evictions": self.evictions, "format": self.audio_format}
@@ -0,0 +1,262 @@
+"""Inline-mode lookups: "@bot word" in any chat answers with definition cards.
+
+Telegram sends an inline query on every keystroke, so:
+
+* completions come from a prefix index (the Words table in a sorted array,
+  plus the offline dictionary's memory-mapped keys) instead of the API;
+* each user's queries are debounced and a query superseded by a newer one
+  is dropped without being answered;
+* candidate cards use only stored definitions; Merriam-Webster is called at
+  most once per settled query, and only when nothing is stored;
+* answers are cached in-process and by Telegram (cache_time).
+"""
+import bisect
+import hashlib
+import heapq
+import itertools
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+from telebot import types
+
+from src.cache import LRUCache
+from src.database import iter_known_words
+from src.lemmatizer import normalize
+from src.offline_dictionary import offline_dictionary
+from src.utilities import get_definition, get_stored_definition, split_message
+
+load_dotenv()
+
+INLINE_QUERIES = os.getenv("INLINE_QUERIES", "true").lower() == "true"
+# Seconds a user has to stop typing before their query is answered
+INLINE_DEBOUNCE = float(os.getenv("INLINE_DEBOUNCE", "0.35"))
+# Threads answering settled queries, per process
+INLINE_WORKERS = int(os.getenv("INLINE_WORKERS", "4"))
+# Seconds answers are cached, here and by Telegram
+INLINE_CACHE_TIME = int(os.getenv("INLINE_CACHE_TIME", "300"))
+INLINE_MAX_RESULTS = int(os.getenv("INLINE_MAX_RESULTS", "8"))
+# Shorter queries get completions but never an API lookup
+INLINE_MIN_LOOKUP_LENGTH = int(os.getenv("INLINE_MIN_LOOKUP_LENGTH", "3"))
+# How many prefix matches are ranked per source
+COMPLETION_SCAN_LIMIT = 200
+DESCRIPTION_MAX_LENGTH = 120
+
+inline_cache = LRUCache(maxsize=5000, ttl=INLINE_CACHE_TIME)
+
+
+class CompletionIndex:
+    """Prefix completion over a sorted array of known words, ranked by how many users saved them.
+
+    Headwords of the offline dictionary fill up the remaining slots straight
+    from its sorted, memory-mapped index.
+    """
+
+    def __init__(self, offline_index=None):
+        self.offline_index = offline_index
+        self.words = []
+        self.counts = {}
+        self.lock = threading.Lock()
+
+    def load(self, pairs):
+        """Rebuild from (word, count) pairs, keeping words added meanwhile."""
+        counts = {}
+        for word, count in pairs:
+            word = normalize(word)
+            if word:
+                counts[word] = counts.get(word, 0) + count
+        with self.lock:
+            for word, count in self.counts.items():
+                counts.setdefault(word, count)
+            self.words, self.counts = sorted(counts), counts
+        logging.info(f"Completion index loaded with {len(counts)} words")
+
+    def add(self, word, count=1):
+        word = normalize(word)
+        if not word:
+            return
+        with self.lock:
+            if word in self.counts:
+                self.counts[word] += count
+            else:
+                self.counts[word] = count
+                bisect.insort(self.words, word)
+
+    def _saved_matches(self, prefix):
+        with self.lock:
+            start = bisect.bisect_left(self.words, prefix)
+            matches = []
+            for word in itertools.islice(self.words, start, start + COMPLETION_SCAN_LIMIT):
+                if not word.startswith(prefix):
+                    break
+                matches.append((word, self.counts[word]))
+        return matches
+
+    def complete(self, prefix, limit=INLINE_MAX_RESULTS):
+        """Return up to limit known words starting with prefix, most saved and then shortest first."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        ranked = sorted(self._saved_matches(prefix), key=lambda item: (-item[1], len(item[0]), item[0]))
+        results = [word for word, _ in ranked[:limit]]
+        if len(results) < limit and self.offline_index is not None:
+            seen = set(results)
+            headwords = sorted(itertools.islice(self.offline_index.iter_prefix(prefix), COMPLETION_SCAN_LIMIT),
+                               key=lambda word: (len(word), word))
+            results.extend(word for word in headwords if word not in seen)
+        return results[:limit]
+
+    def __len__(self):
+        return len(self.counts)
+
+
+completion_index = CompletionIndex(offline_dictionary.index)
+
+
+def load_completion_index():
+    """Load the Words table into the completion index on a background thread.
+
+    Returns the thread, or None when inline queries are disabled.
+    """
+    def load():
+        try:
+            completion_index.load(iter_known_words())
+        except DatabaseError as e:
+            logging.error(f"Failed to load words for the completion index. Error: {e}")
+
+    if INLINE_QUERIES:
+        thread = threading.Thread(target=load, name="completion-index", daemon=True)
+        thread.start()
+        return thread
+    return None
+
+
+class Debouncer:
+    """Runs the latest call per key once the key has been quiet for ``delay`` seconds.
+
+    A newer call for the same key replaces the pending one. Keystrokes cost
+    no threads: one scheduler thread per process waits for the earliest
+    deadline and hands the calls that are due to a small pool.
+    """
+
+    def __init__(self, delay=INLINE_DEBOUNCE, workers=INLINE_WORKERS):
+        self.delay = delay
+        self.workers = workers
+        self._pending = {}  # key -> (seq, fn, args)
+        self._deadlines = []  # heap of (due, seq, key); entries of replaced calls are skipped
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None
+        self._executor = None
+        self.stats = {"scheduled": 0, "superseded": 0}
+
+    def _ensure_started(self):
+        # Started lazily, and again in forked webhook workers
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="inline")
+        threading.Thread(target=self._run, name="inline-debouncer", daemon=True).start()
+
+    def call(self, key, fn, *args):
+        seq = next(self._seq)
+        with self._cond:
+            self._ensure_started()
+            if key in self._pending:
+                self.stats["superseded"] += 1
+            self._pending[key] = (seq, fn, args)
+            heapq.heappush(self._deadlines, (time.monotonic() + self.delay, seq, key))
+            self.stats["scheduled"] += 1
+            self._cond.notify()
+
+    def cancel(self, key):
+        with self._cond:
+            if self._pending.pop(key, None) is not None:
+                self.stats["superseded"] += 1
+
+    def _run(self):
+        with self._cond:
+            while True:
+                if not self._deadlines:
+                    self._cond.wait()
+                    continue
+                due, seq, key = self._deadlines[0]
+                remaining = due - time.monotonic()
+                if remaining > 0:
+                    self._cond.wait(remaining)
+                    continue
+                heapq.heappop(self._deadlines)
+                pending = self._pending.get(key)
+                if pending is None or pending[0] != seq:
+                    continue
+                del self._pending[key]
+                self._executor.submit(self._invoke, pending[1], pending[2])
+
+    @staticmethod
+    def _invoke(fn, args):
+        try:
+            fn(*args)
+        except Exception:
+            logging.exception("Debounced call %r failed", fn)
+
+
+def _description(definition):
+    for entry in definition.entries:
+        for runs in entry.definitions:
+            text = "".join(text for _, text in runs).strip()
+            if text:
+                return text[:DESCRIPTION_MAX_LENGTH]
+    return definition.entries[0].part_of_speech or ""
+
+
+def _article(definition):
+    word = definition.word
+    return types.InlineQueryResultArticle(
+        id=hashlib.md5(word.encode("utf-8")).hexdigest(),
+        title=word,
+        description=_description(definition),
+        input_message_content=types.InputTextMessageContent(split_message(definition)[0], parse_mode="HTML"),
+    )
+
+
+def cached_inline_results(query):
+    """Return the cached answer to a query, or None if it has to be computed."""
+    text = normalize(query)
+    return inline_cache.get(text) if text else []
+
+
+def inline_results(query):
+    """Return the InlineQueryResultArticles for a query; cached per normalized query."""
+    text = normalize(query)
+    if not text:
+        return []
+    cached = inline_cache.get(text)
+    if cached is not None:
+        return cached
+
+    results = []
+    seen = set()
+    # Inflected forms resolve to their headword's card, so ask for spare completions
+    for word in completion_index.complete(text, INLINE_MAX_RESULTS * 2):
+        definition = get_stored_definition(word)
+        if definition and definition.word not in seen:
+            seen.add(definition.word)
+            results.append(_article(definition))
+            if len(results) >= INLINE_MAX_RESULTS:
+                break
+    # A word nobody has stored yet is looked up once the user has stopped typing
+    failed = False
+    if not results and len(text) >= INLINE_MIN_LOOKUP_LENGTH and " " not in text:
+        definition, _ = get_definition(text)
+        if definition:
+            completion_index.add(text)
+            results.append(_article(definition))
+        failed = definition.error
+    # Empty answers caused by an upstream error are not cached
+    if not failed:
+        inline_cache.set(text, results)
+    return results
@@ -0,0 +1,350 @@
+"""Shared storage for definitions and pronunciations across replicas.
+
+Each replica keeps its own LRUs and audio_files/ directory; a blob store
+behind them lets a word fetched or downloaded by one replica be served by
+the others without another Merriam-Webster call or audio download.
+BLOB_BACKEND selects the implementation:
+
+* ``""`` (default) — nothing is shared;
+* ``local`` — files in BLOB_DIR, for replicas that mount the same volume;
+* ``postgres`` — the Blobs table (bytea) in the bot's own database;
+* ``redis`` — any server speaking the Redis protocol at REDIS_URL.
+
+The store is a cache: every failure is logged, counted and treated as a
+miss, so an unavailable backend never fails a lookup.
+"""
+import logging
+import os
+import queue
+import socket
+import struct
+import tempfile
+import threading
+import time
+from urllib.parse import quote, urlparse
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+
+from src.database import get_blob, put_blob, delete_blob
+from src.metrics import track, blob_latency, blob_errors
+
+load_dotenv()
+
+BLOB_BACKEND = os.getenv("BLOB_BACKEND", "").lower()
+BLOB_DIR = os.getenv("BLOB_DIR", "blobs")
+REDIS_URL = os.getenv("REDIS_URL", "redis://127.0.0.1:6379/0")
+# Socket timeout for the Redis backend; a slow cache is worse than a miss
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", "1"))
+REDIS_MAX_CONNECTIONS = int(os.getenv("REDIS_MAX_CONNECTIONS", "16"))
+# Keys are namespaced so several bots can share one server
+BLOB_KEY_PREFIX = os.getenv("BLOB_KEY_PREFIX", "tgdefbot:")
+
+
+class BlobStore:
+    """Byte values by string key, with an optional time to live in seconds.
+
+    Subclasses implement ``_get``, ``_put`` and ``_delete`` and list the
+    exceptions their backend raises in ``errors``.
+    """
+
+    name = "none"
+    errors = ()
+    enabled = True
+    # False when the backend is the Words table's own database, which already shares definitions
+    caches_definitions = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "puts": 0, "errors": 0}
+
+    def _count(self, name):
+        with self._lock:
+            self._stats[name] += 1
+
+    def _call(self, op, func, *args):
+        try:
+            with track(blob_latency, blob_errors, backend=self.name, op=op):
+                return func(*args)
+        except self.errors as e:
+            self._count("errors")
+            logging.warning(f"Blob store '{self.name}' failed to {op} {args[0]!r}. Error: {e}")
+            return None
+
+    def get(self, key):
+        """Return the bytes stored under key, or None if missing, expired or unavailable."""
+        data = self._call("get", self._get, key)
+        self._count("hits" if data is not None else "misses")
+        return data
+
+    def put(self, key, data, ttl=None):
+        self._call("put", self._put, key, bytes(data), ttl)
+        self._count("puts")
+
+    def delete(self, key):
+        self._call("delete", self._delete, key)
+
+    def stats(self):
+        with self._lock:
+            return dict(self._stats)
+
+    def _get(self, key):
+        return None
+
+    def _put(self, key, data, ttl):
+        pass
+
+    def _delete(self, key):
+        pass
+
+
+class NullBlobStore(BlobStore):
+    """Shares nothing; every get is a miss."""
+
+    enabled = False
+    caches_definitions = False
+
+    def get(self, key):
+        return None
+
+    def put(self, key, data, ttl=None):
+        pass
+
+
+class LocalBlobStore(BlobStore):
+    """One file per key in a directory, written atomically.
+
+    Each file starts with its expiry as a big-endian double (0 for none).
+    Expired files are removed when read.
+    """
+
+    name = "local"
+    errors = (OSError,)
+    _header = struct.Struct(">d")
+
+    def __init__(self, directory):
+        super().__init__()
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key):
+        return os.path.join(self.directory, quote(key, safe=""))
+
+    def _get(self, key):
+        try:
+            with open(self._path(key), "rb") as f:
+                blob = f.read()
+        except FileNotFoundError:
+            return None
+        if len(blob) < self._header.size:
+            return None
+        expires_at, = self._header.unpack_from(blob)
+        if expires_at and expires_at <= time.time():
+            self._delete(key)
+            return None
+        return blob[self._header.size:]
+
+    def _put(self, key, data, ttl):
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(self._header.pack(time.time() + ttl if ttl else 0))
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def _delete(self, key):
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+
+
+class PostgresBlobStore(BlobStore):
+    """The Blobs table (see src/migrations.py), through the bot's connection pool."""
+
+    name = "postgres"
+    errors = (DatabaseError,)
+    caches_definitions = False
+
+    def _get(self, key):
+        return get_blob(key)
+
+    def _put(self, key, data, ttl):
+        put_blob(key, data, ttl)
+
+    def _delete(self, key):
+        delete_blob(key)
+
+
+class RedisError(Exception):
+    """The server answered with an error reply."""
+
+
+class RedisClient:
+    """Minimal client for the Redis protocol (RESP2) with a small connection pool.
+
+    Only what the blob store needs: a command is sent, one reply is read.
+    A connection that fails mid-command is closed instead of being reused,
+    and each process (forked webhook workers included) opens its own.
+    URLs look like ``redis://[:password@]host[:port][/db]``.
+    """
+
+    def __init__(self, url, timeout=REDIS_TIMEOUT, max_connections=REDIS_MAX_CONNECTIONS):
+        parsed = urlparse(url)
+        self.host = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 6379
+        self.password = parsed.password
+        self.db = int(parsed.path.lstrip("/") or 0)
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self._reset()
+
+    def _reset(self):
+        # Sockets inherited from the parent process are never used; they are left for it to close
+        self._pid = os.getpid()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.max_connections)
+
+    def _connect(self):
+        sock = socket.create_connection((self.host, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        conn = (sock, sock.makefile("rb"))
+        try:
+            if self.password:
+                self._command(conn, "AUTH", self.password)
+            if self.db:
+                self._command(conn, "SELECT", self.db)
+        except BaseException:
+            self._close(conn)
+            raise
+        return conn
+
+    @staticmethod
+    def _close(conn):
+        sock, reader = conn
+        reader.close()
+        sock.close()
+
+    @staticmethod
+    def _encode(args):
+        parts = [b"*%d\r\n" % len(args)]
+        for arg in args:
+            if isinstance(arg, str):
+                arg = arg.encode("utf-8")
+            elif isinstance(arg, int):
+                arg = str(arg).encode("ascii")
+            parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+        return b"".join(parts)
+
+    @staticmethod
+    def _length(body):
+        try:
+            return int(body)
+        except ValueError:
+            # The stream is out of step; the connection is closed rather than reused
+            raise ConnectionError(f"Malformed Redis reply {body[:20]!r}") from None
+
+    def _read_reply(self, reader):
+        line = reader.readline()
+        if not line.endswith(b"\r\n"):
+            raise ConnectionError("Connection closed by the Redis server")
+        kind, body = line[:1], line[1:-2]
+        if kind == b"+":
+            return body.decode("utf-8")
+        if kind == b"-":
+            raise RedisError(body.decode("utf-8", errors="replace"))
+        if kind == b":":
+            return self._length(body)
+        if kind == b"$":
+            length = self._length(body)
+            if length < 0:
+                return None
+            data = reader.read(length + 2)
+            if len(data) != length + 2:
+                raise ConnectionError("Connection closed by the Redis server")
+            return data[:-2]
+        if kind == b"*":
+            length = self._length(body)
+            return None if length < 0 else [self._read_reply(reader) for _ in range(length)]
+        raise ConnectionError(f"Unexpected Redis reply {line[:20]!r}")
+
+    def _command(self, conn, *args):
+        sock, reader = conn
+        sock.sendall(self._encode(args))
+        return self._read_reply(reader)
+
+    def execute(self, *args):
+        """Run one command and return its reply; raises RedisError or OSError."""
+        if self._pid != os.getpid():
+            self._reset()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError("No free Redis connection")
+        try:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                reply = self._command(conn, *args)
+            except RedisError:
+                self._idle.put(conn)
+                raise
+            except BaseException:
+                self._close(conn)
+                raise
+            self._idle.put(conn)
+            return reply
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._close(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+
+class RedisBlobStore(BlobStore):
+    """A Redis-compatible server (Redis, Valkey, KeyDB, ...) at REDIS_URL."""
+
+    name = "redis"
+    errors = (OSError, RedisError)
+
+    def __init__(self, url=REDIS_URL, prefix=BLOB_KEY_PREFIX, **kwargs):
+        super().__init__()
+        self.client = RedisClient(url, **kwargs)
+        self.prefix = prefix
+
+    def _get(self, key):
+        return self.client.execute("GET", self.prefix + key)
+
+    def _put(self, key, data, ttl):
+        if ttl:
+            # In milliseconds: int(ttl) seconds would turn a TTL under a second into the "EX 0" Redis rejects
+            self.client.execute("SET", self.prefix + key, data, "PX", max(1, round(ttl * 1000)))
+        else:
+            self.client.execute("SET", self.prefix + key, data)
+
+    def _delete(self, key):
+        self.client.execute("DEL", self.prefix + key)
+
+
+def create_blob_store(backend=BLOB_BACKEND):
+    """Return the BlobStore for a BLOB_BACKEND value."""
+    if not backend or backend == "none":
+        return NullBlobStore()
+    if backend == "local":
+        return LocalBlobStore(BLOB_DIR)
+    if backend == "postgres":
+        return PostgresBlobStore()
+    if backend == "redis":
+        return RedisBlobStore(REDIS_URL)
+    raise ValueError(f"Unknown BLOB_BACKEND '{backend}'")
+
+
+blob_store = create_blob_store()
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Thread-safe LRU cache whose entries go stale after ``ttl`` seconds.
+
+    Stale entries are kept (until evicted) so callers can serve them while a
+    fresh value is fetched; ``get()`` ignores them, ``get_entry()`` returns them
+    flagged as stale.
+    """
+
+    def __init__(self, maxsize=1024, ttl=None):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_entry(self, key):
+        """Return ``(value, is_stale)`` for key, or None if it is not cached."""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            value, stored_at = item
+        is_stale = self.ttl is not None and time.monotonic() - stored_at > self.ttl
+        return value, is_stale
+
+    def get(self, key, default=None):
+        entry = self.get_entry(key)
+        if entry is None or entry[1]:
+            return default
+        return entry[0]
+
+    def peek(self, key, default=None):
+        """Return the fresh value for key without counting a lookup or refreshing its recency."""
+        with self._lock:
+            item = self._data.get(key)
+        if item is None or (self.ttl is not None and time.monotonic() - item[1] > self.ttl):
+            return default
+        return item[0]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (value, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._data
+
+    def __len__(self):
+        with self._lock:
+            return len(self._data)
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
@@ -0,0 +1,170 @@
+"""Compact binary callback data for inline keyboard buttons.
+
+Telegram limits callback_data to 64 bytes. A button's data is packed as::
+
+    action: u8 | field | field | ...
+
+and base64url-encoded without padding, leaving 48 raw bytes. Integer fields
+(word ids, grades) are unsigned LEB128 varints. A text field is a varint
+header ``length << 1`` followed by the UTF-8 bytes, or ``token << 1 | 1``
+when the text would not fit and was parked in the token store instead, so
+any word or phrase can ride on a button.
+
+The user is not encoded: handlers take it from the callback's sender.
+"""
+import base64
+import binascii
+import enum
+import os
+import secrets
+
+from dotenv import load_dotenv
+
+from src.cache import LRUCache
+
+load_dotenv()
+
+# Texts too long for a button are kept this long (seconds) and then the button expires
+CALLBACK_TOKEN_TTL = int(os.getenv("CALLBACK_TOKEN_TTL", str(24 * 3600)))
+CALLBACK_TOKEN_CACHE_SIZE = int(os.getenv("CALLBACK_TOKEN_CACHE_SIZE", "100000"))
+
+CALLBACK_DATA_MAX_BYTES = 48  # 64 base64 characters
+
+
+class Action(enum.IntEnum):
+    HOME = 1
+    PROMPT_ADD = 2
+    SHOW_WORDS = 3
+    RANDOM = 4
+    REVIEW = 5
+    LETTERS = 6
+    DEFINE = 7       # word_id
+    DELETE = 8       # word_id
+    ADD = 9          # word
+    LOOKUP = 10      # word
+    PAGE_NEXT = 11   # sort key of the page's last word
+    PAGE_PREV = 12   # sort key of the page's first word
+    JUMP = 13        # letter
+    REVEAL = 14      # word_id
+    GRADE = 15       # quality, word_id
+
+
+INT, TEXT = "int", "text"
+
+# Field types of each action's arguments
+SCHEMA = {
+    Action.DEFINE: (INT,),
+    Action.DELETE: (INT,),
+    Action.ADD: (TEXT,),
+    Action.LOOKUP: (TEXT,),
+    Action.PAGE_NEXT: (TEXT,),
+    Action.PAGE_PREV: (TEXT,),
+    Action.JUMP: (TEXT,),
+    Action.REVEAL: (INT,),
+    Action.GRADE: (INT, INT),
+}
+
+
+class CallbackDataError(ValueError):
+    """The data is malformed, from an older keyboard, or refers to an expired token."""
+
+
+class TokenStore:
+    """Short-lived server-side storage for texts too long to fit in callback data.
+
+    Tokens are random so they stay unambiguous across restarts and webhook
+    workers; updates from one chat are always handled by the same worker,
+    so a token is resolved by the process that issued it.
+    """
+
+    def __init__(self, maxsize=CALLBACK_TOKEN_CACHE_SIZE, ttl=CALLBACK_TOKEN_TTL):
+        self.cache = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def put(self, text):
+        token = secrets.randbits(40)
+        self.cache.set(token, text)
+        return token
+
+    def get(self, token):
+        return self.cache.get(token)
+
+
+token_store = TokenStore()
+
+
+def _write_varint(buffer, value):
+    if value < 0:
+        raise ValueError(f"Cannot encode negative value {value}")
+    while value >= 0x80:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(data, offset):
+    value = shift = 0
+    while True:
+        if offset >= len(data) or shift > 63:
+            raise CallbackDataError("Truncated varint")
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def _pack(action, args, use_tokens):
+    buffer = bytearray((action,))
+    for kind, arg in zip(SCHEMA.get(action, ()), args):
+        if kind == INT:
+            _write_varint(buffer, arg)
+        elif use_tokens:
+            _write_varint(buffer, token_store.put(arg) << 1 | 1)
+        else:
+            encoded = arg.encode("utf-8")
+            _write_varint(buffer, len(encoded) << 1)
+            buffer += encoded
+    return buffer
+
+
+def encode(action, *args):
+    """Return the callback_data string for a button running action with args."""
+    if len(args) != len(SCHEMA.get(action, ())):
+        raise ValueError(f"{action.name} takes {len(SCHEMA.get(action, ()))} arguments")
+    packed = _pack(action, args, use_tokens=False)
+    if len(packed) > CALLBACK_DATA_MAX_BYTES:
+        packed = _pack(action, args, use_tokens=True)
+    return base64.urlsafe_b64encode(packed).rstrip(b"=").decode("ascii")
+
+
+def decode(data):
+    """Return (Action, args) for callback_data; raises CallbackDataError if it cannot be used."""
+    try:
+        packed = base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+        action = Action(packed[0])
+    except (binascii.Error, ValueError, IndexError) as e:
+        raise CallbackDataError(f"Unrecognised callback data {data!r}") from e
+    args = []
+    offset = 1
+    for kind in SCHEMA.get(action, ()):
+        value, offset = _read_varint(packed, offset)
+        if kind == INT:
+            args.append(value)
+        elif value & 1:
+            text = token_store.get(value >> 1)
+            if text is None:
+                raise CallbackDataError(f"Expired token in {action.name} callback")
+            args.append(text)
+        else:
+            end = offset + (value >> 1)
+            if end > len(packed):
+                raise CallbackDataError("Truncated text field")
+            try:
+                args.append(packed[offset:end].decode("utf-8"))
+            except UnicodeDecodeError as e:
+                raise CallbackDataError("Invalid text field") from e
+            offset = end
+    if offset != len(packed):
+        raise CallbackDataError(f"Trailing bytes in {action.name} callback")
+    return action, tuple(args)
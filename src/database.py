@@ -1,75 +1,434 @@
+import io
 import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from functools import wraps
 import psycopg2
-from psycopg2 import OperationalError
+from psycopg2 import OperationalError, InterfaceError
+from psycopg2.extensions import QueryCanceledError, TransactionRollbackError
+from psycopg2.extras import Json
 from dotenv import load_dotenv
 import logging
 
+from src.cache import LRUCache
+from src.metrics import track, timed_query, db_latency, db_errors
+from src.random_deck import random_decks, RANDOM_NO_REPEAT
+
 load_dotenv()
 
+# Connection pool settings
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+DB_POOL_HEALTH_CHECK_INTERVAL = float(os.getenv("DB_POOL_HEALTH_CHECK_INTERVAL", "30"))
+
+# Arbitrary keys for advisory_lock() so only one replica sends reminders or the weekly digest at a time
+DIGEST_LOCK_ID = 7203542
+REMINDER_LOCK_ID = 7203543
+
+# word_id -> word, for callback buttons that carry word ids
+word_names = LRUCache(maxsize=int(os.getenv("WORD_NAME_CACHE_SIZE", "20000")))
+
+
+class PoolTimeoutError(OperationalError):
+    """Raised when no connection becomes available within the pool timeout."""
+
+
+def is_connection_error(e):
+    """Whether e means the connection itself failed, rather than the server aborting one statement.
+
+    Deadlocks, serialization failures and statement timeouts are OperationalErrors
+    too, but they leave the connection usable.
+    """
+    return (isinstance(e, (OperationalError, InterfaceError))
+            and not isinstance(e, (TransactionRollbackError, QueryCanceledError, PoolTimeoutError)))
+
+
+def _connect():
+    return psycopg2.connect(
+        dbname=os.getenv("DB_NAME"),
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("DB_HOST"),
+        port=os.getenv("DB_PORT")
+    )
+
 def connect_to_db():
     try:
-        conn = psycopg2.connect(
-            dbname=os.getenv("DB_NAME"),
-            user=os.getenv("DB_USER"),
-            password=os.getenv("DB_PASSWORD"),
-            host=os.getenv("DB_HOST"),
-            port=os.getenv("DB_PORT")
-        )
+        conn = _connect()
         logging.info("Connected to database successfully")
         return conn
     except OperationalError as e:
         logging.error(f"The error '{e}' occurred")
         return None
 
+
+class ConnectionPool:
+    """Thread-safe, bounded pool of psycopg2 connections.
+
+    Connections are checked out with the ``connection()`` context manager,
+    which commits on success, rolls back on error and drops connections that
+    broke (see is_connection_error) so that the next checkout reconnects.
+    """
+
+    def __init__(self, connect=_connect, min_size=DB_POOL_MIN_SIZE, max_size=DB_POOL_MAX_SIZE,
+                 timeout=DB_POOL_TIMEOUT, health_check_interval=DB_POOL_HEALTH_CHECK_INTERVAL):
+        self._connect = connect
+        self.min_size = min(min_size, max_size)
+        self.max_size = max_size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()  # (conn, last_used) pairs, most recently used on the right
+        self._size = 0
+        self._in_use = 0
+        self._closed = False
+        self._cond = threading.Condition()
+        self._stats = {
+            "acquisitions": 0,
+            "waits": 0,
+            "timeouts": 0,
+            "acquire_time_total": 0.0,
+            "acquire_time_max": 0.0,
+            "connections_opened": 0,
+            "connections_closed": 0,
+            "health_check_failures": 0,
+        }
+
+    def _open(self):
+        conn = self._connect()
+        self._stats["connections_opened"] += 1
+        return conn
+
+    def _discard(self, conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._stats["connections_closed"] += 1
+
+    def _is_healthy(self, conn, last_used):
+        if conn.closed:
+            return False
+        if time.monotonic() - last_used < self.health_check_interval:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (OperationalError, InterfaceError):
+            self._stats["health_check_failures"] += 1
+            return False
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        waited = False
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise InterfaceError("connection pool is closed")
+                if self._idle:
+                    conn, last_used = self._idle.pop()
+                    self._in_use += 1
+                    break
+                if self._size < self.max_size:
+                    conn, last_used = None, None
+                    self._size += 1
+                    self._in_use += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._stats["timeouts"] += 1
+                    raise PoolTimeoutError(f"no database connection available within {self.timeout}s")
+                waited = True
+                self._cond.wait(remaining)
+
+        # Connecting and health checks happen outside the lock
+        try:
+            if conn is not None and not self._is_healthy(conn, last_used):
+                logging.warning("Discarding unhealthy pooled database connection")
+                with self._cond:
+                    self._discard(conn)
+                conn = None
+            if conn is None:
+                conn = self._open()
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._in_use -= 1
+                self._cond.notify()
+            raise
+
+        elapsed = time.monotonic() - start
+        with self._cond:
+            self._stats["acquisitions"] += 1
+            self._stats["acquire_time_total"] += elapsed
+            self._stats["acquire_time_max"] = max(self._stats["acquire_time_max"], elapsed)
+            if waited:
+                self._stats["waits"] += 1
+        return conn
+
+    def release(self, conn, discard=False):
+        if not discard and not conn.closed:
+            try:
+                if conn.info.transaction_status != psycopg2.extensions.TRANSACTION_STATUS_IDLE:
+                    conn.rollback()
+            except (OperationalError, InterfaceError):
+                discard = True
+        with self._cond:
+            self._in_use -= 1
+            if discard or conn.closed or self._closed:
+                self._discard(conn)
+                self._size -= 1
+            else:
+                self._idle.append((conn, time.monotonic()))
+            self._cond.notify()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn
+            conn.commit()
+        except BaseException as e:
+            # Includes GeneratorExit from abandoned streaming generators
+            if is_connection_error(e):
+                discard = True
+                raise
+            try:
+                conn.rollback()
+            except (OperationalError, InterfaceError):
+                discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def fill(self):
+        """Open connections until the pool holds at least min_size of them."""
+        while True:
+            with self._cond:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._open()
+            except Exception:
+                with self._cond:
+                    self._size -= 1
+                raise
+            with self._cond:
+                self._idle.appendleft((conn, time.monotonic()))
+                self._cond.notify()
+
+    def close(self):
+        with self._cond:
+            self._closed = True
+            while self._idle:
+                conn, _ = self._idle.pop()
+                self._discard(conn)
+                self._size -= 1
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            stats = dict(self._stats)
+            stats.update({
+                "size": self._size,
+                "max_size": self.max_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+            })
+        acquisitions = stats["acquisitions"]
+        stats["acquire_time_avg"] = stats["acquire_time_total"] / acquisitions if acquisitions else 0.0
+        return stats
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+def get_pool():
+    """Return the process-wide connection pool, creating it on first use."""
+    global _pool, _pool_pid
+    # Forked webhook workers must not share the parent's sockets
+    if _pool is None or _pool_pid != os.getpid():
+        with _pool_lock:
+            if _pool is None or _pool_pid != os.getpid():
+                pool = ConnectionPool()
+                try:
+                    pool.fill()
+                except OperationalError as e:
+                    logging.error(f"The error '{e}' occurred while filling the connection pool")
+                _pool = pool
+                _pool_pid = os.getpid()
+    return _pool
+
+def get_connection():
+    """Context manager yielding a pooled connection: ``with get_connection() as conn: ...``"""
+    return get_pool().connection()
+
+def get_pool_stats():
+    return get_pool().stats()
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
+
+def with_reconnect(func):
+    """Retry a database function once if its connection dropped mid-query.
+
+    A dropped connection leaves it unknown whether a write committed, so only
+    idempotent functions may use this; the others are decorated with
+    timed_query and let the error reach the caller.
+    """
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        # Timed here so every query function is instrumented, retry included
+        with track(db_latency, db_errors, query=func.__name__):
+            try:
+                return func(*args, **kwargs)
+            except (OperationalError, InterfaceError) as e:
+                if not is_connection_error(e):
+                    raise
+                logging.warning(f"Database connection lost in {func.__name__}: '{e}', retrying")
+                return func(*args, **kwargs)
+    return wrapper
+
+
+# Words are matched on lower(word), which the words_word_lower_key unique index serves
+# (see src/migrations.py); each function below is a single round trip.
+
+@timed_query
 def add_word_to_db(word, user_id):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"add_word_to_db called with word={word}, user_id={user_id}")
-
-    cursor.execute("SELECT user_id FROM Users WHERE user_id = %s", (user_id,))
-    existing_user_id = cursor.fetchone()
-    
-    if existing_user_id is None:
-        cursor.execute("INSERT INTO Users (user_id) VALUES (%s)", (user_id,))
-        logging.info(f"Added new user: {user_id}")
-
-    cursor.execute("SELECT word_id FROM Words WHERE word = %s", (word,))
-    word_id = cursor.fetchone()
-    
-    if word_id is None:
-        cursor.execute("INSERT INTO Words (word) VALUES (%s) RETURNING word_id", (word,))
-        word_id = cursor.fetchone()[0]
-        logging.info(f"Added new word: {word} with id: {word_id}")
-    else:
-        word_id = word_id[0]
-
-    cursor.execute("INSERT INTO UserWords (user_id, word_id) VALUES (%s, %s) ON CONFLICT DO NOTHING", (user_id, word_id))
-    logging.info(f"Linked user {user_id} with word {word} (id: {word_id})")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
-
-def delete_word_from_db(word, user_id):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"delete_word_from_db called with word={word}, user_id={user_id}")
-
-    cursor.execute("SELECT word_id FROM Words WHERE word = %s", (word,))
-    word_id = cursor.fetchone()
-    if word_id:
-        word_id = word_id[0]
-        cursor.execute("DELETE FROM UserWords WHERE user_id = %s AND word_id = %s", (user_id, word_id))
-        logging.info(f"Deleted word {word} (id: {word_id}) for user {user_id}")
-
-    conn.commit()
-    cursor.close()
-    conn.close()
+    """Add word to the user's dictionary; returns (word_id, whether it was newly added)."""
+    logging.debug("add_word_to_db called with word=%s, user_id=%s", word, user_id)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH new_user AS (
+                INSERT INTO Users (user_id) VALUES (%(user_id)s) ON CONFLICT DO NOTHING
+            ), word_row AS (
+                INSERT INTO Words (word) VALUES (%(word)s)
+                ON CONFLICT ((lower(word))) DO UPDATE SET word = Words.word
+                RETURNING word_id
+            ), linked AS (
+                INSERT INTO UserWords (user_id, word_id, sort_key)
+                SELECT %(user_id)s, word_id, lower(%(word)s) FROM word_row
+                ON CONFLICT DO NOTHING
+                RETURNING user_id, word_id
+            ), review AS (
+                INSERT INTO ReviewState (user_id, word_id)
+                SELECT user_id, word_id FROM linked
+            ), rollup AS (
+                INSERT INTO UserDailyStats (user_id, day, words_added)
+                SELECT user_id, (now() AT TIME ZONE 'UTC')::date, 1 FROM linked
+                ON CONFLICT (user_id, day) DO UPDATE SET words_added = UserDailyStats.words_added + 1
+            )
+            SELECT word_id, EXISTS (SELECT 1 FROM linked) FROM word_row
+            """,
+            {"word": word, "user_id": user_id}
+        )
+        word_id, added = cursor.fetchone()
+    if added:
+        random_decks.word_added(user_id, word_id)
+    logging.debug("Linked user %s with word %s (id: %s)", user_id, word, word_id)
+    return word_id, added
 
+@timed_query
+def add_words_bulk(words, user_id):
+    """Add many words to a user's dictionary in one transaction.
+
+    The words are COPYed into a temporary table and linked with two
+    set-based statements. Returns the number of words newly added.
+    """
+    logging.debug("add_words_bulk called with %s words, user_id=%s", len(words), user_id)
+    buffer = io.StringIO()
+    for word in words:
+        buffer.write(word.replace("\\", "\\\\").replace("\t", "\\t") + "\n")
+    buffer.seek(0)
+
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("INSERT INTO Users (user_id) VALUES (%s) ON CONFLICT DO NOTHING", (user_id,))
+        cursor.execute("CREATE TEMP TABLE import_words (word VARCHAR(255)) ON COMMIT DROP")
+        cursor.copy_expert("COPY import_words (word) FROM STDIN", buffer)
+        cursor.execute("""
+        INSERT INTO Words (word)
+        SELECT DISTINCT ON (lower(word)) word FROM import_words
+        ON CONFLICT ((lower(word))) DO NOTHING
+        """)
+        cursor.execute("""
+        WITH linked AS (
+            INSERT INTO UserWords (user_id, word_id, sort_key)
+            SELECT DISTINCT %(user_id)s, w.word_id, lower(w.word) FROM Words w
+            INNER JOIN import_words i ON lower(w.word) = lower(i.word)
+            ON CONFLICT DO NOTHING
+            RETURNING user_id, word_id
+        ), review AS (
+            INSERT INTO ReviewState (user_id, word_id)
+            SELECT user_id, word_id FROM linked
+        ), rollup AS (
+            INSERT INTO UserDailyStats (user_id, day, words_added)
+            SELECT %(user_id)s, (now() AT TIME ZONE 'UTC')::date, count(*) FROM linked HAVING count(*) > 0
+            ON CONFLICT (user_id, day) DO UPDATE
+            SET words_added = UserDailyStats.words_added + EXCLUDED.words_added
+        )
+        SELECT count(*) FROM linked
+        """, {"user_id": user_id})
+        added = cursor.fetchone()[0]
+    random_decks.invalidate(user_id)
+    logging.debug("Imported %s new words for user %s", added, user_id)
+    return added
+
+def iter_user_words(user_id, batch_size=1000):
+    """Stream (word, date_added) rows of a user's dictionary through a server-side cursor."""
+    logging.debug("iter_user_words called with user_id=%s", user_id)
+    with get_connection() as conn:
+        with conn.cursor(name=f"export_words_{user_id}") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("""
+            SELECT w.word, uw.date_added FROM Words w
+            INNER JOIN UserWords uw ON w.word_id = uw.word_id
+            WHERE uw.user_id = %s
+            ORDER BY w.word
+            """, (user_id,))
+            for row in cursor:
+                yield row
+
+@timed_query
+def delete_user_word(user_id, word_id):
+    """Remove a word from the user's dictionary; returns False if it was not in it."""
+    logging.debug("delete_user_word called with user_id=%s, word_id=%s", user_id, word_id)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            WITH deleted AS (
+                DELETE FROM UserWords WHERE user_id = %(user_id)s AND word_id = %(word_id)s
+                RETURNING user_id
+            ), rollup AS (
+                INSERT INTO UserDailyStats (user_id, day, words_removed)
+                SELECT user_id, (now() AT TIME ZONE 'UTC')::date, 1 FROM deleted
+                ON CONFLICT (user_id, day) DO UPDATE SET words_removed = UserDailyStats.words_removed + 1
+            )
+            SELECT count(*) FROM deleted
+            """,
+            {"user_id": user_id, "word_id": word_id}
+        )
+        deleted = cursor.fetchone()[0] > 0
+    if deleted:
+        random_decks.word_removed(user_id, word_id)
+    return deleted
+
+@with_reconnect
 def get_words_from_db(user_id, limit, offset, sort=False):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"get_words_from_db called with user_id={user_id}, limit={limit}, offset={offset}, sort={sort}")
+    logging.debug("get_words_from_db called with user_id=%s, limit=%s, offset=%s, sort=%s",
+                  user_id, limit, offset, sort)
 
     query = """
     SELECT w.word FROM Words w
@@ -79,77 +438,432 @@ def get_words_from_db(user_id, limit, offset, sort=False):
     if sort:
         query += " ORDER BY w.word"
     query += " LIMIT %s OFFSET %s"
-    
-    cursor.execute(query, (user_id, limit, offset))
-    
-    words = cursor.fetchall()
-    logging.info(f"Fetched words for user {user_id}: {words}")
-    cursor.close()
-    conn.close()
+
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(query, (user_id, limit, offset))
+        words = cursor.fetchall()
+    logging.debug("Fetched %d words for user %s", len(words), user_id)
     return [word[0] for word in words]
 
-def get_word_count(user_id):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"get_word_count called with user_id={user_id}")
+# (rows condition, order, condition for words on the other side of the bound) per page direction
+_PAGE_DIRECTIONS = {
+    "after": (">", "ASC", "<="),
+    "from": (">=", "ASC", "<"),
+    "before": ("<", "DESC", ">="),
+}
 
-    cursor.execute("""
-    SELECT COUNT(*) FROM UserWords uw
-    WHERE uw.user_id = %s
-    """, (user_id,))
-    
-    count = cursor.fetchone()[0]
-    logging.info(f"Word count for user {user_id}: {count}")
-    cursor.close()
-    conn.close()
-    return count
+@with_reconnect
+def get_words_page(user_id, limit, bound="", direction="after"):
+    """Fetch one Dictionary page by keyset instead of OFFSET.
 
-def update_audio_link(word, audio_path):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"update_audio_link called with word={word}, audio_path={audio_path}")
+    ``direction`` is "after" (words following ``bound``), "from" (words
+    starting at ``bound``, used for the A-Z jump) or "before" (the page
+    preceding ``bound``). Returns (page, total_words, has_prev, has_next)
+    where page is a list of (word_id, word, sort_key); the page, the total and the
+    neighbour check come from one query served by the (user_id, sort_key) index.
+    """
+    logging.debug("get_words_page called with user_id=%s, limit=%s, bound=%s, direction=%s",
+                  user_id, limit, bound, direction)
+    op, order, other_op = _PAGE_DIRECTIONS[direction]
+    query = f"""
+    SELECT p.word_id, p.word, p.sort_key,
+           (SELECT COUNT(*) FROM UserWords WHERE user_id = %(user_id)s),
+           EXISTS (SELECT 1 FROM UserWords WHERE user_id = %(user_id)s AND sort_key {other_op} %(bound)s)
+    FROM (SELECT 1) AS one
+    LEFT JOIN LATERAL (
+        SELECT w.word_id, w.word, uw.sort_key FROM UserWords uw
+        INNER JOIN Words w ON w.word_id = uw.word_id
+        WHERE uw.user_id = %(user_id)s AND uw.sort_key {op} %(bound)s
+        ORDER BY uw.sort_key {order}
+        LIMIT %(limit)s
+    ) AS p ON TRUE
+    ORDER BY p.sort_key {order}
+    """
+    with get_connection() as conn, conn.cursor() as cursor:
+        # One extra row tells whether there is another page in the scan direction
+        cursor.execute(query, {"user_id": user_id, "bound": bound, "limit": limit + 1})
+        rows = cursor.fetchall()
+    return _page_result(rows, limit, direction)
+
+def _page_result(rows, limit, direction):
+    """Turn (word_id, word, sort_key, total, has_other_side) rows into (page, total_words, has_prev, has_next)."""
+    total_words, has_other_side = rows[0][3], rows[0][4]
+    page = [(row[0], row[1], row[2]) for row in rows if row[0] is not None]
+    has_more = len(page) > limit
+    page = page[:limit]
+    # Dictionary buttons carry word ids; remember the words so a click needs no query
+    for word_id, word, _ in page:
+        word_names.set(word_id, word)
+    if direction == "before":
+        page.reverse()
+        return page, total_words, has_more, has_other_side
+    return page, total_words, has_other_side, has_more
 
-    cursor.execute("UPDATE Words SET audio_path = %s WHERE word = %s", (audio_path, word))
+@with_reconnect
+def get_word_count(user_id):
+    logging.debug("get_word_count called with user_id=%s", user_id)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("""
+        SELECT COUNT(*) FROM UserWords uw
+        WHERE uw.user_id = %s
+        """, (user_id,))
+        count = cursor.fetchone()[0]
+    logging.debug("Word count for user %s: %s", user_id, count)
+    return count
 
-    conn.commit()
-    cursor.close()
-    conn.close()
+@with_reconnect
+def update_audio_link(word, audio_path):
+    logging.debug("update_audio_link called with word=%s, audio_path=%s", word, audio_path)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE Words SET audio_path = %s WHERE lower(word) = lower(%s)", (audio_path, word))
 
+@with_reconnect
 def get_audio_path(word):
-    conn = connect_to_db()
-    cursor = conn.cursor()
-    logging.info(f"get_audio_path called with word={word}")
-
-    cursor.execute("SELECT audio_path FROM Words WHERE word = %s", (word,))
-    audio_path = cursor.fetchone()
-    cursor.close()
-    conn.close()
+    logging.debug("get_audio_path called with word=%s", word)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT audio_path FROM Words WHERE lower(word) = lower(%s)", (word,))
+        audio_path = cursor.fetchone()
     if audio_path:
         return audio_path[0]
     return None
 
-def get_random_word(user_id):
-    """Fetch a random word for a given user."""
-    conn = connect_to_db()
-    if conn is None:
-        return None
-    cursor = conn.cursor()
-    logging.info(f"get_random_word called with user_id={user_id}")
+@with_reconnect
+def get_audio_paths():
+    """Return every audio_path recorded in the Words table."""
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT DISTINCT audio_path FROM Words WHERE audio_path IS NOT NULL")
+        return [row[0] for row in cursor.fetchall()]
 
-    cursor.execute(
-        """
-        SELECT w.word FROM Words w
-        INNER JOIN UserWords uw ON w.word_id = uw.word_id
-        WHERE uw.user_id = %s
-        ORDER BY RANDOM()
-        LIMIT 1
-        """,
-        (user_id,)
-    )
+@with_reconnect
+def clear_audio_paths(audio_paths):
+    logging.debug("clear_audio_paths called with %s paths", len(audio_paths))
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE Words SET audio_path = NULL WHERE audio_path = ANY(%s)", (list(audio_paths),))
+
+@with_reconnect
+def get_audio_file_id(word):
+    logging.debug("get_audio_file_id called with word=%s", word)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT audio_file_id FROM Words WHERE lower(word) = lower(%s)", (word,))
+        file_id = cursor.fetchone()
+    if file_id:
+        return file_id[0]
+    return None
+
+@with_reconnect
+def update_audio_file_id(word, file_id):
+    logging.debug("update_audio_file_id called with word=%s, file_id=%s", word, file_id)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE Words SET audio_file_id = %s WHERE lower(word) = lower(%s)", (file_id, word))
+
+def get_word(word_id):
+    """Return the word with this id, or None; a word's text never changes, so it is cached."""
+    word = word_names.get(word_id)
+    if word is None:
+        word = _fetch_word(word_id)
+        if word is not None:
+            word_names.set(word_id, word)
+    return word
+
+@with_reconnect
+def _fetch_word(word_id):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT word FROM Words WHERE word_id = %s", (word_id,))
+        result = cursor.fetchone()
+    return result[0] if result else None
+
+@with_reconnect
+def get_user_word_ids(user_id):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT word_id FROM UserWords WHERE user_id = %s", (user_id,))
+        return [row[0] for row in cursor.fetchall()]
 
-    result = cursor.fetchone()
-    cursor.close()
-    conn.close()
+@with_reconnect
+def get_user_word(user_id, word_id):
+    """Return the word if it is still in the user's dictionary, else None."""
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT w.word FROM UserWords uw
+            INNER JOIN Words w ON w.word_id = uw.word_id
+            WHERE uw.user_id = %s AND uw.word_id = %s
+            """,
+            (user_id, word_id)
+        )
+        result = cursor.fetchone()
     if result:
         return result[0]
     return None
+
+def get_random_word(user_id, no_repeat=RANDOM_NO_REPEAT):
+    """Fetch a random word for a given user.
+
+    Words are dealt from the user's shuffled deck (src/random_deck.py), so a
+    pick costs one primary-key lookup instead of sorting the dictionary.
+    """
+    logging.debug("get_random_word called with user_id=%s", user_id)
+    deck = random_decks.get(user_id)
+    if deck is None:
+        deck = random_decks.load(user_id, get_user_word_ids(user_id))
+    # Words deleted by another process are dropped from the deck as they come up
+    while True:
+        word_id = deck.draw(no_repeat)
+        if word_id is None:
+            return None
+        word = get_user_word(user_id, word_id)
+        if word is not None:
+            return word
+        deck.remove(word_id)
+
+@with_reconnect
+def peek_random_words(user_id, count):
+    """Return the words get_random_word is going to deal next, in deck order, without dealing them."""
+    deck = random_decks.get(user_id)
+    if deck is None or not RANDOM_NO_REPEAT:
+        return []
+    word_ids = deck.peek(count)
+    if not word_ids:
+        return []
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT w.word FROM unnest(%s::integer[]) WITH ORDINALITY AS d(word_id, position)
+            INNER JOIN UserWords uw ON uw.user_id = %s AND uw.word_id = d.word_id
+            INNER JOIN Words w ON w.word_id = uw.word_id
+            ORDER BY d.position
+            """,
+            (word_ids, user_id)
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+@with_reconnect
+def get_due_reviews(user_id, limit):
+    """Return up to limit (due_at, word_id) pairs of the user's earliest review cards."""
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT due_at, word_id FROM ReviewState WHERE user_id = %s ORDER BY due_at LIMIT %s",
+            (user_id, limit)
+        )
+        return cursor.fetchall()
+
+@with_reconnect
+def get_review_card(user_id, word_id):
+    """Return (word, interval_days, ease, repetitions, lapses) for a review card, or None."""
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT w.word, r.interval_days, r.ease, r.repetitions, r.lapses
+            FROM ReviewState r
+            INNER JOIN Words w ON w.word_id = r.word_id
+            WHERE r.user_id = %s AND r.word_id = %s
+            """,
+            (user_id, word_id)
+        )
+        return cursor.fetchone()
+
+@with_reconnect
+def save_review(user_id, word_id, due_at, interval_days, ease, repetitions, lapses):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE ReviewState
+            SET due_at = %s, interval_days = %s, ease = %s, repetitions = %s, lapses = %s,
+                last_reviewed_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s AND word_id = %s
+            """,
+            (due_at, interval_days, ease, repetitions, lapses, user_id, word_id)
+        )
+
+@with_reconnect
+def get_reminder_batch(now, after, limit):
+    """Return up to limit (user_id, due_count) of users past user_id ``after`` with due reviews.
+
+    Users already reminded today (UTC) are skipped; see mark_reminders_sent.
+    """
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT u.user_id, count(*) FROM Users u
+            INNER JOIN ReviewState r ON r.user_id = u.user_id AND r.due_at <= %(now)s
+            WHERE u.user_id > %(after)s
+              AND (u.last_reminded_on IS NULL OR u.last_reminded_on < (now() AT TIME ZONE 'UTC')::date)
+            GROUP BY u.user_id
+            ORDER BY u.user_id
+            LIMIT %(limit)s
+            """,
+            {"now": now, "after": after, "limit": limit}
+        )
+        return cursor.fetchall()
+
+@with_reconnect
+def mark_reminders_sent(user_ids):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE Users SET last_reminded_on = (now() AT TIME ZONE 'UTC')::date WHERE user_id = ANY(%s)",
+                       (list(user_ids),))
+
+@with_reconnect
+def get_cached_definition(word, max_age):
+    """Return (raw_json, is_stale) stored for word, or None."""
+    logging.debug("get_cached_definition called with word=%s", word)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT raw_json, definition_updated_at < NOW() - %s * INTERVAL '1 second'
+            FROM Words
+            WHERE lower(word) = lower(%s) AND raw_json IS NOT NULL
+            """,
+            (max_age, word)
+        )
+        result = cursor.fetchone()
+    if result:
+        return result[0], bool(result[1])
+    return None
+
+def iter_cached_definitions(batch_size=500):
+    """Stream (word, raw_json) of every stored Merriam-Webster response through a server-side cursor."""
+    with get_connection() as conn:
+        with conn.cursor(name="cached_definitions") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("SELECT word, raw_json FROM Words WHERE raw_json IS NOT NULL")
+            for row in cursor:
+                yield row
+
+def iter_known_words(batch_size=5000):
+    """Stream (word, number of users who saved it) for every word in the Words table."""
+    with get_connection() as conn:
+        with conn.cursor(name="known_words") as cursor:
+            cursor.itersize = batch_size
+            cursor.execute("""
+            SELECT w.word, count(uw.user_id) + 1 FROM Words w
+            LEFT JOIN UserWords uw ON uw.word_id = w.word_id
+            GROUP BY w.word_id
+            """)
+            for row in cursor:
+                yield row
+
+@with_reconnect
+def save_definition(word, definition, audio_link, part_of_speech, pronunciation, raw_json):
+    logging.debug("save_definition called with word=%s", word)
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO Words (word, definition, audio_link, part_of_speech, pronunciation, raw_json, definition_updated_at)
+            VALUES (%s, %s, %s, %s, %s, %s, NOW())
+            ON CONFLICT ((lower(word))) DO UPDATE
+            SET definition = EXCLUDED.definition, audio_link = EXCLUDED.audio_link,
+                part_of_speech = EXCLUDED.part_of_speech, pronunciation = EXCLUDED.pronunciation,
+                raw_json = EXCLUDED.raw_json, definition_updated_at = EXCLUDED.definition_updated_at
+            """,
+            (word, definition, audio_link, part_of_speech, pronunciation, Json(raw_json))
+        )
+
+# Per-user daily rollups (UserDailyStats) behind /stats and the weekly digest. Adds and deletes
+# update them in the same statement as UserWords above; lookups arrive in batches from src/stats.py.
+# Days are UTC dates, whatever the database session's time zone.
+
+@timed_query
+def add_daily_lookups(rows):
+    """Add (user_id, day, lookups) counts to the rollups in one statement."""
+    logging.debug("add_daily_lookups called with %s rows", len(rows))
+    user_ids, days, counts = (list(column) for column in zip(*rows))
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("INSERT INTO Users (user_id) SELECT DISTINCT unnest(%s::integer[]) ON CONFLICT DO NOTHING",
+                       (user_ids,))
+        cursor.execute(
+            """
+            INSERT INTO UserDailyStats (user_id, day, lookups)
+            SELECT * FROM unnest(%s::integer[], %s::date[], %s::integer[])
+            ON CONFLICT (user_id, day) DO UPDATE SET lookups = UserDailyStats.lookups + EXCLUDED.lookups
+            """,
+            (user_ids, days, counts)
+        )
+
+@with_reconnect
+def get_daily_stats(user_id, since):
+    """Return (day, words_added, words_removed, lookups) rows of a user from since on."""
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT day, words_added, words_removed, lookups FROM UserDailyStats
+            WHERE user_id = %s AND day >= %s ORDER BY day
+            """,
+            (user_id, since)
+        )
+        return cursor.fetchall()
+
+@contextmanager
+def advisory_lock(lock_id):
+    """Hold a session-level advisory lock while the block runs; yields False if another process has it.
+
+    The lock's connection stays idle between the two statements, so no
+    transaction is left open while a job sends its messages.
+    """
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (lock_id,))
+            locked = cursor.fetchone()[0]
+        conn.commit()
+        try:
+            yield locked
+        finally:
+            if locked:
+                with conn.cursor() as cursor:
+                    cursor.execute("SELECT pg_advisory_unlock(%s)", (lock_id,))
+
+@with_reconnect
+def get_digest_batch(since, until, digest_on, after, limit):
+    """Return up to limit digest rows of active users past user_id ``after`` still due the digest_on digest.
+
+    Rows are (user_id, words_added, words_removed, lookups, active_days) summed
+    over days in [since, until), in user_id order so the next batch starts
+    after the last row.
+    """
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT s.user_id, sum(s.words_added), sum(s.words_removed), sum(s.lookups), count(*)
+            FROM UserDailyStats s
+            INNER JOIN Users u ON u.user_id = s.user_id
+            WHERE s.user_id > %(after)s AND s.day >= %(since)s AND s.day < %(until)s
+              AND (u.last_digest_on IS NULL OR u.last_digest_on < %(digest_on)s)
+            GROUP BY s.user_id
+            HAVING sum(s.words_added) + sum(s.lookups) > 0
+            ORDER BY s.user_id
+            LIMIT %(limit)s
+            """,
+            {"since": since, "until": until, "digest_on": digest_on, "after": after, "limit": limit}
+        )
+        return cursor.fetchall()
+
+@with_reconnect
+def mark_digests_sent(user_ids, digest_on):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("UPDATE Users SET last_digest_on = %s WHERE user_id = ANY(%s)", (digest_on, list(user_ids)))
+
+# Shared blobs for src/blob_store.py's "postgres" backend; expired rows read as missing until overwritten
+
+@with_reconnect
+def get_blob(key):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT data FROM Blobs WHERE key = %s AND (expires_at IS NULL OR expires_at > NOW())",
+                       (key,))
+        row = cursor.fetchone()
+    return bytes(row[0]) if row else None
+
+@with_reconnect
+def put_blob(key, data, ttl=None):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO Blobs (key, data, expires_at, updated_at)
+            VALUES (%s, %s, NOW() + %s * INTERVAL '1 second', NOW())
+            ON CONFLICT (key) DO UPDATE
+            SET data = EXCLUDED.data, expires_at = EXCLUDED.expires_at, updated_at = EXCLUDED.updated_at
+            """,
+            (key, psycopg2.Binary(data), ttl)
+        )
+
+@with_reconnect
+def delete_blob(key):
+    with get_connection() as conn, conn.cursor() as cursor:
+        cursor.execute("DELETE FROM Blobs WHERE key = %s", (key,))
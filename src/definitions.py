@@ -0,0 +1,247 @@
+import html
+import os
+import re
+from urllib.parse import quote
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Where pronunciation files are served from
+MERRIAM_WEBSTER_MEDIA_URL = os.getenv("MERRIAM_WEBSTER_MEDIA_URL", "https://media.merriam-webster.com/soundc11")
+
+NO_DEFINITION = "No definition found."
+DEFINITION_ERROR = "No definition found due to an error."
+# Telegram's limit for media captions
+CAPTION_MAX_LENGTH = 1024
+
+# Merriam-Webster formatting tokens and the Telegram HTML tag each one maps to.
+# Tokens not listed here are dropped, keeping their text.
+_STYLE_TAGS = {"it": "i", "wi": "i", "qword": "i", "phrase": "b", "b": "b"}
+_CHAR_TOKENS = {"bc": ": ", "ldquo": "“", "rdquo": "”"}
+_TOKEN_RE = re.compile(r"\{(/?)(\w+)((?:\|[^{}]*)?)\}")
+
+
+def parse_markup(text):
+    """Turn MW markup into a tuple of (tag, text) runs in one scan.
+
+    ``tag`` is a Telegram HTML tag name or "" for plain text. A formatting
+    token that is never closed ends with its line, so runs are always balanced.
+    """
+    runs = []
+    tags = []
+    pos = 0
+    for match in _TOKEN_RE.finditer(text):
+        if match.start() > pos:
+            runs.append((tags[-1] if tags else "", text[pos:match.start()]))
+        pos = match.end()
+        closing, name, fields = match.groups()
+        if name in _STYLE_TAGS:
+            if closing:
+                if tags:
+                    tags.pop()
+            else:
+                tags.append(_STYLE_TAGS[name])
+        elif name in _CHAR_TOKENS:
+            runs.append((tags[-1] if tags else "", _CHAR_TOKENS[name]))
+        elif fields:
+            # Cross-reference tokens ({sx|word||}, {a_link|word}) show their first field
+            runs.append((tags[-1] if tags else "", fields[1:].split("|", 1)[0]))
+    if pos < len(text):
+        runs.append((tags[-1] if tags else "", text[pos:]))
+    return tuple(run for run in runs if run[1])
+
+
+class Entry:
+    """One Merriam-Webster entry; text fields hold parsed (tag, text) runs."""
+
+    __slots__ = ("part_of_speech", "pronunciations", "definitions", "examples", "illustration")
+
+    def __init__(self, part_of_speech, pronunciations, definitions, examples, illustration):
+        self.part_of_speech = part_of_speech
+        self.pronunciations = pronunciations
+        self.definitions = definitions
+        self.examples = examples
+        self.illustration = illustration
+
+
+class Definition:
+    """A parsed lookup result, cached in place of the raw JSON and re-rendered on demand.
+
+    ``suggestions`` holds the spellings MW offers when it does not know the word.
+    """
+
+    __slots__ = ("word", "entries", "audio_link", "suggestions", "error")
+
+    def __init__(self, word, entries=(), audio_link=None, suggestions=(), error=False):
+        self.word = word
+        self.entries = entries
+        self.audio_link = audio_link
+        self.suggestions = suggestions
+        self.error = error
+
+    @property
+    def part_of_speech(self):
+        return next((entry.part_of_speech for entry in self.entries if entry.part_of_speech), None)
+
+    @property
+    def pronunciation(self):
+        return next((pr for entry in self.entries for pr in entry.pronunciations), None)
+
+    def __bool__(self):
+        return bool(self.entries)
+
+    def __str__(self):
+        return render_text(self)
+
+
+def _examples(sseq):
+    """Collect the verbal illustrations ("vis") under a sense sequence."""
+    examples = []
+    for sense_group in sseq:
+        for item in sense_group:
+            if not (isinstance(item, list) and len(item) > 1 and isinstance(item[1], dict)):
+                continue
+            for dt_item in item[1].get('dt') or ():
+                if isinstance(dt_item, list) and len(dt_item) > 1 and dt_item[0] == 'vis':
+                    examples.extend(parse_markup(vis['t']) for vis in dt_item[1]
+                                    if isinstance(vis, dict) and vis.get('t'))
+    return examples
+
+
+def parse_definition(word, data):
+    """Parse Merriam-Webster JSON into a Definition with a single walk over the entries."""
+    entries = []
+    suggestions = []
+    audio_link = None
+    for entry in data or ():
+        # Suggestions come back as plain strings when the word is unknown
+        if not isinstance(entry, dict):
+            if isinstance(entry, str):
+                suggestions.append(entry)
+            continue
+        pronunciations = []
+        for pr in (entry.get('hwi') or {}).get('prs') or ():
+            if pr.get('mw'):
+                pronunciations.append(pr['mw'])
+            audio = (pr.get('sound') or {}).get('audio')
+            if audio and audio_link is None:
+                audio_link = f"{MERRIAM_WEBSTER_MEDIA_URL}/{word[0]}/{audio}.wav"
+        examples = []
+        for def_item in entry.get('def') or ():
+            examples.extend(_examples(def_item.get('sseq') or ()))
+        definitions = tuple(((("", shortdef),) for shortdef in entry.get('shortdef') or () if shortdef))
+        illustration = (entry.get('art') or {}).get('artid')
+        if entry.get('fl') or definitions or examples or pronunciations or illustration:
+            entries.append(Entry(entry.get('fl'), tuple(pronunciations), definitions, tuple(examples),
+                                 illustration))
+    return Definition(word, tuple(entries), audio_link, tuple(suggestions))
+
+
+def _lines(definition):
+    """Yield the reply line by line, each as a tuple of (tag, text) runs."""
+    if definition.error:
+        yield (("", DEFINITION_ERROR),)
+        return
+    if not definition.entries:
+        yield (("", NO_DEFINITION),)
+        return
+    for entry in definition.entries:
+        yield ()
+        if entry.part_of_speech:
+            yield (("b", "Part of Speech: "), ("", entry.part_of_speech))
+        for pronunciation in entry.pronunciations:
+            yield (("", f"\\{pronunciation}\\"),)
+        if entry.definitions:
+            yield (("b", "Definitions:"),)
+            for runs in entry.definitions:
+                yield (("", "- "),) + runs
+        if entry.examples:
+            yield (("b", "Usage Examples:"),)
+            for runs in entry.examples:
+                yield (("", "- "),) + runs
+        if entry.illustration:
+            yield (("", f"Illustration: {entry.illustration}"),)
+
+
+def render_text(definition):
+    """Plain-text rendering, stored alongside the raw JSON in the Words table."""
+    return "\n".join("".join(text for _, text in runs) for runs in _lines(definition)).strip()
+
+
+def _run_html(tag, text):
+    text = html.escape(text, quote=False)
+    return f"<{tag}>{text}</{tag}>" if tag else text
+
+
+def _split_line(runs, max_length):
+    """Split one over-long line at word boundaries, closing and reopening tags around each cut."""
+    piece = []
+    length = 0
+    for tag, text in runs:
+        overhead = 2 * len(tag) + 5 if tag else 0
+        for word in re.findall(r"\s*\S+|\s+", text):
+            # A single word longer than a message is cut into raw slices; escaping grows text at most 5x
+            step = max(1, (max_length - overhead) // 5)
+            for part in [word[i:i + step] for i in range(0, len(word), step)]:
+                size = len(html.escape(part, quote=False))
+                if piece and piece[-1][0] == tag:
+                    grow = size
+                else:
+                    grow = size + overhead
+                if piece and length + grow > max_length:
+                    yield "".join(_run_html(t, s) for t, s in piece)
+                    piece = []
+                    length = 0
+                    grow = size + overhead
+                if piece and piece[-1][0] == tag:
+                    piece[-1] = (tag, piece[-1][1] + part)
+                else:
+                    piece.append((tag, part))
+                length += grow
+    if piece:
+        yield "".join(_run_html(t, s) for t, s in piece)
+
+
+def render_html(definition, max_length=3800, translation=None):
+    """Render a Definition as Telegram HTML messages of at most max_length characters.
+
+    Messages are only split between lines, or between words of a line too long
+    for one message, so no tag is ever cut in half.
+    """
+    word = definition.word
+    header = [(("b", "Translation: "), ("", translation))] if translation else []
+    footer = (("", "You can listen to the pronunciation of the word here: "
+                   f"https://youglish.com/pronounce/{quote(word)}/english"),)
+    chunks = []
+    current = []
+    length = 0
+    for runs in header + list(_lines(definition)) + [(), footer]:
+        line = "".join(_run_html(tag, text) for tag, text in runs)
+        if len(line) > max_length:
+            pieces = list(_split_line(runs, max_length))
+        else:
+            pieces = [line]
+        for piece in pieces:
+            # Joining adds one newline per line already in the chunk
+            if current and length + 1 + len(piece) > max_length:
+                chunks.append("\n".join(current))
+                current = []
+                length = 0
+            if current or piece:
+                length += len(piece) + (1 if current else 0)
+                current.append(piece)
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
+
+
+def split_caption(parts, word):
+    """Return (messages, caption) for a reply sent with audio.
+
+    The last message becomes the caption when it fits; otherwise every part
+    is sent as a message and the caption is just the word.
+    """
+    if len(parts[-1]) <= CAPTION_MAX_LENGTH:
+        return parts[:-1], parts[-1]
+    return parts, f"<b>{html.escape(word)}</b>"
@@ -0,0 +1,246 @@
+"""Shared HTTP client for Merriam-Webster and other upstreams.
+
+One requests.Session keeps connections alive per host, every request has a
+connect and a read timeout, transient failures are retried a bounded number
+of times with jittered backoff (or after the Retry-After a 429 or 503 asks
+for), and each host gets a concurrency limit and a circuit breaker. While a
+host's circuit is open, requests fail at once with CircuitOpenError instead
+of tying up worker threads, and callers fall back to whatever they have
+cached.
+"""
+import logging
+import os
+import random
+import threading
+import time
+from contextlib import contextmanager
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+import requests
+from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+
+from src.metrics import track, http_latency, http_errors
+
+load_dotenv()
+
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "15"))
+# Extra attempts after a connection error, timeout, 429 or 5xx
+HTTP_RETRIES = int(os.getenv("HTTP_RETRIES", "2"))
+# Retry n waits a random time up to HTTP_BACKOFF * 2**n seconds
+HTTP_BACKOFF = float(os.getenv("HTTP_BACKOFF", "0.25"))
+# Concurrent requests (and pooled keep-alive connections) per host
+HTTP_MAX_PER_HOST = int(os.getenv("HTTP_MAX_PER_HOST", "8"))
+# Consecutive failed requests that open a host's circuit, and how long it stays open
+HTTP_BREAKER_THRESHOLD = int(os.getenv("HTTP_BREAKER_THRESHOLD", "5"))
+HTTP_BREAKER_RESET = float(os.getenv("HTTP_BREAKER_RESET", "30"))
+
+RETRY_STATUSES = frozenset((429, 500, 502, 503, 504))
+# Statuses whose Retry-After header is honoured
+RETRY_AFTER_STATUSES = frozenset((429, 503))
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """The host failed repeatedly and is not being called until its circuit closes."""
+
+
+class HostBusyError(requests.exceptions.RequestException):
+    """No request slot for the host became free within the connect timeout."""
+
+
+def retry_after(response):
+    """Return the seconds a 429 or 503 response's Retry-After header asks to wait, or None."""
+    if response.status_code not in RETRY_AFTER_STATUSES:
+        return None
+    value = response.headers.get("Retry-After", "").strip()
+    if not value:
+        return None
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError, OverflowError):
+        return None
+
+
+class CircuitBreaker:
+    """Opens after ``failure_threshold`` consecutive failures and rejects calls for ``reset_timeout`` seconds.
+
+    After that a single probe is let through (half-open): it closes the
+    circuit if it succeeds and re-opens it if it fails. A failure that came
+    with a Retry-After opens the circuit at once, until that time.
+    """
+
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name, failure_threshold=HTTP_BREAKER_THRESHOLD, reset_timeout=HTTP_BREAKER_RESET):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.retry_at = 0.0  # when an open circuit lets a probe through
+        self.rejected = 0
+        self._probing = False
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """Return True if a call may go ahead; a True in the half-open state claims the probe."""
+        with self._lock:
+            if self.state == self.OPEN and time.monotonic() >= self.retry_at:
+                self.state = self.HALF_OPEN
+                self._probing = False
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.HALF_OPEN and not self._probing:
+                self._probing = True
+                return True
+            self.rejected += 1
+            return False
+
+    @property
+    def available(self):
+        """Whether a call would currently be let through, without claiming anything."""
+        with self._lock:
+            if self.state == self.OPEN:
+                return time.monotonic() >= self.retry_at
+            return not (self.state == self.HALF_OPEN and self._probing)
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logging.info("Circuit for %s closed", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+            self._probing = False
+
+    def release_probe(self):
+        """Give back a half-open probe claimed by allow() whose call ended without an outcome."""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self._probing = False
+
+    def record_failure(self, retry_after=None):
+        """Count a failed call; ``retry_after`` is the delay the host asked for, if any."""
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold or retry_after is not None:
+                if self.state != self.OPEN:
+                    logging.warning("Circuit for %s opened after %s failures", self.name, self.failures)
+                self.state = self.OPEN
+                self.retry_at = time.monotonic() + (self.reset_timeout if retry_after is None else retry_after)
+                self._probing = False
+
+
+class HttpClient:
+    """Keep-alive session with timeouts, retries, per-host concurrency limits and circuit breakers."""
+
+    def __init__(self, connect_timeout=HTTP_CONNECT_TIMEOUT, read_timeout=HTTP_READ_TIMEOUT, retries=HTTP_RETRIES,
+                 backoff=HTTP_BACKOFF, max_per_host=HTTP_MAX_PER_HOST):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.max_per_host = max_per_host
+        self._session = None
+        self._pid = None
+        self._hosts = {}  # host -> (semaphore, breaker)
+        self._lock = threading.Lock()
+
+    @property
+    def session(self):
+        # Pooled sockets must not be shared with forked webhook workers
+        with self._lock:
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                self._session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=self.max_per_host)
+                self._session.mount("http://", adapter)
+                self._session.mount("https://", adapter)
+            return self._session
+
+    def _host(self, url):
+        host = urlsplit(url).netloc
+        with self._lock:
+            limits = self._hosts.get(host)
+            if limits is None:
+                limits = self._hosts[host] = (threading.BoundedSemaphore(self.max_per_host), CircuitBreaker(host))
+            return limits
+
+    def breaker(self, url):
+        """The CircuitBreaker guarding url's host."""
+        return self._host(url)[1]
+
+    def get(self, url, service, **kwargs):
+        """GET url and return the response with its body read; raises RequestException on failure."""
+        with self.stream(url, service, **kwargs) as response:
+            response.content
+        return response
+
+    @contextmanager
+    def stream(self, url, service, **kwargs):
+        """GET url, yielding the response unread; the host's request slot is held until the block exits."""
+        semaphore, breaker = self._host(url)
+        if not semaphore.acquire(timeout=self.timeout[0]):
+            raise HostBusyError(f"Too many concurrent requests to {urlsplit(url).netloc}")
+        try:
+            with track(http_latency, http_errors, service=service):
+                if not breaker.allow():
+                    raise CircuitOpenError(f"Circuit for {breaker.name} is open")
+                try:
+                    response = self._send(url, breaker, stream=True, **kwargs)
+                finally:
+                    # Whatever _send raised, a claimed probe must not stay claimed forever
+                    breaker.release_probe()
+                with response:
+                    try:
+                        yield response
+                    except requests.exceptions.RequestException:
+                        # The connection broke while the body was being read
+                        breaker.record_failure()
+                        raise
+        finally:
+            semaphore.release()
+
+    def _send(self, url, breaker, **kwargs):
+        for attempt in range(self.retries + 1):
+            delay = None  # the Retry-After of this attempt's response
+            try:
+                response = self.session.get(url, timeout=self.timeout, **kwargs)
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                error = e
+            except requests.exceptions.RequestException:
+                # Not worth retrying (too many redirects, an invalid response...), but still a failed call
+                breaker.record_failure()
+                raise
+            else:
+                if response.status_code not in RETRY_STATUSES:
+                    # Any other answer, 4xx included, shows the host is up
+                    breaker.record_success()
+                    try:
+                        response.raise_for_status()
+                    except requests.exceptions.HTTPError:
+                        response.close()
+                        raise
+                    return response
+                error = requests.exceptions.HTTPError(f"{response.status_code} {response.reason} for url: {url}",
+                                                      response=response)
+                response.close()
+                delay = retry_after(response)
+                if delay is not None and delay > self.timeout[1]:
+                    # Waiting longer than a read timeout isn't worth it; the circuit stays open until then
+                    break
+            if attempt < self.retries:
+                time.sleep(delay if delay is not None else random.uniform(0, self.backoff * 2 ** attempt))
+        breaker.record_failure(retry_after=delay)
+        raise error
+
+    def stats(self):
+        """{host: 1 if its circuit is open, else 0}."""
+        with self._lock:
+            hosts = list(self._hosts.items())
+        return {host: int(breaker.state == CircuitBreaker.OPEN) for host, (_, breaker) in hosts}
+
+
+http_client = HttpClient()
@@ -0,0 +1,97 @@
+from telebot import types
+
+from src.callback_data import Action, encode
+
+# Inline keyboards shared by the threaded (main.py) and asyncio (async_main.py) front ends.
+# Both front ends decode the same callback data (src/callback_data.py), so it is only ever built here.
+
+WORDS_PER_PAGE = 5
+
+def _button(text, action, *args):
+    return types.InlineKeyboardButton(text, callback_data=encode(action, *args))
+
+def home_menu_markup():
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Add Word", Action.PROMPT_ADD))
+    markup.add(_button("Dictionary", Action.SHOW_WORDS))
+    markup.add(_button("Random Word", Action.RANDOM))
+    markup.add(_button("Review", Action.REVIEW))
+    return markup
+
+def random_word_markup():
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Another", Action.RANDOM))
+    markup.add(_button("Home", Action.HOME))
+    markup.add(_button("Dictionary", Action.SHOW_WORDS))
+    return markup
+
+def saved_word_markup(word_id):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Dictionary", Action.SHOW_WORDS))
+    markup.add(_button("Delete from Dictionary", Action.DELETE, word_id))
+    return markup
+
+def add_word_markup(word):
+    markup = types.InlineKeyboardMarkup()
+    add_btn = _button("Add to Dictionary", Action.ADD, word)
+    dict_btn = _button("My Dictionary", Action.SHOW_WORDS)
+    home_btn = _button("Home", Action.HOME)
+    markup.row(add_btn)
+    markup.row(dict_btn, home_btn)
+    return markup
+
+def suggestions_markup(word, suggestions):
+    markup = types.InlineKeyboardMarkup()
+    for suggestion in suggestions:
+        markup.add(_button(suggestion, Action.LOOKUP, suggestion))
+    markup.add(_button(f"Look up '{word}' anyway", Action.LOOKUP, word))
+    return markup
+
+def dictionary_markup():
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Dictionary", Action.SHOW_WORDS))
+    return markup
+
+def words_page_markup(page, has_prev, has_next, translations=None):
+    """Keyboard for a Dictionary page of (word_id, word, sort_key) rows."""
+    markup = types.InlineKeyboardMarkup()
+
+    # Show words for the current page, with their translations when given
+    for word_id, word, _ in page:
+        label = f"{word} — {translations[word]}" if translations and word in translations else word
+        markup.add(_button(label[:64], Action.DEFINE, word_id))
+
+    # Keyset pagination: the buttons carry the sort key of the first/last word on the page
+    navigation = []
+    if has_prev:
+        navigation.append(_button("<< Prev", Action.PAGE_PREV, page[0][2]))
+    if has_next:
+        navigation.append(_button("Next >>", Action.PAGE_NEXT, page[-1][2]))
+    if navigation:
+        markup.row(*navigation)
+
+    # Home button to return to the main menu
+    markup.row(_button("A-Z", Action.LETTERS), _button("Home", Action.HOME))
+    return markup
+
+def letters_markup():
+    markup = types.InlineKeyboardMarkup(row_width=7)
+    markup.add(*[_button(letter.upper(), Action.JUMP, letter) for letter in "abcdefghijklmnopqrstuvwxyz"])
+    markup.row(_button("Dictionary", Action.SHOW_WORDS))
+    return markup
+
+def review_start_markup():
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Start review", Action.REVIEW))
+    return markup
+
+def review_card_markup(word_id):
+    markup = types.InlineKeyboardMarkup()
+    markup.add(_button("Show definition", Action.REVEAL, word_id))
+    return markup
+
+def review_grade_markup(word_id, grades):
+    markup = types.InlineKeyboardMarkup()
+    markup.row(*[_button(label, Action.GRADE, quality, word_id) for label, quality in grades])
+    markup.row(_button("Home", Action.HOME))
+    return markup
@@ -0,0 +1,156 @@
+"""Immutable, memory-mapped sorted key/value files.
+
+Layout::
+
+    magic (8 bytes) | count: u32 | count x record offset: u64 | records
+
+    record = key length: u16 | key (UTF-8) | kind: u8 | value length: u32 | value
+
+Keys are sorted by their UTF-8 bytes and looked up by binary search over
+the offset table straight out of the mapping, so opening a file costs
+nothing and every process shares the same pages. ``kind`` is left to the
+caller, e.g. to tell data records from aliases.
+"""
+import logging
+import mmap
+import os
+import struct
+import tempfile
+import threading
+
+_HEADER = struct.Struct("<8sI")
+_OFFSET = struct.Struct("<Q")
+_KEY_LENGTH = struct.Struct("<H")
+_VALUE_HEADER = struct.Struct("<BI")
+
+
+class SortedIndex:
+    """Read-only view of an index file; opened lazily and safe to share between threads."""
+
+    def __init__(self, path, magic):
+        self.path = path
+        self.magic = magic
+        self._lock = threading.Lock()
+        self._map = None
+        self._count = 0
+        self._opened = False
+
+    def _open(self):
+        with self._lock:
+            if self._opened:
+                return
+            self._map, self._count = self._map_file()
+            # Set last: available skips the lock once this is True, so the mapping must be in place
+            self._opened = True
+
+    def _map_file(self):
+        """Return (mapping, key count) of the file, or (None, 0) if it is missing or not a valid index."""
+        if not self.path:
+            return None, 0
+        try:
+            with open(self.path, "rb") as file:
+                mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError) as e:
+            logging.error(f"Index {self.path} is unavailable. Error: {e}")
+            return None, 0
+        try:
+            magic, count = _HEADER.unpack_from(mapping, 0)
+        except struct.error:
+            magic, count = None, 0
+        # A truncated file would fail every lookup, so it counts as unavailable
+        if magic != self.magic or len(mapping) < _HEADER.size + count * _OFFSET.size:
+            logging.error(f"{self.path} is not a {self.magic!r} index or is truncated")
+            mapping.close()
+            return None, 0
+        logging.info(f"Index loaded: {count} keys from {self.path}")
+        return mapping, count
+
+    @property
+    def available(self):
+        if not self._opened:
+            self._open()
+        return self._map is not None
+
+    def __len__(self):
+        return self._count if self.available else 0
+
+    def _key_at(self, index):
+        offset = _OFFSET.unpack_from(self._map, _HEADER.size + index * _OFFSET.size)[0]
+        key_length = _KEY_LENGTH.unpack_from(self._map, offset)[0]
+        start = offset + _KEY_LENGTH.size
+        return self._map[start:start + key_length], start + key_length
+
+    def get(self, key):
+        """Binary-search for key; return (kind, value bytes) or None."""
+        if not self.available:
+            return None
+        target = key.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            found, value_offset = self._key_at(middle)
+            if found < target:
+                low = middle + 1
+            elif found > target:
+                high = middle
+            else:
+                kind, length = _VALUE_HEADER.unpack_from(self._map, value_offset)
+                start = value_offset + _VALUE_HEADER.size
+                return kind, self._map[start:start + length]
+        return None
+
+    def iter_prefix(self, prefix):
+        """Yield the keys starting with prefix, in sorted order."""
+        if not self.available:
+            return
+        target = prefix.encode("utf-8")
+        low, high = 0, self._count
+        while low < high:
+            middle = (low + high) // 2
+            if self._key_at(middle)[0] < target:
+                low = middle + 1
+            else:
+                high = middle
+        for index in range(low, self._count):
+            key = self._key_at(index)[0]
+            if not key.startswith(target):
+                return
+            yield key.decode("utf-8")
+
+    def iter_keys(self):
+        """Yield every key in sorted order."""
+        if not self.available:
+            return
+        for index in range(self._count):
+            yield self._key_at(index)[0].decode("utf-8")
+
+
+def write_index(records, output, magic):
+    """Write {key: (kind, value bytes)} to output; returns the number of keys written.
+
+    The file is replaced atomically, so running processes keep reading the old one.
+    """
+    keys = sorted(records, key=lambda k: k.encode("utf-8"))
+    directory = os.path.dirname(os.path.abspath(output))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as file:
+            file.write(_HEADER.pack(magic, len(keys)))
+            offset = _HEADER.size + len(keys) * _OFFSET.size
+            body = []
+            for key in keys:
+                kind, value = records[key]
+                encoded = key.encode("utf-8")
+                record = _KEY_LENGTH.pack(len(encoded)) + encoded + _VALUE_HEADER.pack(kind, len(value)) + value
+                file.write(_OFFSET.pack(offset))
+                body.append(record)
+                offset += len(record)
+            for record in body:
+                file.write(record)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(tmp_path, output)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return len(keys)
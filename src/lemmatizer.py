@@ -0,0 +1,65 @@
+import re
+import unicodedata
+
+# Irregular forms that suffix rules cannot reach
+IRREGULAR_FORMS = {
+    "am": "be", "are": "be", "is": "be", "was": "be", "were": "be", "been": "be", "being": "be",
+    "has": "have", "had": "have", "does": "do", "did": "do", "done": "do",
+    "went": "go", "gone": "go", "ran": "run", "came": "come", "took": "take", "taken": "take",
+    "gave": "give", "given": "give", "saw": "see", "seen": "see", "made": "make", "said": "say",
+    "got": "get", "gotten": "get", "knew": "know", "known": "know", "thought": "think",
+    "brought": "bring", "bought": "buy", "caught": "catch", "taught": "teach", "found": "find",
+    "told": "tell", "felt": "feel", "left": "leave", "kept": "keep", "began": "begin", "begun": "begin",
+    "wrote": "write", "written": "write", "spoke": "speak", "spoken": "speak", "ate": "eat", "eaten": "eat",
+    "drove": "drive", "driven": "drive", "chose": "choose", "chosen": "choose", "fell": "fall",
+    "fallen": "fall", "flew": "fly", "flown": "fly", "grew": "grow", "grown": "grow", "threw": "throw",
+    "thrown": "throw", "wore": "wear", "worn": "wear", "sang": "sing", "sung": "sing", "swam": "swim",
+    "men": "man", "women": "woman", "children": "child", "feet": "foot", "teeth": "tooth",
+    "mice": "mouse", "geese": "goose", "people": "person", "lives": "life", "knives": "knife",
+    "wives": "wife", "leaves": "leaf", "better": "good", "best": "good", "worse": "bad", "worst": "bad",
+}
+
+# (suffix, replacement) rules, most specific first
+_SUFFIX_RULES = (
+    ("ies", "y"), ("ied", "y"), ("ier", "y"), ("iest", "y"),
+    ("sses", "ss"), ("xes", "x"), ("ches", "ch"), ("shes", "sh"), ("oes", "o"), ("ves", "f"),
+    ("ing", ""), ("ing", "e"), ("ed", ""), ("ed", "e"), ("er", ""), ("er", "e"), ("est", ""), ("est", "e"),
+    ("es", ""), ("s", ""), ("ly", ""),
+)
+_DOUBLED_CONSONANT = re.compile(r"([bdfgklmnprtvz])\1$")
+_STRIP = re.compile(r"^[\W_]+|[\W_]+$")
+
+
+def normalize(word):
+    """Fold a word to the form dictionary keys are stored under: NFKC, lowercase, no edge punctuation."""
+    word = unicodedata.normalize("NFKC", word).strip().lower()
+    word = word.replace("’", "'")
+    return " ".join(_STRIP.sub("", word).split())
+
+
+def lemma_candidates(word, guess=True):
+    """Return the normalized word followed by its possible base forms, most likely first.
+
+    "running" gives ["running", "runn", "run", "runne"], so a lookup that tries
+    each in turn finds "run". The suffix rules are guesses ("notes" also gives
+    "not"), so with guess=False only the word and its irregular base form are
+    returned.
+    """
+    word = normalize(word)
+    candidates = [word]
+    if not word or " " in word:
+        return candidates
+    if word in IRREGULAR_FORMS:
+        candidates.append(IRREGULAR_FORMS[word])
+    if not guess:
+        return candidates
+    for suffix, replacement in _SUFFIX_RULES:
+        # Keep at least a two-letter stem: "is" must not become "i"
+        if not word.endswith(suffix) or len(word) - len(suffix) < 2:
+            continue
+        stem = word[:-len(suffix)] + replacement
+        candidates.append(stem)
+        if not replacement and _DOUBLED_CONSONANT.search(stem):
+            # running -> runn -> run, bigger -> bigg -> big
+            candidates.append(stem[:-1])
+    return list(dict.fromkeys(candidates))
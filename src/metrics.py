@@ -0,0 +1,265 @@
+"""In-process metrics exposed in the Prometheus text format.
+
+Handlers, database queries, Telegram calls and outgoing HTTP requests record
+into the histograms and counters below; caches and pools are read through
+collectors when /metrics is scraped, so they cost nothing in between.
+
+Every process serves its own /metrics: METRICS_PORT for the main process and
+METRICS_PORT + 1 + n for webhook worker n.
+"""
+import bisect
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+METRICS_ADDR = os.getenv("METRICS_ADDR", "127.0.0.1")
+# 0 disables the endpoint; metrics are still recorded
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9100"))
+
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name, help_text, labelnames=()):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_format_labels(self.labelnames, key)} {value}")
+        return lines
+
+
+class Histogram:
+    """Cumulative-bucket histogram; observe() is a bisect and three additions under a lock."""
+
+    def __init__(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._values = {}   # label values -> [bucket counts..., +Inf count, sum]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(key)
+            if counts is None:
+                counts = self._values[key] = [0] * (len(self.buckets) + 2)
+            counts[index] += 1
+            counts[-1] += value
+
+    def counts(self):
+        """Return {label values: number of observations}."""
+        with self._lock:
+            return {key: sum(counts[:-1]) for key, counts in self._values.items()}
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, list(counts)) for key, counts in self._values.items())
+        for key, counts in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                le = f'le="{bound}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {counts[-1]}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._collectors = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help_text, labelnames=()):
+        return self.register(Counter(name, help_text, labelnames))
+
+    def histogram(self, name, help_text, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help_text, labelnames, buckets))
+
+    def add_collector(self, name, help_text, labelname, collect):
+        """Register a gauge read at scrape time; collect() returns {label value: number}."""
+        self._collectors.append((name, help_text, labelname, collect))
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        for name, help_text, labelname, collect in self._collectors:
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} gauge")
+            try:
+                values = collect()
+            except Exception as e:
+                logging.warning("Metrics collector %s failed: %s", name, e)
+                continue
+            for label, value in sorted(values.items()):
+                lines.append(f"{name}{_format_labels((labelname,), (label,))} {value}")
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+handler_latency = registry.histogram(
+    "bot_handler_duration_seconds", "Time spent in a Telegram update handler.", ("handler", "action"))
+handler_errors = registry.counter(
+    "bot_handler_errors_total", "Handlers that raised.", ("handler", "action"))
+db_latency = registry.histogram(
+    "bot_db_query_duration_seconds", "Time spent in a database function.", ("query",))
+db_errors = registry.counter("bot_db_errors_total", "Database functions that raised.", ("query",))
+http_latency = registry.histogram(
+    "bot_http_request_duration_seconds", "Outgoing HTTP requests.", ("service",))
+http_errors = registry.counter("bot_http_errors_total", "Outgoing HTTP requests that failed.", ("service",))
+telegram_latency = registry.histogram(
+    "bot_telegram_request_duration_seconds", "Bot API calls made by the send queue.", ("method",))
+telegram_errors = registry.counter("bot_telegram_errors_total", "Bot API calls that failed.", ("method",))
+blob_latency = registry.histogram(
+    "bot_blob_store_duration_seconds", "Shared blob store operations.", ("backend", "op"))
+blob_errors = registry.counter("bot_blob_store_errors_total", "Shared blob store operations that failed.",
+                               ("backend", "op"))
+
+
+@contextmanager
+def track(histogram, errors, **labels):
+    """Time a block into histogram and count it in errors if it raises."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        errors.inc(**labels)
+        raise
+    finally:
+        histogram.observe(time.perf_counter() - start, **labels)
+
+
+def timed_handler(name):
+    """Decorator recording a handler's latency and errors; apply it below the bot's handler decorator."""
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with track(handler_latency, handler_errors, handler=name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_async_handler(name):
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            with track(handler_latency, handler_errors, handler=name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def timed_query(func):
+    """Decorator recording a database function's latency and errors, labelled with its name."""
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        with track(db_latency, db_errors, query=func.__name__):
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def timed_async_query(func):
+    @wraps(func)
+    async def wrapper(*args, **kwargs):
+        with track(db_latency, db_errors, query=func.__name__):
+            return await func(*args, **kwargs)
+    return wrapper
+
+
+def cache_collector(caches):
+    """Collector reporting the hit ratio of each LRUCache in {name: cache}."""
+    def collect():
+        return {name: cache.stats()["hit_ratio"] for name, cache in caches.items()}
+    return collect
+
+
+def stats_collector(stats):
+    """Collector exposing the numeric values of a stats dict, or of a function returning one."""
+    def collect():
+        values = stats() if callable(stats) else stats
+        return {key: value for key, value in values.items()
+                if isinstance(value, (int, float)) and not isinstance(value, bool)}
+    return collect
+
+
+class MetricsRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?", 1)[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Scrapes are too frequent to log
+        pass
+
+
+def start_metrics_server(port=METRICS_PORT, addr=METRICS_ADDR):
+    """Serve /metrics on a daemon thread; returns the server, or None if disabled or the port is taken."""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((addr, port), MetricsRequestHandler)
+    except OSError as e:
+        logging.error("Metrics endpoint on %s:%s unavailable: %s", addr, port, e)
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics", daemon=True).start()
+    logging.info("Serving metrics on http://%s:%s/metrics", addr, port)
+    return server
@@ -0,0 +1,191 @@
+import logging
+
+from src.database import get_connection
+
+# Arbitrary key for pg_advisory_lock so concurrent replicas migrate one at a time
+MIGRATION_LOCK_ID = 7203541
+
+# Ordered schema migrations: (version, description, statements).
+# Applied migrations are recorded in schema_migrations; never edit one that has shipped, add a new one.
+MIGRATIONS = [
+    (1, "initial schema", [
+        """
+        CREATE TABLE IF NOT EXISTS Users (
+            user_id INTEGER PRIMARY KEY,
+            username VARCHAR(255),
+            first_name VARCHAR(255),
+            last_name VARCHAR(255)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS Words (
+            word_id SERIAL PRIMARY KEY,
+            word VARCHAR(255) NOT NULL,
+            part_of_speech VARCHAR(255),
+            definition TEXT,
+            example TEXT,
+            pronunciation VARCHAR(255),
+            audio_link VARCHAR(255),
+            audio_path VARCHAR(255)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS UserWords (
+            user_id INTEGER REFERENCES Users(user_id),
+            word_id INTEGER REFERENCES Words(word_id),
+            date_added TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (user_id, word_id)
+        )
+        """,
+        """
+        ALTER TABLE Words
+            ADD COLUMN IF NOT EXISTS raw_json JSONB,
+            ADD COLUMN IF NOT EXISTS definition_updated_at TIMESTAMP,
+            ADD COLUMN IF NOT EXISTS audio_file_id VARCHAR(255)
+        """,
+    ]),
+    (2, "unique normalized word", [
+        # Merge duplicate spellings onto the lowest word_id before the unique index goes in
+        """
+        WITH ranked AS (
+            SELECT word_id, MIN(word_id) OVER (PARTITION BY lower(word)) AS keep_id FROM Words
+        )
+        INSERT INTO UserWords (user_id, word_id, date_added)
+        SELECT uw.user_id, r.keep_id, uw.date_added
+        FROM UserWords uw
+        INNER JOIN ranked r ON uw.word_id = r.word_id
+        WHERE r.word_id <> r.keep_id
+        ON CONFLICT DO NOTHING
+        """,
+        """
+        WITH ranked AS (
+            SELECT word_id, MIN(word_id) OVER (PARTITION BY lower(word)) AS keep_id FROM Words
+        )
+        DELETE FROM UserWords uw
+        USING ranked r
+        WHERE uw.word_id = r.word_id AND r.word_id <> r.keep_id
+        """,
+        """
+        WITH ranked AS (
+            SELECT word_id, MIN(word_id) OVER (PARTITION BY lower(word)) AS keep_id FROM Words
+        )
+        DELETE FROM Words w
+        USING ranked r
+        WHERE w.word_id = r.word_id AND r.word_id <> r.keep_id
+        """,
+        "CREATE UNIQUE INDEX IF NOT EXISTS words_word_lower_key ON Words (lower(word))",
+    ]),
+    (3, "user words by date", [
+        "CREATE INDEX IF NOT EXISTS userwords_user_date_added_idx ON UserWords (user_id, date_added)",
+    ]),
+    (4, "user words sort key for keyset pagination", [
+        # Copy of lower(word) so a user's words can be range-scanned in dictionary order
+        "ALTER TABLE UserWords ADD COLUMN IF NOT EXISTS sort_key VARCHAR(255)",
+        """
+        UPDATE UserWords uw SET sort_key = lower(w.word)
+        FROM Words w
+        WHERE w.word_id = uw.word_id AND uw.sort_key IS NULL
+        """,
+        "CREATE INDEX IF NOT EXISTS userwords_user_sort_key_idx ON UserWords (user_id, sort_key)",
+    ]),
+    (5, "spaced repetition review state", [
+        """
+        CREATE TABLE IF NOT EXISTS ReviewState (
+            user_id INTEGER NOT NULL,
+            word_id INTEGER NOT NULL,
+            due_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            interval_days REAL NOT NULL DEFAULT 0,
+            ease REAL NOT NULL DEFAULT 2.5,
+            repetitions INTEGER NOT NULL DEFAULT 0,
+            lapses INTEGER NOT NULL DEFAULT 0,
+            last_reviewed_at TIMESTAMP,
+            PRIMARY KEY (user_id, word_id),
+            FOREIGN KEY (user_id, word_id) REFERENCES UserWords (user_id, word_id) ON DELETE CASCADE
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS reviewstate_user_due_at_idx ON ReviewState (user_id, due_at)",
+        """
+        INSERT INTO ReviewState (user_id, word_id, due_at)
+        SELECT user_id, word_id, COALESCE(date_added, CURRENT_TIMESTAMP) FROM UserWords
+        ON CONFLICT DO NOTHING
+        """,
+        "ALTER TABLE Users ADD COLUMN IF NOT EXISTS last_reminded_on DATE",
+    ]),
+    (6, "shared blob store", [
+        """
+        CREATE TABLE IF NOT EXISTS Blobs (
+            key TEXT PRIMARY KEY,
+            data BYTEA NOT NULL,
+            expires_at TIMESTAMP,
+            updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """,
+        # Pronunciations are already compressed, so TOAST should store them as is
+        "ALTER TABLE Blobs ALTER COLUMN data SET STORAGE EXTERNAL",
+    ]),
+    (7, "daily activity rollups", [
+        """
+        CREATE TABLE IF NOT EXISTS UserDailyStats (
+            user_id INTEGER NOT NULL REFERENCES Users(user_id) ON DELETE CASCADE,
+            day DATE NOT NULL,
+            words_added INTEGER NOT NULL DEFAULT 0,
+            words_removed INTEGER NOT NULL DEFAULT 0,
+            lookups INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day)
+        )
+        """,
+        # The weekly digest reads one week of rows across all users
+        "CREATE INDEX IF NOT EXISTS userdailystats_day_idx ON UserDailyStats (day)",
+        # Words added before the rollups existed; earlier deletions and lookups were never recorded.
+        # Rollup days are UTC dates, and date_added holds the session's local time.
+        """
+        INSERT INTO UserDailyStats (user_id, day, words_added)
+        SELECT user_id, (date_added::timestamptz AT TIME ZONE 'UTC')::date, COUNT(*) FROM UserWords
+        WHERE date_added IS NOT NULL
+        GROUP BY 1, 2
+        ON CONFLICT DO NOTHING
+        """,
+        "ALTER TABLE Users ADD COLUMN IF NOT EXISTS last_digest_on DATE",
+    ]),
+]
+
+
+def run_migrations():
+    """Apply every migration newer than the recorded schema version."""
+    with get_connection() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        conn.commit()
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("""
+                CREATE TABLE IF NOT EXISTS schema_migrations (
+                    version INTEGER PRIMARY KEY,
+                    description VARCHAR(255) NOT NULL,
+                    applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                )
+                """)
+                cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+                current = cursor.fetchone()[0]
+            conn.commit()
+
+            for version, description, statements in MIGRATIONS:
+                if version <= current:
+                    continue
+                logging.info(f"Applying migration {version}: {description}")
+                # Each migration commits atomically together with its schema_migrations row
+                with conn.cursor() as cursor:
+                    for statement in statements:
+                        cursor.execute(statement)
+                    cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                                   (version, description))
+                conn.commit()
+        finally:
+            conn.rollback()
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+    logging.info("Database schema is up to date.")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run_migrations()
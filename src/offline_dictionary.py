@@ -0,0 +1,161 @@
+"""Offline dictionary of Merriam-Webster responses in a memory-mapped index.
+
+Keys are normalized headwords (see src/kvindex.py for the file layout). A
+DATA record holds the zlib-compressed MW JSON for the headword; an ALIAS
+record holds the key of the headword it stands for (MW "stems" such as
+"ran" -> "run").
+
+Build it with ``python -m src.offline_dictionary --output PATH`` from saved
+responses, the definitions already cached in the Words table, or a word
+list fetched from the API.
+"""
+import argparse
+import json
+import logging
+import os
+import zlib
+
+from dotenv import load_dotenv
+
+from src.kvindex import SortedIndex, write_index
+from src.lemmatizer import lemma_candidates, normalize
+
+load_dotenv()
+
+# Empty disables the offline dictionary
+OFFLINE_DICTIONARY_PATH = os.getenv("OFFLINE_DICTIONARY_PATH", "")
+
+MAGIC = b"TGDICT01"
+KIND_DATA = 0
+KIND_ALIAS = 1
+
+
+class OfflineDictionary:
+    """Headword lookups, with aliases and irregular forms, over a SortedIndex."""
+
+    def __init__(self, path):
+        self.index = SortedIndex(path, MAGIC)
+        self.stats = {"hits": 0, "misses": 0}
+
+    def __len__(self):
+        return len(self.index)
+
+    def _get_exact(self, key):
+        record = self.index.get(key)
+        if record is not None and record[0] == KIND_ALIAS:
+            key = record[1].decode("utf-8")
+            record = self.index.get(key)
+        if record is None or record[0] != KIND_DATA:
+            return None
+        return key, json.loads(zlib.decompress(record[1]))
+
+    def headword(self, word):
+        """Return the headword word is filed under (itself, or the headword of its stem), or None."""
+        if not self.index.available:
+            return None
+        for candidate in lemma_candidates(word, guess=False):
+            record = self.index.get(candidate)
+            if record is not None:
+                return record[1].decode("utf-8") if record[0] == KIND_ALIAS else candidate
+        return None
+
+    def iter_keys(self):
+        """Yield every headword and alias in sorted order."""
+        return self.index.iter_keys()
+
+    def lookup(self, word, guess=False):
+        """Return (headword, MW JSON) for word, or None.
+
+        Only the headword itself, MW's stems (aliases) and irregular forms are
+        trusted. guess=True also tries the suffix rules of lemma_candidates,
+        which can land on the wrong word ("corner" -> "corn"), so it is only
+        for when Merriam-Webster can't be asked.
+        """
+        if not self.index.available:
+            return None
+        for candidate in lemma_candidates(word, guess):
+            found = self._get_exact(candidate)
+            if found is not None:
+                self.stats["hits"] += 1
+                return found
+        self.stats["misses"] += 1
+        return None
+
+
+def build_index(responses, output):
+    """Write an index from (word, MW JSON) pairs; returns the number of keys written.
+
+    Entries' stems become aliases of the headword unless they are headwords
+    themselves.
+    """
+    records = {}
+    aliases = {}
+    for word, data in responses:
+        key = normalize(word)
+        if not key or not any(isinstance(entry, dict) for entry in data or ()):
+            continue
+        if key not in records:
+            records[key] = (KIND_DATA, zlib.compress(json.dumps(data, separators=(",", ":")).encode("utf-8"), 9))
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            meta = entry.get("meta") or {}
+            # Only stems of the entry for this very headword: "run:1", not "run-up"
+            if normalize(meta.get("id", "").split(":", 1)[0]) != key:
+                continue
+            for stem in meta.get("stems") or ():
+                aliases.setdefault(normalize(stem), key)
+    for alias, key in aliases.items():
+        if alias and alias not in records:
+            records[alias] = (KIND_ALIAS, key.encode("utf-8"))
+    return write_index(records, output, MAGIC)
+
+
+offline_dictionary = OfflineDictionary(OFFLINE_DICTIONARY_PATH)
+
+
+def _responses_from_directory(directory):
+    # One saved API response per file, named <word>.json
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".json"):
+            with open(os.path.join(directory, name), encoding="utf-8") as file:
+                yield name[:-len(".json")], json.load(file)
+
+
+def _responses_from_wordlist(path, limit):
+    from requests.exceptions import RequestException
+    from src.utilities import fetch_definition_data
+
+    with open(path, encoding="utf-8") as file:
+        words = [line.split(",", 1)[0].strip() for line in file if line.strip()]
+    for word in words[:limit]:
+        try:
+            yield word, fetch_definition_data(word)
+        except RequestException:
+            continue
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline dictionary index.")
+    parser.add_argument("--output", default=OFFLINE_DICTIONARY_PATH or "dictionary.idx")
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("--responses", help="directory of saved Merriam-Webster responses (<word>.json)")
+    source.add_argument("--from-db", action="store_true", help="use the definitions cached in the Words table")
+    source.add_argument("--wordlist", help="file of words, most frequent first, to fetch from the API")
+    parser.add_argument("--limit", type=int, default=20000, help="how many words of --wordlist to fetch")
+    args = parser.parse_args(argv)
+
+    if args.responses:
+        responses = _responses_from_directory(args.responses)
+    elif args.from_db:
+        from src.database import iter_cached_definitions
+        responses = iter_cached_definitions()
+    else:
+        responses = _responses_from_wordlist(args.wordlist, args.limit)
+    count = build_index(responses, args.output)
+    logging.info(f"Wrote {count} keys to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,95 @@
+import logging
+import os
+import queue
+import threading
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+from requests.exceptions import RequestException
+
+from src.audio_handler import prepare_pronunciation
+from src.database import peek_random_words
+from src.utilities import definition_cache, get_definition
+
+load_dotenv()
+
+PREFETCH = os.getenv("PREFETCH", "true").lower() == "true"
+PREFETCH_WORKERS = int(os.getenv("PREFETCH_WORKERS", "4"))
+# Words waiting beyond this are dropped; prefetching is best effort
+PREFETCH_QUEUE_SIZE = int(os.getenv("PREFETCH_QUEUE_SIZE", "1000"))
+# How many of a user's upcoming random words to warm
+PREFETCH_RANDOM_AHEAD = int(os.getenv("PREFETCH_RANDOM_AHEAD", "2"))
+
+
+class Prefetcher:
+    """Bounded worker pool that warms the definition and audio caches for words about to be opened.
+
+    A word already queued or being fetched is not queued again, and words
+    whose definition is cached and fresh are skipped.
+    """
+
+    def __init__(self, workers=PREFETCH_WORKERS, queue_size=PREFETCH_QUEUE_SIZE):
+        self.workers = workers
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._pid = None
+        self.stats = {"queued": 0, "dropped": 0, "fetched": 0, "failed": 0}
+
+    def _ensure_started(self):
+        # Started lazily, and again in forked webhook workers
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._queue = queue.Queue(maxsize=self._queue.maxsize)
+        self._pending = set()
+        for i in range(self.workers):
+            threading.Thread(target=self._work, name=f"prefetch-{i}", daemon=True).start()
+
+    def prefetch(self, words):
+        if not PREFETCH:
+            return
+        with self._lock:
+            self._ensure_started()
+            for word in words:
+                if word in self._pending or definition_cache.peek(word) is not None:
+                    continue
+                try:
+                    self._queue.put_nowait(word)
+                except queue.Full:
+                    self.stats["dropped"] += 1
+                    continue
+                self._pending.add(word)
+                self.stats["queued"] += 1
+
+    def prefetch_random(self, user_id):
+        """Warm the words the user's next "Random Word" clicks will deal."""
+        if not PREFETCH or PREFETCH_RANDOM_AHEAD <= 0:
+            return
+        try:
+            self.prefetch(peek_random_words(user_id, PREFETCH_RANDOM_AHEAD))
+        except DatabaseError as e:
+            logging.error(f"Failed to peek random words for user {user_id}. Error: {e}")
+
+    def _work(self):
+        while True:
+            word = self._queue.get()
+            try:
+                # Both calls go through the single-flight groups, so a click racing
+                # a prefetch of the same word shares its fetch
+                definition, audio_link = get_definition(word)
+                if audio_link:
+                    prepare_pronunciation(word, audio_link)
+                self.stats["fetched"] += 1
+            except (DatabaseError, RequestException) as e:
+                self.stats["failed"] += 1
+                logging.warning(f"Prefetch of word '{word}' failed. Error: {e}")
+            except Exception:
+                self.stats["failed"] += 1
+                logging.exception(f"Prefetch of word '{word}' failed")
+            finally:
+                with self._lock:
+                    self._pending.discard(word)
+
+
+prefetcher = Prefetcher()
@@ -0,0 +1,114 @@
+import os
+import random
+import threading
+
+from dotenv import load_dotenv
+
+from src.cache import LRUCache
+
+load_dotenv()
+
+# Per-user decks kept in memory; a deck is reloaded after RANDOM_DECK_TTL seconds
+# to pick up words changed by other processes
+RANDOM_DECK_CACHE_SIZE = int(os.getenv("RANDOM_DECK_CACHE_SIZE", "10000"))
+RANDOM_DECK_TTL = int(os.getenv("RANDOM_DECK_TTL", "3600"))
+# "Another" walks a fresh permutation of the dictionary before repeating a word
+RANDOM_NO_REPEAT = os.getenv("RANDOM_NO_REPEAT", "true").lower() == "true"
+
+
+class Deck:
+    """Shuffled word_ids of one user's dictionary.
+
+    ``word_ids[:cursor]`` have been drawn in the current pass. Drawing,
+    adding and removing are O(1); a new pass reshuffles once every word
+    has been drawn.
+    """
+
+    __slots__ = ("word_ids", "positions", "cursor", "lock")
+
+    def __init__(self, word_ids):
+        self.word_ids = list(word_ids)
+        random.shuffle(self.word_ids)
+        self.positions = {word_id: i for i, word_id in enumerate(self.word_ids)}
+        self.cursor = 0
+        self.lock = threading.Lock()
+
+    def _swap(self, i, j):
+        ids = self.word_ids
+        ids[i], ids[j] = ids[j], ids[i]
+        self.positions[ids[i]] = i
+        self.positions[ids[j]] = j
+
+    def draw(self, no_repeat=True):
+        with self.lock:
+            if not self.word_ids:
+                return None
+            if not no_repeat:
+                return random.choice(self.word_ids)
+            if self.cursor >= len(self.word_ids):
+                random.shuffle(self.word_ids)
+                self.positions = {word_id: i for i, word_id in enumerate(self.word_ids)}
+                self.cursor = 0
+            word_id = self.word_ids[self.cursor]
+            self.cursor += 1
+            return word_id
+
+    def peek(self, count):
+        """Return up to count word_ids the next draws of this pass will deal, without drawing them."""
+        with self.lock:
+            return self.word_ids[self.cursor:self.cursor + count]
+
+    def add(self, word_id):
+        with self.lock:
+            if word_id in self.positions:
+                return
+            self.word_ids.append(word_id)
+            self.positions[word_id] = len(self.word_ids) - 1
+            # Put the new word at a random spot among those not yet drawn in this pass
+            self._swap(len(self.word_ids) - 1, random.randint(self.cursor, len(self.word_ids) - 1))
+
+    def remove(self, word_id):
+        with self.lock:
+            i = self.positions.get(word_id)
+            if i is None:
+                return
+            if i < self.cursor:
+                # Keep the drawn prefix contiguous
+                self._swap(i, self.cursor - 1)
+                i = self.cursor - 1
+                self.cursor -= 1
+            self._swap(i, len(self.word_ids) - 1)
+            self.word_ids.pop()
+            del self.positions[word_id]
+
+    def __len__(self):
+        return len(self.word_ids)
+
+
+class DeckStore:
+    def __init__(self, maxsize=RANDOM_DECK_CACHE_SIZE, ttl=RANDOM_DECK_TTL):
+        self._decks = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def get(self, user_id):
+        return self._decks.get(user_id)
+
+    def load(self, user_id, word_ids):
+        deck = Deck(word_ids)
+        self._decks.set(user_id, deck)
+        return deck
+
+    def word_added(self, user_id, word_id):
+        deck = self._decks.get(user_id)
+        if deck is not None:
+            deck.add(word_id)
+
+    def word_removed(self, user_id, word_id):
+        deck = self._decks.get(user_id)
+        if deck is not None:
+            deck.remove(word_id)
+
+    def invalidate(self, user_id):
+        self._decks.delete(user_id)
+
+
+random_decks = DeckStore()
@@ -0,0 +1,144 @@
+import heapq
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+
+from dotenv import load_dotenv
+
+from src.cache import LRUCache
+from src.database import get_due_reviews, get_review_card, save_review
+
+load_dotenv()
+
+# How many of a user's earliest cards are held in the in-process queue at a time
+REVIEW_QUEUE_BATCH = int(os.getenv("REVIEW_QUEUE_BATCH", "50"))
+REVIEW_QUEUE_CACHE_SIZE = int(os.getenv("REVIEW_QUEUE_CACHE_SIZE", "10000"))
+# Queues are reloaded after this many seconds to pick up changes made by other processes
+REVIEW_QUEUE_TTL = int(os.getenv("REVIEW_QUEUE_TTL", "300"))
+
+# Answer buttons and the SM-2 quality each one stands for
+GRADES = [("Again", 1), ("Hard", 3), ("Good", 4), ("Easy", 5)]
+
+# Cards answered "Again" come back in the same session
+RELEARN_DELAY = timedelta(minutes=10)
+
+
+def utcnow():
+    # ReviewState timestamps are naive UTC
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+def schedule(interval_days, ease, repetitions, lapses, quality, now=None):
+    """Apply one SM-2 review and return (due_at, interval_days, ease, repetitions, lapses)."""
+    now = now or utcnow()
+    if quality < 3:
+        repetitions = 0
+        lapses += 1
+        interval_days = 0
+        due_at = now + RELEARN_DELAY
+    else:
+        if repetitions == 0:
+            interval_days = 1
+        elif repetitions == 1:
+            interval_days = 6
+        else:
+            interval_days = round(interval_days * ease, 1)
+        repetitions += 1
+        due_at = now + timedelta(days=interval_days)
+    ease = max(1.3, ease + 0.1 - (5 - quality) * (0.08 + (5 - quality) * 0.02))
+    return due_at, interval_days, ease, repetitions, lapses
+
+
+class ReviewQueue:
+    """Min-heap of one user's (due_at, word_id), seeded from the (user_id, due_at) index.
+
+    Only the earliest ``batch`` cards are loaded; unless the user has no more
+    than that (``complete``), the heap is reloaded from the database when
+    nothing in it is due. ``due`` maps word_id to its current due time so
+    superseded heap entries are skipped when popped.
+    """
+
+    __slots__ = ("heap", "due", "complete", "lock")
+
+    def __init__(self, rows, batch):
+        self.heap = [(due_at, word_id) for due_at, word_id in rows]
+        heapq.heapify(self.heap)
+        self.due = {word_id: due_at for due_at, word_id in rows}
+        self.complete = len(rows) < batch
+        self.lock = threading.Lock()
+
+    def push(self, word_id, due_at):
+        with self.lock:
+            self.due[word_id] = due_at
+            heapq.heappush(self.heap, (due_at, word_id))
+
+    def peek_due(self, now):
+        """Return the word_id of the earliest card due by now, or None."""
+        with self.lock:
+            while self.heap:
+                due_at, word_id = self.heap[0]
+                if self.due.get(word_id) != due_at:
+                    heapq.heappop(self.heap)
+                    continue
+                return word_id if due_at <= now else None
+            return None
+
+    def discard(self, word_id):
+        with self.lock:
+            self.due.pop(word_id, None)
+
+
+class ReviewScheduler:
+    def __init__(self, batch=REVIEW_QUEUE_BATCH, maxsize=REVIEW_QUEUE_CACHE_SIZE, ttl=REVIEW_QUEUE_TTL):
+        self.batch = batch
+        self._queues = LRUCache(maxsize=maxsize, ttl=ttl)
+
+    def _queue(self, user_id, reload=False):
+        queue = None if reload else self._queues.get(user_id)
+        if queue is None:
+            queue = ReviewQueue(get_due_reviews(user_id, self.batch), self.batch)
+            self._queues.set(user_id, queue)
+        return queue
+
+    def next_card(self, user_id):
+        """Return (word_id, word) of the next due card, or None if nothing is due."""
+        now = utcnow()
+        queue = self._queue(user_id)
+        for reload in (False, True):
+            if reload:
+                if queue.complete:
+                    return None
+                # Nothing due among the loaded cards, but the database holds more
+                queue = self._queue(user_id, reload=True)
+            while True:
+                word_id = queue.peek_due(now)
+                if word_id is None:
+                    break
+                card = get_review_card(user_id, word_id)
+                if card is not None:
+                    return word_id, card[0]
+                # Deleted from the dictionary since the heap was loaded
+                queue.discard(word_id)
+        return None
+
+    def grade(self, user_id, word_id, quality):
+        """Record an answer; returns the next due time, or None if the card is gone."""
+        card = get_review_card(user_id, word_id)
+        if card is None:
+            return None
+        _, interval_days, ease, repetitions, lapses = card
+        due_at, interval_days, ease, repetitions, lapses = schedule(interval_days, ease, repetitions, lapses, quality)
+        save_review(user_id, word_id, due_at, interval_days, ease, repetitions, lapses)
+        self._queue(user_id).push(word_id, due_at)
+        return due_at
+
+    def word_added(self, user_id, word_id):
+        """Queue a newly linked word as due now, matching its new ReviewState row."""
+        queue = self._queues.get(user_id)
+        if queue is not None:
+            queue.push(word_id, utcnow())
+
+    def invalidate(self, user_id):
+        self._queues.delete(user_id)
+
+
+review_scheduler = ReviewScheduler()
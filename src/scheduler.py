@@ -0,0 +1,122 @@
+import logging
+import os
+import threading
+from concurrent.futures import wait
+from datetime import timedelta
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+
+from src.database import (DIGEST_LOCK_ID, REMINDER_LOCK_ID, advisory_lock, get_digest_batch, get_reminder_batch,
+                          mark_digests_sent, mark_reminders_sent)
+from src.keyboards import review_start_markup, dictionary_markup
+from src.review import utcnow
+from src.send_queue import PRIORITY_BULK
+from src.stats import lookup_counter, digest_message
+
+load_dotenv()
+
+REVIEW_REMINDERS = os.getenv("REVIEW_REMINDERS", "true").lower() == "true"
+# UTC hour from which the daily review reminders go out
+REVIEW_REMINDER_HOUR = int(os.getenv("REVIEW_REMINDER_HOUR", "9"))
+REVIEW_REMINDER_BATCH_SIZE = int(os.getenv("REVIEW_REMINDER_BATCH_SIZE", "100"))
+WEEKLY_DIGEST = os.getenv("WEEKLY_DIGEST", "true").lower() == "true"
+# Weekday (0 = Monday) and UTC hour from which the weekly digests go out
+WEEKLY_DIGEST_WEEKDAY = int(os.getenv("WEEKLY_DIGEST_WEEKDAY", "0"))
+WEEKLY_DIGEST_HOUR = int(os.getenv("WEEKLY_DIGEST_HOUR", "10"))
+WEEKLY_DIGEST_BATCH_SIZE = int(os.getenv("WEEKLY_DIGEST_BATCH_SIZE", "500"))
+SCHEDULER_INTERVAL = int(os.getenv("SCHEDULER_INTERVAL", "300"))
+
+
+def send_review_reminders(outbound):
+    """Remind every user with due cards once a day, in batches through the send queue.
+
+    Users are marked as reminded only once their message has gone out; an
+    advisory lock keeps other replicas out meanwhile.
+    """
+    now = utcnow()
+    if now.hour < REVIEW_REMINDER_HOUR:
+        return 0
+    sent = 0
+    after = 0
+    with advisory_lock(REMINDER_LOCK_ID) as locked:
+        while locked:
+            batch = get_reminder_batch(now, after, REVIEW_REMINDER_BATCH_SIZE)
+            if not batch:
+                break
+            # Users talk to the bot in private chats, where chat_id == user_id.
+            # Bulk priority keeps reminders behind interactive replies.
+            futures = [outbound.send_message(user_id, f"You have {due_count} words to review today.",
+                                             priority=PRIORITY_BULK, reply_markup=review_start_markup())
+                       for user_id, due_count in batch]
+            # Wait for the batch so at most one batch is queued at a time
+            wait(futures)
+            # Failed sends stay unmarked and are retried on the next run
+            delivered = [row[0] for row, future in zip(batch, futures) if future.exception() is None]
+            mark_reminders_sent(delivered)
+            sent += len(delivered)
+            after = batch[-1][0]
+    if sent:
+        logging.info(f"Sent {sent} review reminders")
+    return sent
+
+
+def send_weekly_digests(outbound):
+    """Send last week's activity digest to every active user, in batches through the send queue.
+
+    Each batch is read in its own short query and marked as sent once it has
+    gone out, so an interrupted run resumes where it stopped. An advisory lock
+    keeps other replicas out meanwhile.
+    """
+    today = utcnow().date()
+    if today.weekday() != WEEKLY_DIGEST_WEEKDAY or utcnow().hour < WEEKLY_DIGEST_HOUR:
+        return 0
+    # This process's lookups so far count too
+    lookup_counter.flush()
+    sent = 0
+    after = 0
+    with advisory_lock(DIGEST_LOCK_ID) as locked:
+        while locked:
+            batch = get_digest_batch(today - timedelta(days=7), today, today, after, WEEKLY_DIGEST_BATCH_SIZE)
+            if not batch:
+                break
+            futures = [outbound.send_message(user_id, digest_message(added, removed, lookups, active_days),
+                                             priority=PRIORITY_BULK, reply_markup=dictionary_markup())
+                       for user_id, added, removed, lookups, active_days in batch]
+            # Wait for the batch so at most one batch is queued at a time
+            wait(futures)
+            # Failed sends stay unmarked and are retried on the next run
+            delivered = [row[0] for row, future in zip(batch, futures) if future.exception() is None]
+            mark_digests_sent(delivered, today)
+            sent += len(delivered)
+            after = batch[-1][0]
+    if sent:
+        logging.info(f"Sent {sent} weekly digests")
+    return sent
+
+
+def _run(outbound, stop):
+    while not stop.is_set():
+        if REVIEW_REMINDERS:
+            try:
+                send_review_reminders(outbound)
+            except DatabaseError as e:
+                logging.error(f"Review reminder job failed. Error: {e}")
+            except Exception:
+                # Anything else would end the thread, and with it every later run
+                logging.exception("Review reminder job failed")
+        if WEEKLY_DIGEST:
+            try:
+                send_weekly_digests(outbound)
+            except DatabaseError as e:
+                logging.error(f"Weekly digest job failed. Error: {e}")
+            except Exception:
+                logging.exception("Weekly digest job failed")
+        stop.wait(SCHEDULER_INTERVAL)
+
+def start_scheduler(outbound):
+    """Run the background jobs on a daemon thread; set the returned event to stop it."""
+    stop = threading.Event()
+    if REVIEW_REMINDERS or WEEKLY_DIGEST:
+        threading.Thread(target=_run, args=(outbound, stop), name="scheduler", daemon=True).start()
+    return stop
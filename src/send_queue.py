@@ -0,0 +1,288 @@
+import heapq
+import itertools
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from dotenv import load_dotenv
+from telebot.apihelper import ApiTelegramException
+
+from src.metrics import track, telegram_latency, telegram_errors
+
+load_dotenv()
+
+# Telegram allows about 30 messages/second overall and about 1/second in a single chat
+SEND_GLOBAL_RATE = float(os.getenv("SEND_GLOBAL_RATE", "30"))
+SEND_CHAT_RATE = float(os.getenv("SEND_CHAT_RATE", "1"))
+SEND_CHAT_BURST = float(os.getenv("SEND_CHAT_BURST", "3"))
+SEND_WORKERS = int(os.getenv("SEND_WORKERS", "8"))
+SEND_MAX_RETRIES = int(os.getenv("SEND_MAX_RETRIES", "5"))
+
+# Lower runs first
+PRIORITY_CALLBACK = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BULK = 2
+
+
+class TokenBucket:
+    __slots__ = ("rate", "capacity", "tokens", "updated")
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, now):
+        """Seconds until a token is available."""
+        self._refill(now)
+        return 0.0 if self.tokens >= 1 else (1 - self.tokens) / self.rate
+
+    def consume(self):
+        self.tokens -= 1
+
+
+class SharedTokenBucket:
+    """A token bucket in shared memory, drawn from by this process and every process forked from it.
+
+    Forked webhook workers and the parent (which sends reminders and digests)
+    all go through one bucket, so together they keep to one global rate.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self._state = multiprocessing.RawArray("d", [capacity, time.monotonic()])  # tokens, updated
+        self._lock = multiprocessing.Lock()
+
+    def take(self, now):
+        """Take a token and return 0, or return the seconds until one is available."""
+        with self._lock:
+            tokens, updated = self._state
+            # Another process may have stored a slightly later clock reading
+            tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+            self._state[1] = max(now, updated)
+            if tokens >= 1:
+                self._state[0] = tokens - 1
+                return 0.0
+            self._state[0] = tokens
+            return (1 - tokens) / self.rate
+
+
+# Created on import, so webhook workers inherit it from the parent
+global_bucket = SharedTokenBucket(SEND_GLOBAL_RATE, SEND_GLOBAL_RATE)
+
+
+class _Job:
+    __slots__ = ("priority", "fn", "args", "kwargs", "future", "attempts")
+
+    def __init__(self, priority, fn, args, kwargs):
+        self.priority = priority
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.future = Future()
+        self.attempts = 0
+
+
+def _retry_after(error):
+    if error.error_code != 429:
+        return None
+    parameters = (error.result_json or {}).get("parameters") or {}
+    return float(parameters.get("retry_after", 1))
+
+
+class OutboundDispatcher:
+    """Queue of outgoing Bot API calls honouring Telegram's flood limits.
+
+    Calls are grouped into per-chat lanes that run one call at a time, in
+    order, under a per-chat token bucket; the global bucket, shared with
+    forked processes, caps the total rate. Among lanes that may send, lower
+    priority values go first, so callback answers overtake bulk sends. A 429
+    response pauses the lane for retry_after seconds and retries the call.
+    ``submit`` returns a Future immediately.
+    """
+
+    def __init__(self, bot, global_bucket=global_bucket, chat_rate=SEND_CHAT_RATE, chat_burst=SEND_CHAT_BURST,
+                 workers=SEND_WORKERS):
+        self.bot = bot
+        self.chat_rate = chat_rate
+        self.chat_burst = chat_burst
+        self.workers = workers
+        self._global = global_bucket
+        self._chat_buckets = {}
+        self._lanes = {}       # lane key -> deque of jobs
+        self._busy = set()     # lanes with a call in flight
+        self._ready = []       # heap of (priority, seq, lane key) for idle lanes with work
+        self._delayed = []     # heap of (run_at, priority, seq, lane key)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._pid = None
+        self._running = False
+        self._executor = None
+        self._thread = None
+        self.stats = {"sent": 0, "failed": 0, "rate_limited": 0, "queued": 0}
+
+    def _ensure_started(self):
+        # Started lazily, and again in forked webhook workers
+        if self._pid == os.getpid():
+            return
+        self._pid = os.getpid()
+        self._running = True
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="outbound")
+        self._thread = threading.Thread(target=self._dispatch, name="outbound-dispatcher", daemon=True)
+        self._thread.start()
+
+    def submit(self, chat_id, fn, *args, priority=PRIORITY_NORMAL, **kwargs):
+        """Queue fn(*args, **kwargs) in chat_id's lane; chat_id None gets a lane of its own."""
+        job = _Job(priority, fn, args, kwargs)
+        key = chat_id if chat_id is not None else ("job", next(self._seq))
+        with self._cond:
+            self._ensure_started()
+            lane = self._lanes.setdefault(key, deque())
+            lane.append(job)
+            self.stats["queued"] += 1
+            if len(lane) == 1 and key not in self._busy:
+                heapq.heappush(self._ready, (priority, next(self._seq), key))
+            self._cond.notify()
+        return job.future
+
+    def acquire(self, chat_id):
+        """Block until one more call to chat_id fits the rate limits, and take its tokens."""
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                delay = self._chat_bucket(chat_id).delay(now)
+                if delay <= 0:
+                    delay = self._global.take(now)
+                if delay <= 0:
+                    self._chat_bucket(chat_id).consume()
+                    return
+                self._cond.wait(delay)
+
+    def throttle(self, chat_id):
+        """Return a function a queued job calls before each of its Bot API calls.
+
+        The job's first call was paid for when it was dispatched; every later
+        one waits for tokens of its own.
+        """
+        calls = itertools.count()
+
+        def throttle():
+            if next(calls):
+                self.acquire(chat_id)
+        return throttle
+
+    # Shorthands for the Bot API calls the handlers make
+
+    def send_message(self, chat_id, text, priority=PRIORITY_NORMAL, **kwargs):
+        return self.submit(chat_id, self.bot.send_message, chat_id, text, priority=priority, **kwargs)
+
+    def reply_to(self, message, text, **kwargs):
+        return self.submit(message.chat.id, self.bot.reply_to, message, text, **kwargs)
+
+    def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        return self.submit(None, self.bot.answer_callback_query, callback_query_id, text,
+                           priority=PRIORITY_CALLBACK, **kwargs)
+
+    def answer_inline_query(self, inline_query_id, results, **kwargs):
+        return self.submit(None, self.bot.answer_inline_query, inline_query_id, results,
+                           priority=PRIORITY_CALLBACK, **kwargs)
+
+    def _chat_bucket(self, key):
+        bucket = self._chat_buckets.get(key)
+        if bucket is None:
+            if len(self._chat_buckets) > 100000:
+                self._chat_buckets.clear()
+            bucket = self._chat_buckets[key] = TokenBucket(self.chat_rate, self.chat_burst)
+        return bucket
+
+    def _dispatch(self):
+        with self._cond:
+            while self._running or self._ready or self._delayed or self._busy:
+                now = time.monotonic()
+                while self._delayed and self._delayed[0][0] <= now:
+                    _, priority, seq, key = heapq.heappop(self._delayed)
+                    heapq.heappush(self._ready, (priority, seq, key))
+
+                if not self._ready:
+                    timeout = self._delayed[0][0] - now if self._delayed else None
+                    self._cond.wait(timeout)
+                    continue
+
+                priority, seq, key = self._ready[0]
+                is_chat = not isinstance(key, tuple)
+                chat_delay = self._chat_bucket(key).delay(now) if is_chat else 0.0
+                if chat_delay > 0:
+                    heapq.heappop(self._ready)
+                    heapq.heappush(self._delayed, (now + chat_delay, priority, seq, key))
+                    continue
+                global_delay = self._global.take(now)
+                if global_delay > 0:
+                    self._cond.wait(global_delay)
+                    continue
+
+                heapq.heappop(self._ready)
+                if is_chat:
+                    self._chat_bucket(key).consume()
+                job = self._lanes[key].popleft()
+                self._busy.add(key)
+                self._executor.submit(self._run, key, job)
+
+    def _run(self, key, job):
+        retry_after = None
+        try:
+            job.attempts += 1
+            with track(telegram_latency, telegram_errors, method=getattr(job.fn, "__name__", "call")):
+                result = job.fn(*job.args, **job.kwargs)
+        except ApiTelegramException as e:
+            retry_after = _retry_after(e)
+            if retry_after is None or job.attempts > SEND_MAX_RETRIES:
+                retry_after = None
+                self._fail(job, e)
+        except Exception as e:
+            self._fail(job, e)
+        else:
+            self.stats["sent"] += 1
+            job.future.set_result(result)
+
+        with self._cond:
+            self._busy.discard(key)
+            lane = self._lanes[key]
+            if retry_after is not None:
+                self.stats["rate_limited"] += 1
+                logging.warning(f"Telegram flood limit hit for {key}, retrying in {retry_after}s")
+                lane.appendleft(job)
+                heapq.heappush(self._delayed, (time.monotonic() + retry_after, job.priority, next(self._seq), key))
+            elif lane:
+                heapq.heappush(self._ready, (lane[0].priority, next(self._seq), key))
+            else:
+                del self._lanes[key]
+            self._cond.notify()
+
+    def _fail(self, job, error):
+        self.stats["failed"] += 1
+        logging.error(f"Outbound call {getattr(job.fn, '__name__', job.fn)} failed. Error: {error}")
+        job.future.set_exception(error)
+
+    def stop(self, drain=True, timeout=30):
+        """Stop accepting work; with drain, wait up to timeout for queued calls to go out."""
+        with self._cond:
+            if self._pid != os.getpid():
+                return
+            if not drain:
+                self._ready.clear()
+                self._delayed.clear()
+            self._running = False
+            self._cond.notify()
+        self._thread.join(timeout)
+        self._executor.shutdown(wait=drain)
+        self._pid = None
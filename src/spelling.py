@@ -0,0 +1,180 @@
+import logging
+import os
+import threading
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+
+from src.database import iter_known_words
+from src.lemmatizer import lemma_candidates, normalize
+from src.offline_dictionary import offline_dictionary
+
+load_dotenv()
+
+SPELLING_SUGGESTIONS = os.getenv("SPELLING_SUGGESTIONS", "true").lower() == "true"
+SPELLING_MAX_DISTANCE = int(os.getenv("SPELLING_MAX_DISTANCE", "2"))
+# How many "Did you mean" buttons to show
+SPELLING_MAX_SUGGESTIONS = int(os.getenv("SPELLING_MAX_SUGGESTIONS", "5"))
+# Only this many leading characters are indexed, which bounds the deletes per word
+SPELLING_PREFIX_LENGTH = 7
+
+
+def edit_distance(a, b, max_distance):
+    """Optimal string alignment distance, or max_distance + 1 once it is certain to exceed it."""
+    if abs(len(a) - len(b)) > max_distance:
+        return max_distance + 1
+    previous_previous = None
+    previous = list(range(len(b) + 1))
+    for i in range(1, len(a) + 1):
+        current = [i] + [0] * len(b)
+        row_min = i
+        for j in range(1, len(b) + 1):
+            cost = 0 if a[i - 1] == b[j - 1] else 1
+            value = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + cost)
+            if i > 1 and j > 1 and a[i - 1] == b[j - 2] and a[i - 2] == b[j - 1]:
+                value = min(value, previous_previous[j - 2] + 1)
+            current[j] = value
+            row_min = min(row_min, value)
+        if row_min > max_distance:
+            return max_distance + 1
+        previous_previous, previous = previous, current
+    return previous[-1]
+
+
+class SpellingIndex:
+    """SymSpell-style index: every word is stored under each of its deletions.
+
+    Two words within edit distance N share a deletion of at most N characters
+    each, so a lookup only generates the deletions of the input and checks
+    the words filed under them; there is no scan over the vocabulary.
+    """
+
+    def __init__(self, max_distance=SPELLING_MAX_DISTANCE, prefix_length=SPELLING_PREFIX_LENGTH):
+        self.max_distance = max_distance
+        self.prefix_length = prefix_length
+        self.counts = {}
+        self.deletes = {}
+        self.ready = False
+        # True once a full headword list (the offline dictionary) is loaded, not just words seen so far
+        self.complete = False
+        self.lock = threading.Lock()
+
+    def _deletes(self, word, max_distance=None):
+        found = {word}
+        frontier = [word]
+        for _ in range(self.max_distance if max_distance is None else max_distance):
+            next_frontier = []
+            for item in frontier:
+                if len(item) <= 1:
+                    continue
+                for i in range(len(item)):
+                    deleted = item[:i] + item[i + 1:]
+                    if deleted not in found:
+                        found.add(deleted)
+                        next_frontier.append(deleted)
+            frontier = next_frontier
+        return found
+
+    def _add(self, counts, deletes, word, count):
+        if word in counts:
+            counts[word] += count
+            return
+        counts[word] = count
+        for deleted in self._deletes(word[:self.prefix_length]):
+            deletes.setdefault(deleted, []).append(word)
+
+    def add(self, word, count=1):
+        word = normalize(word)
+        if word and " " not in word:
+            with self.lock:
+                self._add(self.counts, self.deletes, word, count)
+
+    def load(self, words, complete=False):
+        """Rebuild the index from (word, count) pairs, swapping it in when done.
+
+        complete says whether the pairs cover a full headword list, so that a
+        word missing from the index is most likely misspelled.
+        """
+        counts = {}
+        deletes = {}
+        for word, count in words:
+            word = normalize(word)
+            if word and " " not in word:
+                self._add(counts, deletes, word, count)
+        with self.lock:
+            # Words added while the index was being built are kept
+            for word, count in self.counts.items():
+                if word not in counts:
+                    self._add(counts, deletes, word, count)
+            self.counts, self.deletes = counts, deletes
+            self.complete = complete
+            self.ready = True
+        logging.info(f"Spelling index loaded with {len(counts)} words")
+
+    def is_known(self, word):
+        return any(candidate in self.counts for candidate in lemma_candidates(word))
+
+    def distance_for(self, word):
+        """Edit distance allowed for word: short words have too many close neighbours for 2."""
+        if len(word) <= 3:
+            return 0
+        if len(word) <= 6:
+            return min(1, self.max_distance)
+        return self.max_distance
+
+    def lookup(self, word, limit=SPELLING_MAX_SUGGESTIONS):
+        """Return up to limit known words close to word, nearest and most common first."""
+        word = normalize(word)
+        max_distance = self.distance_for(word)
+        if not max_distance:
+            return []
+        counts, deletes = self.counts, self.deletes
+        distances = {}
+        # Every indexed word is filed under its deletions up to self.max_distance, so
+        # deleting up to max_distance characters from the input still finds all matches
+        for deleted in self._deletes(word[:self.prefix_length], max_distance):
+            for candidate in deletes.get(deleted, ()):
+                if candidate in distances or candidate == word:
+                    continue
+                distances[candidate] = edit_distance(word, candidate, max_distance)
+        ranked = sorted((distance, -counts[candidate], candidate)
+                        for candidate, distance in distances.items() if distance <= max_distance)
+        return [candidate for _, _, candidate in ranked[:limit]]
+
+    def suggest(self, word):
+        """Suggestions to show instead of looking word up; empty unless it is missing from a full headword list.
+
+        An index of only the words looked up so far would turn away every new,
+        correctly spelled word that resembles one of them, so without the
+        offline dictionary the word goes to Merriam-Webster first.
+        """
+        if (not SPELLING_SUGGESTIONS or not self.ready or not self.complete or " " in word.strip()
+                or self.is_known(word)):
+            return []
+        return self.lookup(word)
+
+
+spelling_index = SpellingIndex()
+
+
+def _known_words():
+    for word in offline_dictionary.iter_keys():
+        yield word, 1
+    try:
+        yield from iter_known_words()
+    except DatabaseError as e:
+        logging.error(f"Failed to load words for the spelling index. Error: {e}")
+
+
+def load_spelling_index():
+    """Build the index from the offline dictionary and the Words table on a background thread.
+
+    Returns the thread, or None when suggestions are disabled.
+    """
+    if SPELLING_SUGGESTIONS:
+        complete = len(offline_dictionary) > 0
+        thread = threading.Thread(target=spelling_index.load, args=(_known_words(), complete),
+                                  name="spelling-index", daemon=True)
+        thread.start()
+        return thread
+    return None
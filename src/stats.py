@@ -0,0 +1,134 @@
+"""Per-user activity statistics for /stats and the weekly digest.
+
+Counts come from the UserDailyStats rollups, one row per user and day, so
+nothing here scans UserWords. Adding and deleting words update the rollups
+in the same statement (see src/database.py). Lookups are far more frequent,
+so each process counts them in memory and flushes them in one statement
+every STATS_FLUSH_INTERVAL seconds; /stats adds the counts not flushed yet.
+"""
+import logging
+import os
+import threading
+import time
+from datetime import timedelta
+
+from dotenv import load_dotenv
+from psycopg2 import Error as DatabaseError
+
+from src.database import add_daily_lookups, get_daily_stats, get_word_count
+from src.review import utcnow
+
+load_dotenv()
+
+STATS_FLUSH_INTERVAL = float(os.getenv("STATS_FLUSH_INTERVAL", "60"))
+# How far back /stats looks
+STATS_DAYS = 30
+
+
+class LookupCounter:
+    """Lookups per (user, day), buffered in memory and flushed to UserDailyStats in batches.
+
+    The flusher thread starts on the first lookup in each process, so forked
+    webhook workers get their own.
+    """
+
+    def __init__(self, interval=STATS_FLUSH_INTERVAL):
+        self.interval = interval
+        self._counts = {}  # (user_id, day) -> lookups
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def record(self, user_id):
+        key = (user_id, utcnow().date())
+        with self._lock:
+            self._counts[key] = self._counts.get(key, 0) + 1
+            if self._pid != os.getpid():
+                self._pid = os.getpid()
+                threading.Thread(target=self._run, name="lookup-stats", daemon=True).start()
+
+    def pending(self, user_id):
+        """Return {day: lookups} of user_id not flushed yet."""
+        with self._lock:
+            return {day: count for (user, day), count in self._counts.items() if user == user_id}
+
+    def flush(self):
+        """Write the buffered counts; on failure they are kept for the next flush."""
+        with self._lock:
+            counts, self._counts = self._counts, {}
+        if not counts:
+            return 0
+        try:
+            add_daily_lookups([(user_id, day, count) for (user_id, day), count in counts.items()])
+        except DatabaseError as e:
+            logging.error(f"Failed to store lookup counts for {len(counts)} user-days. Error: {e}")
+            with self._lock:
+                for key, count in counts.items():
+                    self._counts[key] = self._counts.get(key, 0) + count
+            return 0
+        return len(counts)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            self.flush()
+
+
+lookup_counter = LookupCounter()
+
+
+def _plural(count, noun):
+    return f"{count} {noun}" if count == 1 else f"{count} {noun}s"
+
+
+def user_stats(user_id):
+    """Return a dict of a user's word count and activity over the last STATS_DAYS days."""
+    today = utcnow().date()
+    days = {day: [added, removed, lookups]
+            for day, added, removed, lookups in get_daily_stats(user_id, today - timedelta(days=STATS_DAYS - 1))}
+    for day, count in lookup_counter.pending(user_id).items():
+        days.setdefault(day, [0, 0, 0])[2] += count
+
+    def total(column, window):
+        return sum(values[column] for day, values in days.items() if day > today - timedelta(days=window))
+
+    # Consecutive active days up to today, or up to yesterday if today has no activity yet
+    streak = 0
+    day = today if today in days else today - timedelta(days=1)
+    while day in days:
+        streak += 1
+        day -= timedelta(days=1)
+
+    return {
+        "words": get_word_count(user_id),
+        "added_today": total(0, 1),
+        "added_week": total(0, 7),
+        "removed_week": total(1, 7),
+        "added_month": total(0, STATS_DAYS),
+        "lookups_week": total(2, 7),
+        "lookups_month": total(2, STATS_DAYS),
+        "active_days": len(days),
+        "streak": streak,
+    }
+
+
+# Function to render /stats
+def stats_message(user_id):
+    stats = user_stats(user_id)
+    return "\n".join([
+        f"Your dictionary: {_plural(stats['words'], 'word')}",
+        f"Added today: {stats['added_today']}",
+        f"Added this week: {stats['added_week']} ({stats['removed_week']} removed)",
+        f"Added in the last {STATS_DAYS} days: {stats['added_month']}",
+        f"Lookups this week: {stats['lookups_week']}, last {STATS_DAYS} days: {stats['lookups_month']}",
+        f"Active on {stats['active_days']} of the last {STATS_DAYS} days",
+        f"Current streak: {_plural(stats['streak'], 'day')}",
+    ])
+
+
+# Function to render one weekly digest row from src.database.get_digest_batch
+def digest_message(added, removed, lookups, active_days):
+    lines = [f"Your week: you added {_plural(added, 'word')} and looked up {_plural(lookups, 'word')}."]
+    if removed:
+        lines.append(f"You also removed {_plural(removed, 'word')}.")
+    lines.append(f"You were active on {active_days} of the last 7 days. Keep it up!")
+    return "\n".join(lines)
@@ -0,0 +1,156 @@
+"""Word translation behind a pluggable backend.
+
+The bundled backend reads a bilingual word list compiled into a memory-mapped
+index (src/kvindex.py). data/en-ru.tsv, a list of common English words with
+their Russian translations, ships prebuilt as data/translations.idx. Rebuild
+it, or build one from another tab-separated file of
+``english<TAB>translation`` lines, with::
+
+    python -m src.translation --wordlist data/en-ru.tsv --output data/translations.idx
+"""
+import argparse
+import logging
+import os
+
+from dotenv import load_dotenv
+
+from src.cache import LRUCache
+from src.kvindex import SortedIndex, write_index
+from src.lemmatizer import lemma_candidates, normalize
+from src.offline_dictionary import offline_dictionary
+
+load_dotenv()
+
+# "offline" or "none"
+TRANSLATION_BACKEND = os.getenv("TRANSLATION_BACKEND", "offline")
+TRANSLATION_INDEX_PATH = os.getenv("TRANSLATION_INDEX_PATH", os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "translations.idx"))
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "10000"))
+TRANSLATION_CACHE_TTL = int(os.getenv("TRANSLATION_CACHE_TTL", "86400"))
+# Show translations next to definitions and on dictionary pages
+TRANSLATIONS_INLINE = os.getenv("TRANSLATIONS_INLINE", "true").lower() == "true"
+# At most this many senses of a word are kept when the index is built
+TRANSLATION_MAX_SENSES = 3
+
+MAGIC = b"TGTRAN01"
+_NOT_FOUND = ""
+
+
+class NullTranslationBackend:
+    """Translates nothing."""
+
+    def translate_many(self, words):
+        return {}
+
+
+class OfflineTranslationBackend:
+    """Looks words up in a bilingual SortedIndex.
+
+    Inflected forms are resolved only through the irregular table and the
+    offline dictionary's MW stems; suffix-stripping guesses ("notes" -> "not")
+    would return a confident translation of the wrong word.
+    """
+
+    def __init__(self, path, dictionary=offline_dictionary):
+        self.index = SortedIndex(path, MAGIC)
+        self.dictionary = dictionary
+
+    def _candidates(self, word):
+        candidates = lemma_candidates(word, guess=False)
+        headword = self.dictionary.headword(word) if self.dictionary is not None else None
+        if headword:
+            candidates.append(headword)
+        return dict.fromkeys(candidates)
+
+    def translate_many(self, words):
+        translations = {}
+        for word in words:
+            for candidate in self._candidates(word):
+                record = self.index.get(candidate)
+                if record is not None:
+                    translations[word] = record[1].decode("utf-8")
+                    break
+        return translations
+
+
+class Translator:
+    """Caches a backend's answers, including misses, in an LRU.
+
+    A backend has one method, ``translate_many(words)``, returning
+    {word: translation} for the words it could translate.
+    """
+
+    def __init__(self, backend, cache_size=TRANSLATION_CACHE_SIZE, cache_ttl=TRANSLATION_CACHE_TTL):
+        self.backend = backend
+        self.cache = LRUCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def translate(self, word):
+        return self.translate_many([word]).get(word)
+
+    def translate_many(self, words):
+        """Translate a whole page of words with at most one backend call."""
+        translations = {}
+        missing = []
+        for word in words:
+            cached = self.cache.get(word)
+            if cached is None:
+                missing.append(word)
+            elif cached != _NOT_FOUND:
+                translations[word] = cached
+        if missing:
+            try:
+                found = self.backend.translate_many(missing)
+            except Exception as e:
+                logging.error(f"Translation backend failed for {len(missing)} words. Error: {e}")
+                return translations
+            for word in missing:
+                self.cache.set(word, found.get(word, _NOT_FOUND))
+            translations.update(found)
+        return translations
+
+
+def _create_backend():
+    if TRANSLATION_BACKEND == "offline" and TRANSLATION_INDEX_PATH:
+        return OfflineTranslationBackend(TRANSLATION_INDEX_PATH)
+    return NullTranslationBackend()
+
+
+translator = Translator(_create_backend())
+
+
+def build_index(pairs, output):
+    """Write an index from (english, translation) pairs; repeated words collect up to TRANSLATION_MAX_SENSES."""
+    senses = {}
+    for word, translation in pairs:
+        key = normalize(word)
+        translation = translation.strip()
+        if not key or not translation:
+            continue
+        word_senses = senses.setdefault(key, [])
+        if translation not in word_senses and len(word_senses) < TRANSLATION_MAX_SENSES:
+            word_senses.append(translation)
+    records = {key: (0, "; ".join(word_senses).encode("utf-8")) for key, word_senses in senses.items()}
+    return write_index(records, output, MAGIC)
+
+
+def _read_wordlist(path):
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.startswith("#") or "\t" not in line:
+                continue
+            word, translation = line.rstrip("\n").split("\t", 2)[:2]
+            yield word, translation
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Build the offline translation index.")
+    parser.add_argument("--wordlist", required=True, help="tab-separated file of english<TAB>translation lines")
+    parser.add_argument("--output", default=TRANSLATION_INDEX_PATH or "translations.idx")
+    args = parser.parse_args(argv)
+    count = build_index(_read_wordlist(args.wordlist), args.output)
+    logging.info(f"Wrote {count} translations to {args.output}")
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -1,82 +1,268 @@
+import csv
+import io
+import json
+import re
 import requests
 import logging
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 import os
+import threading
+from psycopg2 import Error as DatabaseError
+
+from src.blob_store import blob_store
+from src.cache import LRUCache
+from src.http_client import http_client
+from src.singleflight import SingleFlight
+from src.database import get_cached_definition, save_definition
+from src.offline_dictionary import offline_dictionary
+from src.spelling import spelling_index
+from src.translation import translator, TRANSLATIONS_INLINE
+from src.definitions import Definition, parse_definition, render_html, render_text
 
 # Load environment variables from .env file
 load_dotenv()
 
 # Merriam-Webster API key
 MERRIAM_WEBSTER_API_KEY = os.getenv("MERRIAM_WEBSTER_API_KEY")
+MERRIAM_WEBSTER_API_URL = os.getenv("MERRIAM_WEBSTER_API_URL",
+                                    "https://www.dictionaryapi.com/api/v3/references/learners/json")
 
-def get_definition(word):
-    url = f"https://www.dictionaryapi.com/api/v3/references/learners/json/{word}?key={MERRIAM_WEBSTER_API_KEY}"
+# Definition cache settings: in-process LRU in front of the Words table
+DEFINITION_CACHE_SIZE = int(os.getenv("DEFINITION_CACHE_SIZE", "2048"))
+DEFINITION_CACHE_TTL = int(os.getenv("DEFINITION_CACHE_TTL", "3600"))
+DEFINITION_DB_TTL = int(os.getenv("DEFINITION_DB_TTL", str(30 * 24 * 3600)))
+
+# Limits for /import
+IMPORT_MAX_WORDS = int(os.getenv("IMPORT_MAX_WORDS", "10000"))
+IMPORT_MAX_FILE_SIZE = int(os.getenv("IMPORT_MAX_FILE_SIZE", str(1024 * 1024)))
+
+definition_cache = LRUCache(maxsize=DEFINITION_CACHE_SIZE, ttl=DEFINITION_CACHE_TTL)
+# Concurrent lookups of the same word share one Words/Merriam-Webster round trip
+definition_flight = SingleFlight("definition")
+_refresh_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="definition-refresh")
+_refreshing = set()
+_refreshing_lock = threading.Lock()
+
+def fetch_definition_data(word):
+    """Fetch the raw Merriam-Webster JSON for word; raises RequestException on failure."""
+    url = f"{MERRIAM_WEBSTER_API_URL}/{word}?key={MERRIAM_WEBSTER_API_KEY}"
     try:
-        response = requests.get(url)
-        response.raise_for_status()  # This will raise an exception if the request failed
+        response = http_client.get(url, service="merriam-webster")
         log_request("definition", word)
     except requests.exceptions.RequestException as e:
         log_request("definition", word, success=False, error_message=str(e))
-        return "No definition found due to an error.", None
-
-    data = response.json()
-    if not data:
-        return "No definition found.", None
-
-    result = ""
-    audio_link = None
-    for entry in data:
-        # Using get() method to avoid KeyError
-        if entry.get('fl'):
-            result += f"\n\nPart of Speech: {entry['fl']}\n"
-        if entry.get('shortdef'):
-            result += "\nDefinitions:\n"
-            for definition in entry['shortdef']:
-                result += f"- {definition}\n"
-        if entry.get('art') and entry['art'].get('artid'):
-            result += f"\nIllustration: {entry['art']['artid']}\n"
-        if entry.get('hwi') and entry['hwi'].get('prs'):            
-            for pr in entry['hwi']['prs']:
-                if pr.get('mw'):
-                    result += f"- {pr['mw']}\n"
-                if pr.get('sound') and pr['sound'].get('audio'):
-                    audio_link = f"https://media.merriam-webster.com/soundc11/{word[0]}/{pr['sound']['audio']}.wav"
-        if entry.get('def'):
-            result += "\nUsage Examples:\n"
-            for def_item in entry['def']:
-                if def_item.get('sseq'):
-                    for sseq_item in def_item['sseq']:
-                        for item in sseq_item:
-                            if isinstance(item, list) and len(item) > 1 and item[1].get('dt'):
-                                for dt_item in item[1]['dt']:
-                                    if isinstance(dt_item, list) and len(dt_item) > 1 and isinstance(dt_item[1], list):
-                                        for vis_item in dt_item[1]:
-                                            if isinstance(vis_item, dict) and vis_item.get('t'):
-                                                result += f"- {vis_item['t']}\n"
-    return result, audio_link
-
-# Function for formatting text from dictionary to telegram
-def format_text(text):
-    text = text.replace('{it}', '_').replace('{/it}', '_')
-    text = text.replace('{phrase}', '*').replace('{/phrase}', '*')
-
-    # Ensure all formatting symbols are paired
-    if text.count('_') % 2 != 0:
-        text = text.replace('_', '')  # Remove all unpaired '_'
-    if text.count('*') % 2 != 0:
-        text = text.replace('*', '')  # Remove all unpaired '*'
-
-    return text
+        raise
+    return response.json()
+
+def _load_definition(word):
+    """Fetch, parse and persist a definition, updating the in-process cache."""
+    try:
+        data = fetch_definition_data(word)
+    except requests.exceptions.RequestException:
+        return guess_offline_definition(word)
+
+    definition = parse_definition(word, data)
+    definition_cache.set(word, definition)
+    if definition:
+        spelling_index.add(word)
+        share_definition(word, data)
+        try:
+            save_definition(word, render_text(definition), definition.audio_link, definition.part_of_speech,
+                            definition.pronunciation, data)
+        except DatabaseError as e:
+            logging.error(f"Failed to store definition for word '{word}'. Error: {e}")
+    return definition, definition.audio_link
+
+def _refresh_in_background(word):
+    # Words in the offline dictionary are served from it again instead of the API
+    if get_offline_definition(word) is not None:
+        return
+    # While Merriam-Webster's circuit is open the stale copy keeps being served
+    if not http_client.breaker(MERRIAM_WEBSTER_API_URL).available:
+        return
+    with _refreshing_lock:
+        if word in _refreshing:
+            return
+        _refreshing.add(word)
+
+    def refresh():
+        try:
+            logging.debug("Refreshing stale definition for word '%s'", word)
+            _load_definition(word)
+        finally:
+            with _refreshing_lock:
+                _refreshing.discard(word)
+
+    _refresh_executor.submit(refresh)
+
+def get_definition(word):
+    """Return (Definition, audio_link) for word; render it with split_message."""
+    # 1. In-process LRU of parsed definitions
+    entry = definition_cache.get_entry(word)
+    if entry is not None:
+        definition, is_stale = entry
+        if is_stale:
+            _refresh_in_background(word)
+        return definition, definition.audio_link
+
+    # 2. Bundled offline dictionary, also reached through the word's lemmas
+    definition = get_offline_definition(word)
+    if definition is not None:
+        return definition, definition.audio_link
+
+    return definition_flight.do(word, _lookup_definition, word)
+
+def get_stored_definition(word):
+    """Return word's Definition from the LRU, the offline dictionary, the blob store or the Words table, or None.
+
+    Merriam-Webster is never called, so this is cheap enough to run for every autocomplete candidate.
+    """
+    entry = definition_cache.get_entry(word)
+    if entry is not None:
+        return entry[0]
+    definition = get_offline_definition(word) or get_shared_definition(word)
+    if definition is not None:
+        return definition
+    stored = _load_stored_definition(word)
+    return stored[0] if stored is not None else None
+
+def get_offline_definition(word):
+    """Parse and cache a definition from the offline dictionary, or return None."""
+    found = offline_dictionary.lookup(word)
+    if found is None:
+        return None
+    headword, data = found
+    definition = parse_definition(headword, data)
+    definition_cache.set(word, definition)
+    return definition
+
+def guess_offline_definition(word):
+    """Fallback for when Merriam-Webster fails: the offline entry of a guessed lemma, else an error.
+
+    The guess can be wrong ("corner" -> "corn"), so it is not cached and the next lookup asks the API again.
+    """
+    found = offline_dictionary.lookup(word, guess=True)
+    if found is None:
+        return Definition(word, error=True), None
+    headword, data = found
+    definition = parse_definition(headword, data)
+    return definition, definition.audio_link
+
+def get_shared_definition(word):
+    """Parse and cache a definition another replica put in the shared blob store, or return None."""
+    if not blob_store.caches_definitions:
+        return None
+    data = blob_store.get(f"definition:{word}")
+    if data is None:
+        return None
+    try:
+        raw_json = json.loads(data)
+    except ValueError as e:
+        logging.error(f"Discarding unreadable shared definition for word '{word}'. Error: {e}")
+        blob_store.delete(f"definition:{word}")
+        return None
+    definition = parse_definition(word, raw_json)
+    definition_cache.set(word, definition)
+    return definition
+
+def share_definition(word, raw_json):
+    """Put Merriam-Webster's JSON for word in the shared blob store, for the other replicas."""
+    if blob_store.caches_definitions:
+        blob_store.put(f"definition:{word}", json.dumps(raw_json).encode("utf-8"), ttl=DEFINITION_DB_TTL)
+
+def _load_stored_definition(word):
+    """Parse and cache the definition persisted in the Words table; returns (definition, is_stale) or None."""
+    try:
+        stored = get_cached_definition(word, DEFINITION_DB_TTL)
+    except DatabaseError as e:
+        logging.error(f"Failed to read cached definition for word '{word}'. Error: {e}")
+        return None
+    if stored is None:
+        return None
+    raw_json, is_stale = stored
+    # Parsed once here; the cached Definition is re-rendered without touching the JSON again
+    definition = parse_definition(word, raw_json)
+    definition_cache.set(word, definition)
+    return definition, is_stale
+
+def _lookup_definition(word):
+    # 3. Shared blob store, filled by whichever replica fetched the word first
+    definition = get_shared_definition(word)
+    if definition is not None:
+        return definition, definition.audio_link
+
+    # 4. Definitions persisted in the Words table
+    stored = _load_stored_definition(word)
+    if stored is not None:
+        definition, is_stale = stored
+        if is_stale:
+            _refresh_in_background(word)
+        return definition, definition.audio_link
+
+    # 5. Merriam-Webster API
+    return _load_definition(word)
+
+# Function to split a reply into Telegram-sized HTML messages
+def split_message(definition, max_length=3800):
+    translation = translator.translate(definition.word) if TRANSLATIONS_INLINE and definition else None
+    return render_html(definition, max_length, translation)
+
+# Function to extract words from a pasted list or an uploaded text/CSV document
+def parse_word_list(text, is_csv=False):
+    """Return unique words, in order, from one-per-line or comma/semicolon separated text.
+
+    For CSV documents only the first column is used and a "word" header is skipped.
+    Words differing only in case count once, as they do in the Words table.
+    """
+    if is_csv:
+        candidates = [row[0] for row in csv.reader(io.StringIO(text)) if row]
+        if candidates and candidates[0].strip().lower() == "word":
+            candidates = candidates[1:]
+    else:
+        candidates = re.split(r"[\n,;]", text)
+
+    words = []
+    seen = set()
+    for candidate in candidates:
+        word = candidate.strip()
+        if not word or len(word) > 255 or word.lower() in seen:
+            continue
+        seen.add(word.lower())
+        words.append(word)
+        if len(words) >= IMPORT_MAX_WORDS:
+            break
+    return words
+
+# Function to write exported (word, date_added) rows as CSV into a binary file
+def write_words_csv(rows, file):
+    line = io.StringIO()
+    writer = csv.writer(line)
+    writer.writerow(["word", "date_added"])
+    count = 0
+    for word, date_added in rows:
+        writer.writerow([word, date_added.isoformat() if date_added else ""])
+        count += 1
+        # Flush in batches so the whole export never sits in memory as text
+        if count % 1000 == 0:
+            file.write(line.getvalue().encode("utf-8"))
+            line.seek(0)
+            line.truncate()
+    file.write(line.getvalue().encode("utf-8"))
+    return count
 
 # Function to get translation from English to Russian
 def get_translation(word):
-    logging.info(f"get_translation called with word={word}")
-    # Implement translation logic here or use an existing translation API
-    return None
+    logging.debug("get_translation called with word=%s", word)
+    return translator.translate(word)
+
+# Function to translate a page of words with one backend call
+def get_translations(words):
+    return translator.translate_many(words)
 
 # Function for logging
 def log_request(request_type, word, success=True, error_message=None):
     if success:
-        logging.info(f"{request_type} request for word '{word}' was successful.")
+        logging.debug("%s request for word '%s' was successful.", request_type, word)
     else:
         logging.error(f"{request_type} request for word '{word}' failed. Error: {error_message}")
@@ -0,0 +1,192 @@
+import json
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from dotenv import load_dotenv
+from telebot import types
+
+from src.metrics import METRICS_PORT, start_metrics_server
+
+load_dotenv()
+
+# Address the built-in HTTP endpoint listens on; keep it on loopback behind the reverse proxy
+WEBHOOK_LISTEN = os.getenv("WEBHOOK_LISTEN", "127.0.0.1")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/telegram")
+# Public HTTPS URL the reverse proxy forwards to WEBHOOK_LISTEN:WEBHOOK_PORT + WEBHOOK_PATH
+WEBHOOK_URL = os.getenv("WEBHOOK_URL")
+# Checked against the X-Telegram-Bot-Api-Secret-Token header Telegram sends with each update
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET")
+WEBHOOK_WORKERS = int(os.getenv("WEBHOOK_WORKERS", str(os.cpu_count() or 1)))
+WEBHOOK_WORKER_THREADS = int(os.getenv("WEBHOOK_WORKER_THREADS", "10"))
+WEBHOOK_QUEUE_SIZE = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+WEBHOOK_DRAIN_TIMEOUT = float(os.getenv("WEBHOOK_DRAIN_TIMEOUT", "30"))
+
+
+def update_routing_key(update):
+    """Return the chat (or user) an update belongs to, so its updates stay on one worker."""
+    for field in ("message", "edited_message", "channel_post", "edited_channel_post"):
+        if update.get(field):
+            return update[field]["chat"]["id"]
+    callback_query = update.get("callback_query")
+    if callback_query:
+        if callback_query.get("message"):
+            return callback_query["message"]["chat"]["id"]
+        return callback_query["from"]["id"]
+    for field in ("inline_query", "chosen_inline_result", "my_chat_member", "chat_member"):
+        if update.get(field):
+            return update[field]["from"]["id"]
+    return update.get("update_id", 0)
+
+def _shard(key, count):
+    # crc32 rather than hash(): stable across processes and restarts
+    return zlib.crc32(str(key).encode()) % count
+
+
+def _process_lane(bot, lane):
+    while True:
+        raw = lane.get()
+        if raw is None:
+            return
+        try:
+            bot.process_new_updates([types.Update.de_json(raw)])
+        except Exception as e:
+            logging.exception(f"Failed to process update: {e}")
+
+def _worker_main(bot, updates, index, on_start, on_drain):
+    """Run handlers for one shard of chats.
+
+    Updates are spread over WEBHOOK_WORKER_THREADS lanes by chat, and each lane
+    runs its updates one at a time, so a chat's updates are handled in order.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    # Run handlers in the calling lane instead of TeleBot's shared worker pool
+    bot.threaded = False
+    # Each worker records its own metrics, so each serves them on its own port
+    if METRICS_PORT:
+        start_metrics_server(METRICS_PORT + 1 + index)
+    if on_start:
+        on_start(index)
+
+    lanes = [queue.Queue() for _ in range(WEBHOOK_WORKER_THREADS)]
+    threads = [threading.Thread(target=_process_lane, args=(bot, lane), name=f"webhook-{index}-{i}")
+               for i, lane in enumerate(lanes)]
+    for thread in threads:
+        thread.start()
+    logging.info(f"Webhook worker {index} started (pid {os.getpid()})")
+
+    while True:
+        item = updates.get()
+        if item is None:
+            break
+        key, raw = item
+        lanes[_shard(key, len(lanes))].put(raw)
+
+    for lane in lanes:
+        lane.put(None)
+    for thread in threads:
+        thread.join()
+    if on_drain:
+        on_drain()
+    logging.info(f"Webhook worker {index} drained")
+
+
+class WebhookServer(ThreadingHTTPServer):
+    # server_close() waits for in-flight requests to finish queueing their update
+    daemon_threads = False
+
+    def __init__(self, address, queues):
+        super().__init__(address, WebhookRequestHandler)
+        self.queues = queues
+        self.accepting = True
+
+
+class WebhookRequestHandler(BaseHTTPRequestHandler):
+    def do_POST(self):
+        if self.path.split("?", 1)[0] != WEBHOOK_PATH:
+            self.send_error(404)
+            return
+        if WEBHOOK_SECRET and self.headers.get("X-Telegram-Bot-Api-Secret-Token") != WEBHOOK_SECRET:
+            self.send_error(403)
+            return
+        if not self.server.accepting:
+            # Telegram retries failed deliveries, so updates arriving while draining are not lost
+            self.send_error(503)
+            return
+
+        raw = self.rfile.read(int(self.headers.get("Content-Length", 0))).decode("utf-8")
+        try:
+            key = update_routing_key(json.loads(raw))
+        except (ValueError, KeyError, TypeError):
+            self.send_error(400)
+            return
+
+        queues = self.server.queues
+        try:
+            queues[_shard(key, len(queues))].put((key, raw), timeout=5)
+        except queue.Full:
+            self.send_error(503)
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def log_message(self, format, *args):
+        # The reverse proxy connects from loopback; report the client it forwarded for
+        client = self.headers.get("X-Forwarded-For", self.client_address[0]) if self.headers else self.client_address[0]
+        logging.debug("webhook %s - %s", client, format % args)
+
+
+def serve(bot, on_start=None, on_drain=None, on_forked=None):
+    """Receive updates over HTTP and dispatch them to WEBHOOK_WORKERS processes by chat.
+
+    ``on_start(index)`` runs in each worker before it takes updates, and
+    ``on_drain`` runs in each worker after its last update has been handled,
+    e.g. to flush queued outgoing messages. ``on_forked`` runs in this process
+    once the workers exist, to start threads the workers must not inherit.
+    """
+    ctx = multiprocessing.get_context("fork")
+    queues = [ctx.Queue(WEBHOOK_QUEUE_SIZE) for _ in range(WEBHOOK_WORKERS)]
+    workers = [ctx.Process(target=_worker_main, args=(bot, q, i, on_start, on_drain), name=f"webhook-worker-{i}")
+               for i, q in enumerate(queues)]
+    for worker in workers:
+        worker.start()
+    if on_forked:
+        on_forked()
+
+    server = WebhookServer((WEBHOOK_LISTEN, WEBHOOK_PORT), queues)
+
+    def drain(signum, frame):
+        logging.info("Shutting down webhook server, draining workers...")
+        server.accepting = False
+        # shutdown() blocks until serve_forever() returns, so it can't run on this thread
+        threading.Thread(target=server.shutdown).start()
+
+    signal.signal(signal.SIGTERM, drain)
+    signal.signal(signal.SIGINT, drain)
+
+    if WEBHOOK_URL:
+        bot.set_webhook(url=WEBHOOK_URL + WEBHOOK_PATH, secret_token=WEBHOOK_SECRET,
+                        max_connections=WEBHOOK_WORKERS * WEBHOOK_WORKER_THREADS)
+    logging.info(f"Webhook server listening on {WEBHOOK_LISTEN}:{WEBHOOK_PORT}{WEBHOOK_PATH} "
+                 f"with {WEBHOOK_WORKERS} workers")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        for q in queues:
+            q.put(None)
+        for worker in workers:
+            worker.join(WEBHOOK_DRAIN_TIMEOUT)
+            if worker.is_alive():
+                logging.warning(f"{worker.name} did not drain within {WEBHOOK_DRAIN_TIMEOUT}s, terminating")
+                worker.terminate()
+        logging.info("Webhook server stopped")
@@ -0,0 +1,137 @@
+import io
+import multiprocessing
+import os
+import socket
+import time
+
+import pytest
+
+from bench.fake_servers import FakeRedis
+from src.blob_store import LocalBlobStore, RedisBlobStore, RedisClient, RedisError
+
+
+@pytest.fixture
+def redis():
+    server = FakeRedis().start()
+    yield server
+    server.stop()
+
+
+@pytest.fixture
+def store(redis):
+    store = RedisBlobStore(redis.url, prefix="test:", timeout=2)
+    yield store
+    store.client.close()
+
+
+def _reply(data):
+    return RedisClient("redis://127.0.0.1:1/0")._read_reply(io.BytesIO(data))
+
+
+def test_reply_parsing():
+    assert _reply(b"+OK\r\n") == "OK"
+    assert _reply(b":42\r\n") == 42
+    assert _reply(b"$5\r\nhe\r\nl\r\n") == b"he\r\nl"
+    assert _reply(b"$-1\r\n") is None
+    assert _reply(b"*2\r\n$1\r\na\r\n:1\r\n") == [b"a", 1]
+    assert _reply(b"*-1\r\n") is None
+    with pytest.raises(RedisError, match="WRONGTYPE"):
+        _reply(b"-WRONGTYPE wrong kind of value\r\n")
+
+
+@pytest.mark.parametrize("data", [b"", b"+OK", b"$5\r\nab", b":x\r\n", b"!1\r\n"])
+def test_truncated_or_malformed_reply_is_a_connection_error(data):
+    with pytest.raises(ConnectionError):
+        _reply(data)
+
+
+def test_redis_round_trip(store, redis):
+    assert store.get("missing") is None
+    store.put("word", b"\x00binary\r\n")
+    assert store.get("word") == b"\x00binary\r\n"
+    assert b"test:word" in redis.data
+    store.delete("word")
+    assert store.get("word") is None
+    assert store.stats() == {"hits": 1, "misses": 2, "puts": 1, "errors": 0}
+
+
+def test_redis_ttl_under_a_second(store):
+    store.put("word", b"value", ttl=0.2)
+    assert store.get("word") == b"value"
+    time.sleep(0.3)
+    assert store.get("word") is None
+    assert store.stats()["errors"] == 0
+
+
+def test_fake_rejects_non_positive_expiry(store):
+    with pytest.raises(RedisError, match="invalid expire time"):
+        store.client.execute("SET", "key", "value", "EX", 0)
+
+
+def test_error_reply_keeps_the_connection(store):
+    store.put("word", b"value")
+    with pytest.raises(RedisError):
+        store.client.execute("NOSUCHCOMMAND")
+    assert store.client._idle.qsize() == 1
+    assert store.get("word") == b"value"
+
+
+def test_connection_failing_mid_command_is_closed(store, monkeypatch):
+    store.put("word", b"value")
+    conn = store.client._idle.get_nowait()
+    store.client._idle.put(conn)
+
+    def broken(conn, *args):
+        raise OSError("connection reset")
+
+    with monkeypatch.context() as patch:
+        patch.setattr(store.client, "_command", broken)
+        assert store.get("word") is None
+    assert store.stats()["errors"] == 1
+    assert conn[0].fileno() == -1
+    assert store.client._idle.empty()
+    # The next command opens a fresh connection
+    assert store.get("word") == b"value"
+
+
+def test_unreachable_server_is_a_miss():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    store = RedisBlobStore(f"redis://127.0.0.1:{port}/0", timeout=0.5)
+    assert store.get("word") is None
+    store.put("word", b"value")
+    assert store.stats()["errors"] == 2
+
+
+def _put_in_child(store):
+    # The inherited connection belongs to the parent; the child must open its own
+    assert store.client._idle.qsize() == 1
+    store.put("child", b"value")
+    assert store.client._pid == os.getpid()
+
+
+def test_forked_process_opens_its_own_connections(store):
+    store.put("parent", b"value")
+    parent_conn = store.client._idle.get_nowait()
+    store.client._idle.put(parent_conn)
+    child = multiprocessing.get_context("fork").Process(target=_put_in_child, args=(store,))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+    assert store.get("child") == b"value"
+    assert store.client._idle.get_nowait() is parent_conn
+
+
+def test_local_round_trip_and_expiry(tmp_path):
+    store = LocalBlobStore(str(tmp_path))
+    assert store.get("audio:mp3:a/b") is None
+    store.put("audio:mp3:a/b", b"value")
+    store.put("short", b"value", ttl=0.2)
+    assert store.get("audio:mp3:a/b") == b"value"
+    assert store.get("short") == b"value"
+    time.sleep(0.3)
+    assert store.get("short") is None
+    store.delete("audio:mp3:a/b")
+    assert store.get("audio:mp3:a/b") is None
+    assert os.listdir(tmp_path) == []
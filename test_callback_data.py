@@ -0,0 +1,54 @@
+import pytest
+
+from src.callback_data import (Action, CallbackDataError, CALLBACK_DATA_MAX_BYTES, INT, SCHEMA, TEXT, decode, encode,
+                               token_store)
+
+
+def test_round_trip_of_every_action():
+    samples = {(): (), (INT,): (42,), (TEXT,): ("serendipity",), (INT, INT): (5, 123456789)}
+    for action in Action:
+        args = samples[SCHEMA.get(action, ())]
+        assert decode(encode(action, *args)) == (action, args)
+
+
+def test_data_fits_telegram_limit():
+    data = encode(Action.GRADE, 5, 2 ** 40)
+    assert len(data) <= 64
+    assert "=" not in data
+
+
+def test_non_ascii_text_round_trips_inline():
+    data = encode(Action.LOOKUP, "naïve café")
+    assert decode(data) == (Action.LOOKUP, ("naïve café",))
+
+
+def test_long_text_is_parked_in_token_store():
+    phrase = "a very long phrase " * 10
+    data = encode(Action.ADD, phrase)
+    assert len(data) <= 64
+    assert decode(data) == (Action.ADD, (phrase,))
+
+
+def test_expired_token_is_rejected():
+    data = encode(Action.ADD, "x" * (CALLBACK_DATA_MAX_BYTES * 2))
+    token_store.cache.clear()
+    with pytest.raises(CallbackDataError):
+        decode(data)
+
+
+def test_wrong_argument_count_is_rejected():
+    with pytest.raises(ValueError):
+        encode(Action.DEFINE)
+    with pytest.raises(ValueError):
+        encode(Action.HOME, 1)
+
+
+def test_negative_int_is_rejected():
+    with pytest.raises(ValueError):
+        encode(Action.DEFINE, -1)
+
+
+@pytest.mark.parametrize("data", ["", "!!!", "AA", "/w", encode(Action.DEFINE, 300)[:-1], encode(Action.HOME) + "AA"])
+def test_malformed_data_is_rejected(data):
+    with pytest.raises(CallbackDataError):
+        decode(data)
@@ -0,0 +1,52 @@
+import threading
+
+from src.kvindex import SortedIndex, write_index
+
+MAGIC = b"TESTIDX1"
+
+
+def _write(tmp_path, records):
+    path = str(tmp_path / "test.idx")
+    write_index(records, path, MAGIC)
+    return path
+
+
+def test_lookup_and_prefix_scan(tmp_path):
+    index = SortedIndex(_write(tmp_path, {"cat": (0, b"1"), "car": (1, b"2"), "dog": (0, b"")}), MAGIC)
+    assert len(index) == 3
+    assert index.get("car") == (1, b"2")
+    assert index.get("dog") == (0, b"")
+    assert index.get("cow") is None
+    assert list(index.iter_prefix("ca")) == ["car", "cat"]
+    assert list(index.iter_keys()) == ["car", "cat", "dog"]
+
+
+def test_missing_wrong_or_truncated_file_is_unavailable(tmp_path):
+    path = _write(tmp_path, {"cat": (0, b"1")})
+    assert not SortedIndex(str(tmp_path / "missing.idx"), MAGIC).available
+    assert not SortedIndex(path, b"OTHERIDX").available
+    with open(path, "rb") as file:
+        data = file.read()
+    for length in (4, len(MAGIC) + 6):
+        truncated = tmp_path / f"truncated-{length}.idx"
+        truncated.write_bytes(data[:length])
+        index = SortedIndex(str(truncated), MAGIC)
+        assert not index.available
+        assert index.get("cat") is None
+
+
+def test_threads_racing_the_first_open_all_see_the_index(tmp_path):
+    index = SortedIndex(_write(tmp_path, {"cat": (0, b"1")}), MAGIC)
+    results = []
+    start = threading.Barrier(8)
+
+    def lookup():
+        start.wait()
+        results.append(index.get("cat"))
+
+    threads = [threading.Thread(target=lookup) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert results == [(0, b"1")] * 8
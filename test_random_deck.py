@@ -0,0 +1,64 @@
+from src.random_deck import Deck, DeckStore
+
+
+def _draw_pass(deck):
+    return [deck.draw() for _ in range(len(deck))]
+
+
+def _assert_consistent(deck):
+    assert deck.positions == {word_id: i for i, word_id in enumerate(deck.word_ids)}
+    assert 0 <= deck.cursor <= len(deck.word_ids)
+
+
+def test_pass_deals_every_word_once():
+    deck = Deck(range(50))
+    assert sorted(_draw_pass(deck)) == list(range(50))
+    # The next pass reshuffles and deals them all again
+    assert sorted(_draw_pass(deck)) == list(range(50))
+
+
+def test_empty_deck_draws_nothing():
+    assert Deck([]).draw() is None
+    assert Deck([]).draw(no_repeat=False) is None
+
+
+def test_peek_matches_next_draws():
+    deck = Deck(range(10))
+    deck.draw()
+    upcoming = deck.peek(3)
+    assert [deck.draw() for _ in range(3)] == upcoming
+
+
+def test_added_word_is_dealt_in_current_pass():
+    deck = Deck(range(10))
+    drawn = [deck.draw() for _ in range(5)]
+    deck.add(100)
+    deck.add(100)
+    _assert_consistent(deck)
+    rest = [deck.draw() for _ in range(6)]
+    assert sorted(drawn + rest) == list(range(10)) + [100]
+
+
+def test_removed_word_is_not_dealt():
+    deck = Deck(range(10))
+    drawn = [deck.draw() for _ in range(5)]
+    deck.remove(drawn[0])
+    pending = deck.peek(5)
+    deck.remove(pending[-1])
+    deck.remove(999)
+    _assert_consistent(deck)
+    assert deck.cursor == 4
+    rest = [deck.draw() for _ in range(4)]
+    assert sorted(drawn[1:] + rest) == sorted(set(range(10)) - {drawn[0], pending[-1]})
+
+
+def test_store_tracks_changes_to_loaded_decks_only():
+    store = DeckStore()
+    store.word_added(1, 5)
+    assert store.get(1) is None
+    deck = store.load(1, [1, 2])
+    store.word_added(1, 3)
+    store.word_removed(1, 1)
+    assert sorted(deck.word_ids) == [2, 3]
+    store.invalidate(1)
+    assert store.get(1) is None
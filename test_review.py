@@ -0,0 +1,57 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from src.review import RELEARN_DELAY, ReviewQueue, schedule
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def test_first_reviews_use_fixed_intervals():
+    due_at, interval, ease, repetitions, lapses = schedule(0, 2.5, 0, 0, 4, now=NOW)
+    assert (interval, repetitions, due_at) == (1, 1, NOW + timedelta(days=1))
+    due_at, interval, ease, repetitions, lapses = schedule(interval, ease, repetitions, lapses, 4, now=NOW)
+    assert (interval, repetitions, due_at) == (6, 2, NOW + timedelta(days=6))
+
+
+def test_later_reviews_multiply_by_ease():
+    due_at, interval, ease, repetitions, lapses = schedule(6, 2.5, 2, 0, 4, now=NOW)
+    assert interval == 15.0
+    assert repetitions == 3
+    assert due_at == NOW + timedelta(days=15)
+
+
+@pytest.mark.parametrize("quality, change", [(5, 0.1), (4, 0.0), (3, -0.14)])
+def test_ease_follows_quality(quality, change):
+    ease = schedule(6, 2.5, 2, 0, quality, now=NOW)[2]
+    assert ease == pytest.approx(2.5 + change)
+
+
+def test_failed_review_relearns_soon():
+    due_at, interval, ease, repetitions, lapses = schedule(15, 2.5, 3, 1, 1, now=NOW)
+    assert due_at == NOW + RELEARN_DELAY
+    assert (interval, repetitions, lapses) == (0, 0, 2)
+    assert ease == pytest.approx(1.96)
+
+
+def test_ease_never_drops_below_floor():
+    assert schedule(1, 1.3, 1, 0, 1, now=NOW)[2] == 1.3
+
+
+def test_queue_returns_earliest_due_card():
+    queue = ReviewQueue([(NOW - timedelta(hours=1), 2), (NOW - timedelta(hours=2), 1), (NOW + timedelta(hours=1), 3)],
+                        batch=10)
+    assert queue.complete
+    assert queue.peek_due(NOW) == 1
+    queue.discard(1)
+    assert queue.peek_due(NOW) == 2
+    queue.discard(2)
+    assert queue.peek_due(NOW) is None
+
+
+def test_queue_skips_superseded_entries():
+    queue = ReviewQueue([(NOW - timedelta(hours=1), 1)], batch=1)
+    assert not queue.complete
+    queue.push(1, NOW + timedelta(days=1))
+    assert queue.peek_due(NOW) is None
+    assert queue.peek_due(NOW + timedelta(days=2)) == 1
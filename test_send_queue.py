@@ -0,0 +1,50 @@
+import multiprocessing
+
+import pytest
+
+from src.send_queue import SharedTokenBucket
+
+
+def test_burst_then_wait():
+    bucket = SharedTokenBucket(rate=10, capacity=3)
+    now = bucket._state[1]
+    assert [bucket.take(now) for _ in range(3)] == [0.0, 0.0, 0.0]
+    assert bucket.take(now) == pytest.approx(0.1)
+
+
+def test_refills_at_rate_up_to_capacity():
+    bucket = SharedTokenBucket(rate=10, capacity=3)
+    now = bucket._state[1]
+    for _ in range(3):
+        bucket.take(now)
+    assert bucket.take(now + 0.15) == 0.0
+    assert bucket.take(now + 0.15) > 0
+    # A long idle period refills no more than the capacity
+    assert [bucket.take(now + 60) for _ in range(4)][-1] > 0
+
+
+def test_earlier_clock_reading_does_not_add_tokens():
+    bucket = SharedTokenBucket(rate=10, capacity=1)
+    now = bucket._state[1]
+    bucket.take(now + 1)
+    assert bucket.take(now) > 0
+
+
+def _take_all(bucket, now, count):
+    for _ in range(count):
+        bucket.take(now)
+
+
+def test_forked_processes_share_the_bucket():
+    bucket = SharedTokenBucket(rate=1, capacity=10)
+    now = bucket._state[1]
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=_take_all, args=(bucket, now, 4)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(10)
+        assert worker.exitcode == 0
+    assert bucket.take(now) == 0.0
+    assert bucket.take(now) == 0.0
+    assert bucket.take(now) == pytest.approx(1.0)